@@ -9,9 +9,15 @@ db = SQLAlchemy()
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 
-def create_app():
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    if app.config.get('PROXY_FIX_HOPS'):
+        # Behind a reverse proxy, remote_addr is the proxy's; take the
+        # client address from X-Forwarded-For, trusting this many hops.
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config['PROXY_FIX_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
     csrf.init_app(app)    
     # Initialize extensions
     db.init_app(app)
@@ -24,12 +30,13 @@ def create_app():
     from app.models.user import User
     from app.models.food_item import FoodItem
     from app.models.order import Order
+    from app.models.order_line import OrderLine
     from app.models.payment import Payment
-    
-    # User loader for Flask-Login
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    from app.models.dashboard_stats import DashboardStats
+    from app.models.stored_image import StoredImage
+    from app.models.order_event import OrderEvent
+    from app.models.order_projection import ProjectionCheckpoint
+    from app.models.catalog_facet import CatalogFacet
     
     # Register blueprints
     from app.routes.auth import auth
@@ -37,12 +44,67 @@ def create_app():
     from app.routes.customer import customer
     from app.routes.restaurant import restaurant
     from app.routes.main import main
+    from app.routes.media import media
+    from app.routes.stream import stream
     
     app.register_blueprint(auth, url_prefix='/auth')
     app.register_blueprint(admin, url_prefix='/admin')
     app.register_blueprint(customer, url_prefix='/customer')
     app.register_blueprint(restaurant, url_prefix='/restaurant')
     app.register_blueprint(main)
+    app.register_blueprint(media, url_prefix='/media')
+    app.register_blueprint(stream, url_prefix='/stream')
+
+    from app.utils.query_guard import init_query_guard
+    init_query_guard(app)
+
+    from app.utils.instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    from app.utils.passwords import init_password_hasher
+    init_password_hasher(app)
+
+    from app.utils.rate_limit import init_rate_limiter
+    init_rate_limiter(app)
+
+    from app.utils.uniqueness import init_uniqueness
+    init_uniqueness(app)
+
+    from app.utils.page_cache import init_page_cache
+    init_page_cache(app)
+
+    from app.utils.cart_store import init_cart_store
+    init_cart_store(app)
+
+    from app.utils.identity_cache import init_identity_cache
+    init_identity_cache(app)
+
+    from app.utils.images import init_image_pipeline
+    init_image_pipeline(app)
+
+    from app.utils.image_store import init_image_store
+    init_image_store(app)
+
+    from app.utils.order_stream import init_order_stream
+    init_order_stream(app)
+
+    from app.utils.search import init_search
+    init_search(app)
+
+    from app.utils.order_reports import init_order_reports
+    init_order_reports(app)
+
+    from app.utils.sales_analytics import init_sales_analytics
+    init_sales_analytics(app)
+
+    from app.utils.exports import init_exports
+    init_exports(app)
+
+    from app.utils.menu_io import init_menu_io
+    init_menu_io(app)
+
+    from app.utils.migrations import init_db_command
+    app.cli.add_command(init_db_command)
     
     return app
 
@@ -0,0 +1,138 @@
+from app import db
+from datetime import datetime
+from sqlalchemy import String, and_, cast, delete, event, func, inspect, literal, or_, select, union_all
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.derived import track_previous_values, upsert
+
+FACET_KINDS = ('category', 'restaurant')
+
+class CatalogFacet(db.Model):
+    # One row per category and per restaurant with items on the menu, so
+    # the browse filters read a handful of rows instead of grouping every
+    # food item. key is the category, or the restaurant id as text; label
+    # is what the filter shows.
+    __tablename__ = 'catalog_facets'
+    __table_args__ = (db.UniqueConstraint('kind', 'key', name='uq_catalog_facets_kind_key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.Enum(*FACET_KINDS, name='facet_kinds'), nullable=False)
+    key = db.Column(db.String(50), nullable=False)
+    label = db.Column(db.String(100), nullable=False)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    min_price = db.Column(db.Numeric(10, 2), nullable=False)
+    max_price = db.Column(db.Numeric(10, 2), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def grouped(cls):
+        """{kind: [facet, ...]}: categories by name, restaurants by label."""
+        facets = {kind: [] for kind in FACET_KINDS}
+        for facet in cls.query.order_by(cls.kind, func.lower(cls.label), cls.key):
+            facets[facet.kind].append(facet)
+        return facets
+
+    @classmethod
+    def refresh(cls, connection, categories=(), restaurant_ids=(), vacated_categories=(), vacated_restaurant_ids=()):
+        # Recomputes the facets for these keys from GROUP BY aggregates over
+        # their food items (both columns are indexed). Min and max prices
+        # cannot be adjusted by deltas when an item goes away, so changed
+        # facets are recounted rather than patched: one upsert where the
+        # dialect has ON CONFLICT, plus a DELETE when items may have left a
+        # key (the vacated ones) and its facet may now be empty.
+        vacated_categories = set(vacated_categories) - {None}
+        vacated_restaurant_ids = set(vacated_restaurant_ids) - {None}
+        categories = (set(categories) | vacated_categories) - {None}
+        restaurant_ids = (set(restaurant_ids) | vacated_restaurant_ids) - {None}
+        if not categories and not restaurant_ids:
+            return
+        table = cls.__table__
+        aggregates = union_all(*cls._aggregates(categories, restaurant_ids))
+        columns = ['kind', 'key', 'label', 'item_count', 'min_price', 'max_price', 'updated_at']
+        statement = upsert(connection, table)
+        if statement is None:
+            connection.execute(delete(table).where(cls._keys(categories, restaurant_ids)))
+            connection.execute(table.insert().from_select(columns, aggregates))
+            return
+        connection.execute(statement.from_select(columns, aggregates).on_conflict_do_update(
+            index_elements=['kind', 'key'],
+            set_={column: statement.excluded[column] for column in columns[2:]},
+        ))
+        if vacated_categories or vacated_restaurant_ids:
+            stocked_categories = select(FoodItem.category).where(FoodItem.category.in_(vacated_categories))
+            stocked_restaurants = (select(cast(FoodItem.restaurant_id, String))
+                                   .where(FoodItem.restaurant_id.in_(vacated_restaurant_ids)))
+            connection.execute(delete(table).where(or_(
+                and_(table.c.kind == 'category', table.c.key.in_(vacated_categories),
+                     table.c.key.not_in(stocked_categories)),
+                and_(table.c.kind == 'restaurant', table.c.key.in_([str(i) for i in vacated_restaurant_ids]),
+                     table.c.key.not_in(stocked_restaurants)),
+            )))
+
+    @classmethod
+    def rebuild(cls, connection):
+        categories = connection.execute(select(FoodItem.category).distinct()).scalars().all()
+        restaurant_ids = connection.execute(select(FoodItem.restaurant_id).distinct()).scalars().all()
+        connection.execute(delete(cls.__table__))
+        cls.refresh(connection, categories, restaurant_ids)
+
+    @classmethod
+    def _keys(cls, categories, restaurant_ids):
+        table = cls.__table__
+        return or_(and_(table.c.kind == 'category', table.c.key.in_(categories)),
+                   and_(table.c.kind == 'restaurant', table.c.key.in_([str(i) for i in restaurant_ids])))
+
+    @staticmethod
+    def _aggregates(categories, restaurant_ids):
+        now = datetime.utcnow()
+        aggregates = []
+        if categories:
+            aggregates.append(select(
+                literal('category'), FoodItem.category, FoodItem.category,
+                func.count(FoodItem.id), func.min(FoodItem.price), func.max(FoodItem.price), literal(now)
+            ).where(FoodItem.category.in_(categories)).group_by(FoodItem.category))
+        if restaurant_ids:
+            aggregates.append(select(
+                literal('restaurant'), cast(FoodItem.restaurant_id, String), User.name,
+                func.count(FoodItem.id), func.min(FoodItem.price), func.max(FoodItem.price), literal(now)
+            ).join(User, User.id == FoodItem.restaurant_id)
+             .where(FoodItem.restaurant_id.in_(restaurant_ids)).group_by(FoodItem.restaurant_id, User.name))
+        return aggregates
+
+    def __repr__(self):
+        return f"CatalogFacet({self.kind} {self.label}: {self.item_count} items)"
+
+
+def _previous(obj, key):
+    # What the attribute held before this flush, when it changed.
+    return set(inspect(obj).attrs[key].history.deleted)
+
+track_previous_values(FoodItem.category, FoodItem.restaurant_id, FoodItem.price, User.name)
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_catalog_facets(session, flush_context):
+    categories, restaurant_ids = set(), set()
+    vacated_categories, vacated_restaurant_ids = set(), set()
+    for obj in session.new:
+        if isinstance(obj, FoodItem):
+            categories.add(obj.category)
+            restaurant_ids.add(obj.restaurant_id)
+    for obj in session.deleted:
+        if isinstance(obj, FoodItem):
+            vacated_categories |= _previous(obj, 'category') | {obj.category}
+            vacated_restaurant_ids |= _previous(obj, 'restaurant_id') | {obj.restaurant_id}
+        elif isinstance(obj, User):
+            vacated_restaurant_ids.add(obj.id)
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, FoodItem) and any(inspect(obj).attrs[key].history.has_changes()
+                                             for key in ('category', 'restaurant_id', 'price')):
+            categories.add(obj.category)
+            restaurant_ids.add(obj.restaurant_id)
+            vacated_categories |= _previous(obj, 'category')
+            vacated_restaurant_ids |= _previous(obj, 'restaurant_id')
+        elif isinstance(obj, User) and obj.role == 'restaurant' and inspect(obj).attrs.name.history.has_changes():
+            restaurant_ids.add(obj.id)
+    if categories or restaurant_ids or vacated_categories or vacated_restaurant_ids:
+        CatalogFacet.refresh(session.connection(), categories, restaurant_ids,
+                             vacated_categories, vacated_restaurant_ids)
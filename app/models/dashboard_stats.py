@@ -0,0 +1,120 @@
+from app import db
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.exc import IntegrityError
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.payment import Payment
+from app.models.derived import track_previous_values
+
+COUNTERS = ('total_users', 'pending_restaurants', 'total_food_items', 'total_orders',
+            'pending_orders', 'total_payments', 'pending_payments', 'verified_revenue')
+
+class DashboardStats(db.Model):
+    __tablename__ = 'dashboard_stats'
+    id = db.Column(db.Integer, primary_key=True)
+    total_users = db.Column(db.Integer, nullable=False, default=0)
+    pending_restaurants = db.Column(db.Integer, nullable=False, default=0)
+    total_food_items = db.Column(db.Integer, nullable=False, default=0)
+    total_orders = db.Column(db.Integer, nullable=False, default=0)
+    pending_orders = db.Column(db.Integer, nullable=False, default=0)
+    total_payments = db.Column(db.Integer, nullable=False, default=0)
+    pending_payments = db.Column(db.Integer, nullable=False, default=0)
+    verified_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    ROW_ID = 1
+
+    @classmethod
+    def current(cls):
+        stats = db.session.get(cls, cls.ROW_ID)
+        return stats if stats is not None else cls.rebuild()
+
+    @classmethod
+    def rebuild(cls):
+        # Recomputes every counter from COUNT/SUM aggregates. Used when the row
+        # does not exist yet and whenever the counters need to be reconciled.
+        aggregates = select(
+            select(func.count(User.id)).scalar_subquery().label('total_users'),
+            select(func.count(User.id)).where(User.role == 'restaurant', User.status == 'pending').scalar_subquery().label('pending_restaurants'),
+            select(func.count(FoodItem.id)).scalar_subquery().label('total_food_items'),
+            select(func.count(Order.id)).scalar_subquery().label('total_orders'),
+            select(func.count(Order.id)).where(Order.status == 'pending').scalar_subquery().label('pending_orders'),
+            select(func.count(Payment.id)).scalar_subquery().label('total_payments'),
+            select(func.count(Payment.id)).where(Payment.payment_status == 'pending').scalar_subquery().label('pending_payments'),
+            select(func.coalesce(func.sum(Payment.amount), 0)).where(Payment.payment_status == 'verified').scalar_subquery().label('verified_revenue'),
+        )
+        values = db.session.execute(aggregates).one()._asdict()
+        stats = db.session.get(cls, cls.ROW_ID)
+        if stats is None:
+            stats = cls(id=cls.ROW_ID)
+            db.session.add(stats)
+        for key, value in values.items():
+            setattr(stats, key, value)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request created the row first; its counters are just as fresh.
+            db.session.rollback()
+            stats = db.session.get(cls, cls.ROW_ID)
+        return stats
+
+    @classmethod
+    def apply(cls, connection, deltas):
+        # Applies counter deltas with a relative UPDATE so concurrent writers
+        # never overwrite each other. A missing row is left alone; it is
+        # rebuilt from aggregates on the next read.
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not deltas:
+            return
+        table = cls.__table__
+        values = {key: table.c[key] + value for key, value in deltas.items()}
+        values['updated_at'] = datetime.utcnow()
+        connection.execute(table.update().where(table.c.id == cls.ROW_ID).values(**values))
+
+    def __repr__(self):
+        return f"DashboardStats(Users: {self.total_users}, Orders: {self.total_orders}, Payments: {self.total_payments})"
+
+
+def _value(obj, key, previous):
+    if previous:
+        history = inspect(obj).attrs[key].history
+        if history.has_changes():
+            return history.deleted[0] if history.deleted else None
+    return getattr(obj, key)
+
+def _contribution(obj, previous=False):
+    if isinstance(obj, User):
+        pending = _value(obj, 'role', previous) == 'restaurant' and _value(obj, 'status', previous) == 'pending'
+        return {'total_users': 1, 'pending_restaurants': int(pending)}
+    if isinstance(obj, FoodItem):
+        return {'total_food_items': 1}
+    if isinstance(obj, Order):
+        return {'total_orders': 1, 'pending_orders': int(_value(obj, 'status', previous) == 'pending')}
+    if isinstance(obj, Payment):
+        status = _value(obj, 'payment_status', previous)
+        amount = _value(obj, 'amount', previous) if status == 'verified' else 0
+        return {'total_payments': 1, 'pending_payments': int(status == 'pending'),
+                'verified_revenue': Decimal(str(amount or 0))}
+    return {}
+
+track_previous_values(User.role, User.status, Order.status, Payment.payment_status, Payment.amount)
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_dashboard_stats(session, flush_context):
+    deltas = dict.fromkeys(COUNTERS, 0)
+    for obj in session.new:
+        for key, value in _contribution(obj).items():
+            deltas[key] += value
+    for obj in session.deleted:
+        for key, value in _contribution(obj, previous=True).items():
+            deltas[key] -= value
+    for obj in session.dirty:
+        if obj in session.deleted or not session.is_modified(obj, include_collections=False):
+            continue
+        before = _contribution(obj, previous=True)
+        for key, value in _contribution(obj).items():
+            deltas[key] += value - before[key]
+    DashboardStats.apply(session.connection(), deltas)
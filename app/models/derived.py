@@ -0,0 +1,26 @@
+from sqlalchemy import event
+
+# Helpers for the tables derived from others (dashboard counters, image
+# reference counts, report projections, catalog facets) and kept in step by
+# flush hooks or by the bulk writers that bypass them.
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    pass
+
+def track_previous_values(*attributes):
+    # active_history makes SQLAlchemy load the previous value of these
+    # attributes before they are reassigned, even when they were expired by
+    # a commit, so a flush hook can read it from the attribute history.
+    for attribute in attributes:
+        event.listen(attribute, 'set', _load_previous_value, active_history=True)
+
+def upsert(connection, table):
+    """An INSERT that supports on_conflict_do_update(), or None where the
+    dialect has no ON CONFLICT and the caller must fall back."""
+    if connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(table)
@@ -3,6 +3,14 @@ from datetime import datetime
 
 class FoodItem(db.Model):
     __tablename__ = 'food_items'
+    __table_args__ = (
+        # Keyset pagination indexes for the catalog sort orders (see app/utils/catalog.py, migration 1)
+        db.Index('ix_food_items_created_at_id', 'created_at', 'id'),
+        db.Index('ix_food_items_price_id', 'price', 'id'),
+        db.Index('ix_food_items_name_id', 'name', 'id'),
+        db.Index('ix_food_items_category', 'category'),
+        db.Index('ix_food_items_restaurant_id', 'restaurant_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -11,6 +19,6 @@ class FoodItem(db.Model):
     restaurant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     category = db.Column(db.String(50), nullable=False)  # Existing category field
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    orders = db.relationship('Order', backref='food_item', lazy=True, foreign_keys='[Order.food_item_id]')
+    order_lines = db.relationship('OrderLine', backref='food_item', lazy=True)
     def __repr__(self):
         return f"FoodItem('{self.name}', '{self.price}', Restaurant ID: {self.restaurant_id})"
\ No newline at end of file
@@ -0,0 +1,37 @@
+from sqlalchemy.orm import joinedload, selectinload
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+
+# Loading policies for list views. Every relationship a list template touches
+# per row is listed here so the view issues a fixed number of SELECTs no matter
+# how many rows it renders. Many-to-one links use joinedload (one JOIN, no
+# extra round trip); collections use selectinload (one extra SELECT ... IN for
+# the whole page). The related users only need their display columns.
+
+def _user_name(relationship):
+    return joinedload(relationship).load_only(User.id, User.name)
+
+def order_list_options():
+    # manage_orders.html, order_history.html, admin/restaurant dashboards
+    return (
+        _user_name(Order.customer_user),
+        _user_name(Order.restaurant_user),
+        selectinload(Order.lines).joinedload(OrderLine.food_item).load_only(FoodItem.id, FoodItem.name),
+        joinedload(Order.payment),
+    )
+
+def payment_list_options():
+    # admin_manage_payments.html, admin dashboard pending payments
+    return (
+        _user_name(Payment.customer_payer),
+        _user_name(Payment.restaurant_receiver),
+    )
+
+def food_item_list_options():
+    # manage_food_items.html
+    return (
+        _user_name(FoodItem.restaurant_owner),
+    )
@@ -1,18 +1,71 @@
 from app import db
 from datetime import datetime
 
+# Allowed status changes. Delivered and cancelled orders are final.
+ORDER_TRANSITIONS = {
+    'pending': ('accepted', 'cancelled'),
+    'accepted': ('preparing', 'cancelled'),
+    'preparing': ('ready', 'cancelled'),
+    'ready': ('delivered', 'cancelled'),
+    'delivered': (),
+    'cancelled': (),
+}
+
+
+class OrderStatusError(Exception):
+    pass
+
+class InvalidTransition(OrderStatusError, ValueError):
+    def __init__(self, order_id, current, status):
+        super().__init__(f"Order #{order_id} cannot go from {current} to {status}.")
+
+class OrderConflict(OrderStatusError):
+    def __init__(self, order_id):
+        super().__init__(f"Order #{order_id} was changed by someone else. Reload and try again.")
+
+
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # Restaurant queues, customer history and admin listings (migration 1)
+        db.Index('ix_orders_restaurant_status_date', 'restaurant_id', 'status', 'order_date'),
+        db.Index('ix_orders_customer_date', 'customer_id', 'order_date'),
+        db.Index('ix_orders_order_date', 'order_date'),
+        db.Index('ix_orders_payment_id', 'payment_id'),
+        # A restaurant's orders newest first, without a sort (migration 11)
+        db.Index('ix_orders_restaurant_date', 'restaurant_id', 'order_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    food_item_id = db.Column(db.Integer, db.ForeignKey('food_items.id'), nullable=False)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    quantity = db.Column(db.Integer, nullable=False)
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
     status = db.Column(db.Enum('pending', 'accepted', 'preparing', 'ready', 'delivered', 'cancelled', name='order_status'), default='pending')
     payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=True)
     order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    # Every ORM UPDATE of an order is a compare-and-set on version
+    # (WHERE id = ? AND version = ?); a lost race raises StaleDataError.
+    version = db.Column(db.Integer, nullable=False, default=1)
+    __mapper_args__ = {'version_id_col': version}
+
+    lines = db.relationship('OrderLine', backref='order', lazy=True, cascade='all, delete-orphan', order_by='OrderLine.id')
+    # payments.order_id and orders.payment_id point at each other; post_update lets
+    # an order and its payment be inserted in the same flush.
+    payment = db.relationship("Payment", uselist=False, foreign_keys=[payment_id], post_update=True)
+
+    def can_transition_to(self, status):
+        return status in ORDER_TRANSITIONS.get(self.status, ())
+
+    def transition_to(self, status, expected_version=None):
+        # expected_version is the version the user's page was rendered with.
+        if expected_version is not None and expected_version != self.version:
+            raise OrderConflict(self.id)
+        if not self.can_transition_to(status):
+            raise InvalidTransition(self.id, self.status, status)
+        self.status = status
+
+    @property
+    def item_count(self):
+        return sum(line.quantity for line in self.lines)
 
-    payment = db.relationship("Payment", backref="order", uselist=False, foreign_keys=[payment_id])
     def __repr__(self):
-        return f"Order(ID: {self.id}, Customer: {self.customer_id}, Status: {self.status})"
\ No newline at end of file
+        return f"Order(ID: {self.id}, Customer: {self.customer_id}, Status: {self.status})"
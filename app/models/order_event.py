@@ -0,0 +1,109 @@
+from app import db
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect
+from app.models.order import Order
+from app.models.payment import Payment
+
+# Append-only history of orders and payments. Rows are written in the same
+# transaction as the change they describe and are never updated; reports
+# read the projections in order_projection.py, which are folded from them.
+# Events from one flush are appended orders first, then payments.
+#
+#   placed   order created (to_status is its first status)
+#   status   order status changed (from_status -> to_status)
+#   payment  payment submitted, verified or rejected
+#   deleted  order removed by an admin (from_status is its last status)
+
+class OrderEvent(db.Model):
+    __tablename__ = 'order_events'
+    __table_args__ = (
+        db.Index('ix_order_events_order_id', 'order_id', 'id'),
+        db.Index('ix_order_events_restaurant_id', 'restaurant_id', 'id'),
+    )
+    # No foreign keys: the history outlives deleted orders and users.
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    customer_id = db.Column(db.Integer, nullable=False)
+    restaurant_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    from_status = db.Column(db.String(20), nullable=True)
+    to_status = db.Column(db.String(20), nullable=True)
+    amount = db.Column(db.Numeric(10, 2), nullable=True)
+    placed_at = db.Column(db.DateTime, nullable=True)
+    occurred_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"OrderEvent(#{self.id} order {self.order_id} {self.kind}: {self.from_status} -> {self.to_status})"
+
+
+# Ids are handed out when an event is inserted but only show up once its
+# transaction commits, so with concurrent writers (MySQL, PostgreSQL) a
+# reader can see #12 before #11. Readers that keep a cursor over the log
+# stop at a missing id until the event after it is EVENT_GAP_SECONDS old;
+# by then the gap is taken to be a rolled-back insert. SQLite's single
+# writer leaves no gaps.
+EVENT_GAP_SECONDS = 60
+
+def settled_count(events, after_id, now=None):
+    """How many of events, rows after after_id in id order, a cursor can pass
+    without stepping over an id that may still commit."""
+    now = now or datetime.utcnow()
+    expected = after_id + 1
+    for count, row in enumerate(events):
+        if row['id'] != expected and now - row['occurred_at'] < timedelta(seconds=EVENT_GAP_SECONDS):
+            return count
+        expected = row['id'] + 1
+    return len(events)
+
+
+def order_event(kind, order_id, customer_id, restaurant_id, from_status=None, to_status=None,
+                amount=None, placed_at=None, occurred_at=None):
+    return {
+        'order_id': order_id, 'customer_id': customer_id, 'restaurant_id': restaurant_id,
+        'kind': kind, 'from_status': from_status, 'to_status': to_status, 'amount': amount,
+        'placed_at': placed_at, 'occurred_at': occurred_at or datetime.utcnow(),
+    }
+
+def record_order_events(connection, events):
+    # Call it inside the transaction that made the change.
+    if events:
+        connection.execute(OrderEvent.__table__.insert(), events)
+
+
+def _previous(obj, key):
+    history = inspect(obj).attrs[key].history
+    if history.has_changes():
+        return history.deleted[0] if history.deleted else None
+    return getattr(obj, key)
+
+def _order_event(order, kind, **values):
+    return order_event(kind, order.id, order.customer_id, order.restaurant_id, placed_at=order.order_date, **values)
+
+def _payment_event(payment, from_status):
+    return order_event('payment', payment.order_id, payment.customer_id, payment.restaurant_id,
+                       from_status=from_status, to_status=payment.payment_status, amount=payment.amount)
+
+@event.listens_for(db.session, 'after_flush')
+def _record_order_events(session, flush_context):
+    order_events, payment_events = [], []
+    for obj in session.new:
+        if isinstance(obj, Order):
+            order_events.append(_order_event(obj, 'placed', to_status=obj.status, amount=obj.total_price,
+                                             occurred_at=obj.order_date))
+        elif isinstance(obj, Payment):
+            payment_events.append(_payment_event(obj, None))
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            order_events.append(_order_event(obj, 'deleted', from_status=_previous(obj, 'status')))
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, Order):
+            previous = _previous(obj, 'status')
+            if previous != obj.status:
+                order_events.append(_order_event(obj, 'status', from_status=previous, to_status=obj.status))
+        elif isinstance(obj, Payment):
+            previous = _previous(obj, 'payment_status')
+            if previous != obj.payment_status:
+                payment_events.append(_payment_event(obj, previous))
+    record_order_events(session.connection(), order_events + payment_events)
@@ -0,0 +1,17 @@
+from app import db
+
+class OrderLine(db.Model):
+    __tablename__ = 'order_lines'
+    __table_args__ = (
+        db.Index('ix_order_lines_order_id', 'order_id'),
+        db.Index('ix_order_lines_food_item_id', 'food_item_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    food_item_id = db.Column(db.Integer, db.ForeignKey('food_items.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    line_total = db.Column(db.Numeric(10, 2), nullable=False)
+
+    def __repr__(self):
+        return f"OrderLine(Order: {self.order_id}, Food Item: {self.food_item_id}, Quantity: {self.quantity})"
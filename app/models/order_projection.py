@@ -0,0 +1,174 @@
+from app import db
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import DDL, and_, event, func, select
+from app.models.derived import upsert
+
+# Read models folded from order_events. Writers only append events; the
+# projections are caught up from the checkpoint, in id order, before a
+# report reads them (see app/utils/order_reports.py), and can be rebuilt
+# from scratch by replaying the whole log. Reports read these small tables
+# instead of scanning orders and payments.
+
+class RestaurantQueue(db.Model):
+    # Number of orders per restaurant in each status.
+    __tablename__ = 'restaurant_queues'
+    KEY = ('restaurant_id', 'status')
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def counts(cls, restaurant_id=None):
+        """{restaurant_id: {status: order count}}"""
+        query = select(cls.restaurant_id, cls.status, cls.order_count).where(cls.order_count != 0)
+        if restaurant_id is not None:
+            query = query.where(cls.restaurant_id == restaurant_id)
+        counts = {}
+        for row in db.session.execute(query):
+            counts.setdefault(row.restaurant_id, {})[row.status] = row.order_count
+        return counts
+
+    def __repr__(self):
+        return f"RestaurantQueue({self.restaurant_id}, {self.status}: {self.order_count})"
+
+class DailyRevenue(db.Model):
+    # Orders placed and payments verified per restaurant per (UTC) day.
+    # A verified payment that is later rejected is taken back on that day.
+    __tablename__ = 'daily_revenue'
+    KEY = ('day', 'restaurant_id')
+    day = db.Column(db.Date, primary_key=True)
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    orders_placed = db.Column(db.Integer, nullable=False, default=0)
+    order_value = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    verified_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    @classmethod
+    def recent(cls, days=7, restaurant_id=None):
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        query = (
+            select(cls.day, func.sum(cls.orders_placed).label('orders_placed'),
+                   func.sum(cls.order_value).label('order_value'),
+                   func.sum(cls.verified_revenue).label('verified_revenue'))
+            .where(cls.day >= since).group_by(cls.day).order_by(cls.day.desc())
+        )
+        if restaurant_id is not None:
+            query = query.where(cls.restaurant_id == restaurant_id)
+        return db.session.execute(query).all()
+
+    def __repr__(self):
+        return f"DailyRevenue({self.day}, {self.restaurant_id}: ${self.verified_revenue})"
+
+class ReadyTime(db.Model):
+    # Orders that reached 'ready', and the seconds they took from being placed.
+    __tablename__ = 'ready_times'
+    KEY = ('restaurant_id',)
+    restaurant_id = db.Column(db.Integer, primary_key=True)
+    ready_count = db.Column(db.Integer, nullable=False, default=0)
+    ready_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def averages(cls, restaurant_id=None):
+        """{restaurant_id: average time from placed to ready}"""
+        query = select(cls).where(cls.ready_count > 0)
+        if restaurant_id is not None:
+            query = query.where(cls.restaurant_id == restaurant_id)
+        return {row.restaurant_id: timedelta(seconds=row.ready_seconds // row.ready_count)
+                for row in db.session.scalars(query)}
+
+    def __repr__(self):
+        return f"ReadyTime({self.restaurant_id}: {self.ready_count} orders)"
+
+PROJECTIONS = (RestaurantQueue, DailyRevenue, ReadyTime)
+
+
+class ProjectionCheckpoint(db.Model):
+    # Id of the last order event a reader of the log has handled: folded
+    # into the projections, or seen by the sales analytics cache.
+    __tablename__ = 'projection_checkpoints'
+    name = db.Column(db.String(50), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+
+    ORDER_REPORTS = 'order_reports'
+    SALES_ANALYTICS = 'sales_analytics'
+
+    def __repr__(self):
+        return f"ProjectionCheckpoint({self.name}: #{self.last_event_id})"
+
+event.listen(ProjectionCheckpoint.__table__, 'after_create', DDL(
+    f"INSERT INTO projection_checkpoints (name, last_event_id) VALUES"
+    f" ('{ProjectionCheckpoint.ORDER_REPORTS}', 0), ('{ProjectionCheckpoint.SALES_ANALYTICS}', 0)"
+))
+
+
+def fold_events(events, deltas=None):
+    """Adds the effect of events to deltas, {(model, key): {column: delta}}."""
+    deltas = {} if deltas is None else deltas
+
+    def add(model, key, **values):
+        bucket = deltas.setdefault((model, key), {})
+        for column, value in values.items():
+            bucket[column] = bucket.get(column, 0) + value
+
+    for row in events:
+        kind, restaurant_id = row['kind'], row['restaurant_id']
+        day = row['occurred_at'].date()
+        amount = Decimal(str(row['amount'] or 0))
+        if kind == 'placed':
+            add(RestaurantQueue, (restaurant_id, row['to_status']), order_count=1)
+            add(DailyRevenue, (day, restaurant_id), orders_placed=1, order_value=amount)
+        elif kind == 'status':
+            add(RestaurantQueue, (restaurant_id, row['from_status']), order_count=-1)
+            add(RestaurantQueue, (restaurant_id, row['to_status']), order_count=1)
+            if row['to_status'] == 'ready' and row['placed_at'] is not None:
+                seconds = int((row['occurred_at'] - row['placed_at']).total_seconds())
+                add(ReadyTime, (restaurant_id,), ready_count=1, ready_seconds=max(seconds, 0))
+        elif kind == 'deleted':
+            add(RestaurantQueue, (restaurant_id, row['from_status']), order_count=-1)
+        elif kind == 'payment':
+            if row['to_status'] == 'verified':
+                add(DailyRevenue, (day, restaurant_id), verified_revenue=amount)
+            if row['from_status'] == 'verified':
+                add(DailyRevenue, (day, restaurant_id), verified_revenue=-amount)
+    return deltas
+
+def _rows(deltas):
+    rows = {}
+    for (model, key), values in deltas.items():
+        if any(values.values()):
+            row = dict.fromkeys(model.__table__.columns.keys(), 0)
+            row.update(zip(model.KEY, key))
+            row.update(values)
+            rows.setdefault(model, []).append(row)
+    return rows
+
+def apply_deltas(connection, deltas):
+    # Adds the deltas with relative upserts: one statement per projection
+    # where the dialect has ON CONFLICT, otherwise an UPDATE per key and an
+    # INSERT the first time a key is seen.
+    for model, rows in _rows(deltas).items():
+        table = model.__table__
+        counters = [column for column in table.columns.keys() if column not in model.KEY]
+        statement = upsert(connection, table)
+        if statement is not None:
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=list(model.KEY),
+                set_={column: table.c[column] + statement.excluded[column] for column in counters},
+            ), rows)
+            continue
+        for row in rows:
+            match = and_(*(table.c[column] == row[column] for column in model.KEY))
+            result = connection.execute(
+                table.update().where(match).values({column: table.c[column] + row[column] for column in counters})
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(row))
+
+def clear_projections(connection):
+    for model in PROJECTIONS:
+        connection.execute(model.__table__.delete())
+
+def write_projections(connection, deltas):
+    # Fills cleared projections with the totals folded from a full replay.
+    for model, rows in _rows(deltas).items():
+        connection.execute(model.__table__.insert(), rows)
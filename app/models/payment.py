@@ -4,17 +4,31 @@ from app.models.order import Order  # Ensure Order is imported
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        # Payment lookups by order, verification queues and per-user lists (migration 1)
+        db.Index('ix_payments_order_id', 'order_id'),
+        db.Index('ix_payments_status_date', 'payment_status', 'payment_date'),
+        db.Index('ix_payments_restaurant_status', 'restaurant_id', 'payment_status'),
+        db.Index('ix_payments_customer_id', 'customer_id'),
+        db.Index('ix_payments_bkash_reference', 'bkash_reference'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     customer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     restaurant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     bkash_transaction_id = db.Column(db.String(100), unique=True, nullable=False)
+    # The transaction ID as the customer entered it. A mixed-cart checkout
+    # shares it between its payments, whose bkash_transaction_id gets the
+    # restaurant ID appended; reuse is checked against this column.
+    bkash_reference = db.Column(db.String(100), nullable=False,
+                                default=lambda context: context.get_current_parameters()['bkash_transaction_id'])
     payment_phone_number = db.Column(db.String(20), nullable=False)
     payment_method = db.Column(db.Enum('bkash', name='payment_methods'), default='bkash')
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     payment_status = db.Column(db.Enum('pending', 'verified', 'rejected', 'failed', name='payment_status'), default='pending')
     payment_date = db.Column(db.DateTime, default=datetime.utcnow)
 
-    # Removed the order relationship to avoid conflict, relying on the backref from Order
+    order = db.relationship('Order', foreign_keys=[order_id])
+
     def __repr__(self):
         return f"Payment(ID: {self.id}, Transaction: {self.bkash_transaction_id}, Status: {self.payment_status})"
\ No newline at end of file
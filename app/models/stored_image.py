@@ -0,0 +1,79 @@
+from app import db
+from datetime import datetime
+from sqlalchemy import case, event, inspect
+from app.models.food_item import FoodItem
+from app.models.derived import track_previous_values, upsert
+from app.utils.images import VARIANT_NAME
+
+class StoredImage(db.Model):
+    # One row per content hash in the upload directory. ref_count is the
+    # number of food items whose image_url points at one of its variants;
+    # released_at records when it dropped to zero, for the GC grace period.
+    __tablename__ = 'stored_images'
+    digest = db.Column(db.String(20), primary_key=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    released_at = db.Column(db.DateTime, nullable=True)
+
+    @classmethod
+    def apply(cls, connection, deltas):
+        # A new reference is one upsert where the dialect has ON CONFLICT;
+        # otherwise, and for released references, an UPDATE, followed by an
+        # INSERT the first time a digest is seen.
+        table = cls.__table__
+        now = datetime.utcnow()
+        for digest, delta in deltas.items():
+            if not delta:
+                continue
+            released_at = case((table.c.ref_count + delta <= 0, now), else_=None)
+            statement = upsert(connection, table) if delta > 0 else None
+            if statement is not None:
+                connection.execute(statement.values(digest=digest, ref_count=delta, created_at=now).on_conflict_do_update(
+                    index_elements=['digest'],
+                    set_={'ref_count': table.c.ref_count + delta, 'released_at': released_at},
+                ))
+                continue
+            result = connection.execute(
+                table.update().where(table.c.digest == digest).values(
+                    ref_count=table.c.ref_count + delta, released_at=released_at,
+                )
+            )
+            if result.rowcount == 0 and delta > 0:
+                connection.execute(table.insert().values(digest=digest, ref_count=delta, created_at=now))
+
+    def __repr__(self):
+        return f"StoredImage({self.digest}, refs: {self.ref_count})"
+
+
+def image_digest(image_url):
+    match = VARIANT_NAME.match(image_url or '')
+    return match.group('digest') if match else None
+
+def _previous_image_url(food_item):
+    history = inspect(food_item).attrs.image_url.history
+    if history.has_changes():
+        return history.deleted[0] if history.deleted else None
+    return food_item.image_url
+
+track_previous_values(FoodItem.image_url)
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_image_refs(session, flush_context):
+    deltas = {}
+    def count(image_url, delta):
+        digest = image_digest(image_url)
+        if digest:
+            deltas[digest] = deltas.get(digest, 0) + delta
+    for obj in session.new:
+        if isinstance(obj, FoodItem):
+            count(obj.image_url, 1)
+    for obj in session.deleted:
+        if isinstance(obj, FoodItem):
+            count(_previous_image_url(obj), -1)
+    for obj in session.dirty:
+        if isinstance(obj, FoodItem) and obj not in session.deleted:
+            previous = _previous_image_url(obj)
+            if previous != obj.image_url:
+                count(previous, -1)
+                count(obj.image_url, 1)
+    StoredImage.apply(session.connection(), deltas)
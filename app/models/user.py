@@ -1,4 +1,4 @@
-from app import db, login_manager
+from app import db
 from flask_login import UserMixin
 from datetime import datetime
 
@@ -19,10 +19,10 @@ class User(db.Model, UserMixin):
     payments_as_customer = db.relationship('Payment', backref='customer_payer', lazy=True, foreign_keys='Payment.customer_id')
     payments_as_restaurant = db.relationship('Payment', backref='restaurant_receiver', lazy=True, foreign_keys='Payment.restaurant_id')
 
+    @property
+    def is_active(self):
+        return self.status != 'suspended'
+
     def __repr__(self):
         return f"User('{self.name}', '{self.email}', '{self.role}')"
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
@@ -1,47 +1,52 @@
-import bcrypt
 from flask import session
-from flask import Blueprint, render_template, url_for, flash, redirect, request
+from flask import Blueprint, Response, abort, current_app, render_template, url_for, flash, redirect, request
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload, selectinload
 from app import db
 from app.models.user import User
 from app.models.food_item import FoodItem
-from app.models.order import Order
+from app.models.order import ORDER_TRANSITIONS, Order, OrderStatusError
+from app.models.order_line import OrderLine
 from app.models.payment import Payment
+from app.models.dashboard_stats import DashboardStats
 from app.utils.decorators import admin_required
-import os
-import secrets
-from PIL import Image
-from flask import current_app
+from app.models.loading import order_list_options, payment_list_options, food_item_list_options
+from app.utils.order_reports import order_report
+from app.utils.exports import EXPORT_FORMATS, PAYMENT_STATUSES, ExportError, export_filename, export_options, stream_export
+from app.utils.payments import BulkPaymentError, bulk_request_args, bulk_update_payments, summarize
+from app.utils.order_status import change_order_status, commit_order_change
 from app.utils.food_item_forms import FoodItemForm
+from app.utils.images import image_pipeline
+from app.utils.passwords import password_hasher
 from app.utils.profile_forms import UpdateProfileForm
+from app.utils.uniqueness import commit_unique
 from flask import jsonify
 
 admin = Blueprint("admin", __name__)
 
-def save_picture(form_picture):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, 'static/uploads', picture_fn)
-    
-    os.makedirs(os.path.dirname(picture_path), exist_ok=True)
-    
-    output_size = (300, 300)
-    img = Image.open(form_picture)
-    img.thumbnail(output_size)
-    img.save(picture_path)
-    
-    return picture_fn
-
 @admin.route("/dashboard")
 @login_required
 @admin_required
 def dashboard():
-    users = User.query.all()
-    food_items = FoodItem.query.all()
-    orders = Order.query.all()
-    payments = Payment.query.all()
-    return render_template("admin_dashboard.html", users=users, food_items=food_items, orders=orders, payments=payments)
+    stats = DashboardStats.current()
+    recent_orders = Order.query.options(*order_list_options()).order_by(Order.order_date.desc(), Order.id.desc()).limit(5).all()
+    pending_payments = Payment.query.filter_by(payment_status="pending").order_by(Payment.payment_date.desc(), Payment.id.desc()).limit(5).all()
+    return render_template("admin_dashboard.html", stats=stats, recent_orders=recent_orders, pending_payments=pending_payments)
+
+@admin.route("/reports")
+@login_required
+@admin_required
+def reports():
+    return render_template("order_reports.html", **order_report())
+
+@admin.route("/instrumentation")
+@login_required
+@admin_required
+def instrumentation():
+    instruments = current_app.extensions.get("instrumentation")
+    if instruments is None:
+        abort(404)
+    return jsonify(instruments.snapshot())
 
 @admin.route("/manage_users")
 @login_required
@@ -93,15 +98,30 @@ def activate_user(user_id):
 @login_required
 @admin_required
 def manage_food_items():
-    food_items = FoodItem.query.all()
+    food_items = FoodItem.query.options(*food_item_list_options()).all()
     return render_template("manage_food_items.html", food_items=food_items)
 
 @admin.route("/manage_orders")
 @login_required
 @admin_required
 def manage_orders():
-    orders = Order.query.all()
-    return render_template("manage_orders.html", orders=orders)
+    orders = Order.query.options(*order_list_options()).all()
+    return render_template("manage_orders.html", orders=orders, order_statuses=ORDER_TRANSITIONS)
+
+@admin.route("/export/<kind>")
+@login_required
+@admin_required
+def export(kind):
+    try:
+        options = export_options(kind, request.args)
+    except ExportError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("admin.manage_payments" if kind == "payments" else "admin.manage_orders"))
+    # The body is generated after this view returns, on its own connection.
+    body = stream_export(**options)
+    mimetype = "application/gzip" if options["gzip"] else EXPORT_FORMATS[options["format"]]
+    return Response(body, mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{export_filename(options)}"'})
 
 @admin.route("/update_order_status/<int:order_id>", methods=["POST"])
 @login_required
@@ -109,13 +129,11 @@ def manage_orders():
 def update_order_status(order_id):
     order = Order.query.get_or_404(order_id)
     new_status = request.form.get("new_status")
-    valid_statuses = ['pending', 'accepted', 'preparing', 'ready', 'delivered', 'cancelled']
-    if new_status in valid_statuses:
-        order.status = new_status
-        db.session.commit()
+    try:
+        change_order_status(order, new_status, request.form.get("version", type=int))
         flash(f"Order status updated to {new_status}!", "success")
-    else:
-        flash("Invalid status!", "danger")
+    except OrderStatusError as e:
+        flash(str(e), "danger")
     return redirect(url_for("admin.manage_orders"))
 
 @admin.route("/delete_order/<int:order_id>", methods=["POST"])
@@ -126,7 +144,7 @@ def delete_order(order_id):
     # Store deletion details in session for potential undo
     session['pending_order_delete'] = {
         'order_id': order.id,
-        'food_item_name': order.food_item.name
+        'food_item_name': ", ".join(line.food_item.name for line in order.lines)
     }
     session.modified = True
     flash(f"Order '{order.id}' marked for deletion.", "warning")
@@ -165,8 +183,8 @@ def confirm_delete_order():
 @login_required
 @admin_required
 def manage_payments():
-    payments = Payment.query.all()
-    return render_template("admin_manage_payments.html", payments=payments)
+    payments = Payment.query.options(*payment_list_options()).all()
+    return render_template("admin_manage_payments.html", payments=payments, payment_statuses=PAYMENT_STATUSES)
 
 @admin.route("/verify_payment/<int:payment_id>", methods=["POST"])
 @login_required
@@ -174,9 +192,15 @@ def manage_payments():
 def verify_payment(payment_id):
     payment = Payment.query.get_or_404(payment_id)
     if payment.payment_status == "pending":
+        order = payment.order
         payment.payment_status = "verified"
-        payment.order.status = "accepted"
-        db.session.commit()
+        if order.can_transition_to("accepted"):
+            order.transition_to("accepted")
+        try:
+            commit_order_change(order)
+        except OrderStatusError as e:
+            flash(str(e), "danger")
+            return redirect(url_for("admin.manage_payments"))
         flash("Payment verified successfully!", "success")
     else:
         flash("Invalid payment status.", "danger")
@@ -188,14 +212,36 @@ def verify_payment(payment_id):
 def reject_payment(payment_id):
     payment = Payment.query.get_or_404(payment_id)
     if payment.payment_status == "pending":
+        order = payment.order
         payment.payment_status = "failed"
-        payment.order.status = "cancelled"
-        db.session.commit()
+        if order.can_transition_to("cancelled"):
+            order.transition_to("cancelled")
+        try:
+            commit_order_change(order)
+        except OrderStatusError as e:
+            flash(str(e), "danger")
+            return redirect(url_for("admin.manage_payments"))
         flash("Payment rejected successfully!", "success")
     else:
         flash("Invalid payment status.", "danger")
     return redirect(url_for("admin.manage_payments"))
 
+@admin.route("/bulk_payments", methods=["POST"])
+@login_required
+@admin_required
+def bulk_payments():
+    try:
+        results = bulk_update_payments(**bulk_request_args(request))
+    except BulkPaymentError as e:
+        if request.is_json:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        flash(str(e), "danger")
+        return redirect(url_for("admin.manage_payments"))
+    if request.is_json:
+        return jsonify({'status': 'success', 'results': results}), 200
+    flash(summarize(results), "success")
+    return redirect(url_for("admin.manage_payments"))
+
 @admin.route("/delete_user/<int:user_id>", methods=["POST"])
 @login_required
 @admin_required
@@ -235,7 +281,7 @@ def delete_food_item(food_item_id):
     session['pending_delete'] = {
         'food_item_id': food_item.id,
         'food_item_name': food_item.name,
-        'orders': [(order.id, order.payment.id if order.payment else None) for order in Order.query.filter_by(food_item_id=food_item.id).all()]
+        'orders': [(order.id, order.payment_id) for order in Order.query.join(Order.lines).filter(OrderLine.food_item_id == food_item.id).distinct().all()]
     }
     session.modified = True
     flash(f"Food item '{food_item.name}' marked for deletion.", "warning")
@@ -263,11 +309,18 @@ def confirm_delete_food_item():
     session.modified = True
     food_item_id = pending['food_item_id']
     food_item = FoodItem.query.get_or_404(food_item_id)
-    orders = Order.query.filter_by(food_item_id=food_item_id).all()
+    orders = (Order.query.join(Order.lines).filter(OrderLine.food_item_id == food_item_id).distinct()
+              .options(selectinload(Order.lines), joinedload(Order.payment)).all())
+    # Only the item's own lines go; the rest of each order is kept and its
+    # total recomputed. An order left with no lines goes with its payment.
     for order in orders:
-        if order.payment:
-            db.session.delete(order.payment)
-        db.session.delete(order)
+        order.lines = [line for line in order.lines if line.food_item_id != food_item_id]
+        if order.lines:
+            order.total_price = sum(line.line_total for line in order.lines)
+        else:
+            if order.payment:
+                db.session.delete(order.payment)
+            db.session.delete(order)
     db.session.delete(food_item)
     db.session.commit()
     flash("Food item deleted permanently!", "success")
@@ -283,10 +336,9 @@ def edit_food_item(food_item_id):
         food_item.name = form.name.data
         food_item.description = form.description.data
         food_item.price = form.price.data
-        if form.image.data:
-            image_url = save_picture(form.image.data)
-            food_item.image_url = image_url
         db.session.commit()
+        if form.image.data:
+            image_pipeline().submit(form.image.data, food_item.id)
         flash("Food item updated successfully!", "success")
         return redirect(url_for("admin.manage_food_items"))
     elif request.method == "GET":
@@ -303,21 +355,21 @@ def profile():
     if form.validate_on_submit():
         # Check if password change is requested
         if form.new_password.data:
-            if not bcrypt.check_password_hash(current_user.password, form.existing_password.data):
+            if not password_hasher().verify(form.existing_password.data, current_user.password):
                 flash("Current password is incorrect!", "danger")
                 return redirect(url_for("admin.profile"))
             if form.new_password.data != form.confirm_new_password.data:
                 flash("New passwords do not match!", "danger")
                 return redirect(url_for("admin.profile"))
-            current_user.password = bcrypt.generate_password_hash(form.new_password.data).decode('utf-8')
+            current_user.password = password_hasher().hash(form.new_password.data)
         
         current_user.name = form.name.data
         current_user.email = form.email.data
         current_user.phone_number = form.phone_number.data
         current_user.location = form.location.data
-        db.session.commit()
-        flash("Your profile has been updated!", "success")
-        return redirect(url_for("admin.profile"))
+        if commit_unique(form):
+            flash("Your profile has been updated!", "success")
+            return redirect(url_for("admin.profile"))
     elif request.method == "GET":
         form.name.data = current_user.name
         form.email.data = current_user.email
@@ -1,7 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
-from app import db, bcrypt
+from flask import Blueprint, jsonify, render_template, redirect, url_for, flash, request
+from app import db
 from app.models.user import User
 from app.utils.forms import RegistrationForm, LoginForm
+from app.utils.passwords import password_hasher
+from app.utils.rate_limit import client_address, normalize_email, rate_limiter
+from app.utils.uniqueness import UNIQUE_FIELDS, commit_unique, taken_values
 from flask_login import login_user, current_user, logout_user, login_required
 
 auth = Blueprint("auth", __name__)
@@ -11,27 +14,52 @@ def register():
     if current_user.is_authenticated:
         return redirect(url_for("main.home"))
     form = RegistrationForm()
+    if request.method == "POST":
+        rate_limiter().hit("register_ip", client_address())
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode("utf-8")
+        hashed_password = password_hasher().hash(form.password.data)
         user = User(name=form.name.data, email=form.email.data, phone_number=form.phone_number.data, location=form.location.data, password=hashed_password, role=form.role.data)
         db.session.add(user)
-        db.session.commit()
-        flash("Your account has been created! You are now able to log in", "success")
-        return redirect(url_for("auth.login"))
+        if commit_unique(form):
+            flash("Your account has been created! You are now able to log in", "success")
+            return redirect(url_for("auth.login"))
     return render_template("register.html", title="Register", form=form)
 
+@auth.route("/availability")
+def availability():
+    # Live hints for the registration form; submitting still checks.
+    rate_limiter().hit("availability_ip", client_address())
+    taken = taken_values()
+    values = {field: request.args.get(field, "").strip() for field in UNIQUE_FIELDS}
+    return jsonify({field: taken.available(field, value) for field, value in values.items() if value})
+
 @auth.route("/login", methods=["GET", "POST"])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for("main.home"))
     form = LoginForm()
+    limiter = rate_limiter()
+    email = normalize_email(request.form.get("email"))
+    if request.method == "POST":
+        limiter.hit("login_ip", client_address())
+        limiter.check("login_email", email)
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        valid, new_hash = password_hasher().verify_and_update(form.password.data, user.password) if user else (False, None)
+        if valid:
+            if not user.is_active:
+                flash("Your account has been suspended. Please contact the administrator.", "danger")
+                return render_template("login.html", title="Login", form=form)
+            if new_hash:
+                # Stored with an older cost factor.
+                user.password = new_hash
+                db.session.commit()
+            limiter.reset("login_email", email)
             login_user(user)
             next_page = request.args.get("next")
             return redirect(next_page) if next_page else redirect(url_for("main.home"))
         else:
+            limiter.hit("login_email", email)
             flash("Login Unsuccessful. Please check email and password", "danger")
     return render_template("login.html", title="Login", form=form)
 
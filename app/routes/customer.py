@@ -1,22 +1,49 @@
-import bcrypt
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session, current_app, jsonify
 from app import db
 from app.models.food_item import FoodItem
 from app.models.order import Order
+from app.models.order_line import OrderLine
 from app.models.payment import Payment
 from app.models.user import User
 from app.utils.order_forms import OrderForm
+from app.utils.passwords import password_hasher
 from app.utils.profile_forms import UpdateProfileForm
+from app.utils.uniqueness import commit_unique
 from app.utils.decorators import customer_required
+from app.utils.catalog import CatalogQuery, catalog_facets, catalog_filter_options
+from app.utils.page_cache import CATALOG_TAG, cached_page
+from app.models.loading import order_list_options
+from app.utils.cart_store import cart_store
+from app.utils.checkout import review_cart, sync_cart, review_messages
 from flask_login import login_required, current_user
 from decimal import Decimal
+from sqlalchemy import insert
 
 customer = Blueprint("customer", __name__)
 
 @customer.route("/browse")
+@cached_page(CATALOG_TAG)
 def browse():
-    food_items = FoodItem.query.all()
-    return render_template("browse_food.html", food_items=food_items)
+    catalog = CatalogQuery.from_args(request.args)
+    page = catalog.page(cursor=request.args.get("cursor"), limit=current_app.config["CATALOG_PAGE_SIZE"])
+    categories, restaurants = catalog_filter_options()
+    return render_template("browse_food.html", food_items=page.items, page=page, catalog=catalog,
+                           categories=categories, restaurants=restaurants)
+
+@customer.route("/browse/facets")
+@cached_page(CATALOG_TAG)
+def browse_facets():
+    return jsonify(catalog_facets())
+
+def current_cart():
+    cart = cart_store()
+    # Carts from before the server-side store still sit in the session cookie;
+    # move them over once so nobody loses their items.
+    legacy = session.pop('cart', None)
+    if legacy:
+        for item in legacy:
+            cart.add(current_user.id, item['food_item_id'], item['name'], item['price'], item['restaurant_id'], item['quantity'])
+    return cart
 
 @customer.route("/add_to_cart/<int:food_item_id>", methods=["GET", "POST"])
 @login_required
@@ -26,28 +53,8 @@ def add_to_cart(food_item_id):
     form = OrderForm()
     
     if form.validate_on_submit():
-        # Initialize cart in session if it doesn't exist
-        if 'cart' not in session:
-            session['cart'] = []
-        
-        # Check if item already in cart
-        item_in_cart = False
-        for item in session['cart']:
-            if item['food_item_id'] == food_item_id:
-                item['quantity'] += form.quantity.data
-                item_in_cart = True
-                break
-        
-        if not item_in_cart:
-            session['cart'].append({
-                'food_item_id': food_item_id,
-                'name': food_item.name,
-                'price': float(food_item.price),
-                'quantity': form.quantity.data,
-                'restaurant_id': food_item.restaurant_id
-            })
-        
-        session.modified = True
+        current_cart().add(current_user.id, food_item.id, food_item.name, food_item.price,
+                           food_item.restaurant_id, form.quantity.data)
         flash(f"{food_item.name} added to cart!", "success")
         return redirect(url_for("customer.browse"))
     
@@ -57,19 +64,16 @@ def add_to_cart(food_item_id):
 @login_required
 @customer_required
 def view_cart():
-    cart = session.get('cart', [])
+    cart = current_cart().items(current_user.id)
     total = sum(item['price'] * item['quantity'] for item in cart)
     return render_template("cart.html", cart=cart, total=total)
 
-@customer.route("/remove_from_cart/<int:index>")
+@customer.route("/remove_from_cart/<int:food_item_id>")
 @login_required
 @customer_required
-def remove_from_cart(index):
-    cart = session.get('cart', [])
-    if 0 <= index < len(cart):
-        removed_item = cart.pop(index)
-        session['cart'] = cart
-        session.modified = True
+def remove_from_cart(food_item_id):
+    removed_item = current_cart().remove(current_user.id, food_item_id)
+    if removed_item:
         flash(f"{removed_item['name']} removed from cart!", "success")
     return redirect(url_for("customer.view_cart"))
 
@@ -77,19 +81,25 @@ def remove_from_cart(index):
 @login_required
 @customer_required
 def checkout():
-    cart = session.get('cart', [])
-    if not cart:
+    cart = current_cart()
+    review = review_cart(cart.items(current_user.id))
+    if review.changed:
+        sync_cart(cart, current_user.id, review)
+        for message in review_messages(review):
+            flash(message, "warning")
+    if not review.lines:
         flash("Your cart is empty!", "warning")
         return redirect(url_for("customer.browse"))
     
-    total = sum(item['price'] * item['quantity'] for item in cart)
-    return render_template("checkout.html", cart=cart, total_price=total)
+    return render_template("checkout.html", cart_items=review.lines, total_price=review.total)
+
 @customer.route("/place_order", methods=["POST"])
 @login_required
 @customer_required
 def place_order():
-    cart = session.get('cart', [])
-    if not cart:
+    cart = current_cart()
+    entries = cart.items(current_user.id)
+    if not entries:
         flash("Your cart is empty!", "warning")
         return redirect(url_for("customer.browse"))
     
@@ -100,77 +110,64 @@ def place_order():
         flash("Please provide bKash transaction ID and phone number!", "danger")
         return redirect(url_for("customer.checkout"))
     
-    # Check if transaction ID already exists for *any* order from this customer
-    # This check is now more robust as the transaction ID is made unique per order item.
-    # The primary check for uniqueness will be on the combination of bkash_transaction_id and order_id
-    # However, to prevent a user from reusing the same base transaction ID for multiple *separate* orders,
-    # we can check if the base ID exists for any of their previous payments.
-    # For simplicity, we'll assume the user provides a unique base ID per new checkout session.
-    # The current implementation makes the bkash_transaction_id unique per order item by appending order.id.
-    # So, the check for existing_payment should ideally be for the *final* constructed bkash_transaction_id.
-    # However, if the user tries to use the same *initial* transaction ID for a new order, it should be caught.
-    # Let's simplify and assume the user will provide a unique base transaction ID for each new order.
-    # The current check `bkash_transaction_id=bkash_transaction_id` is for the raw input.
-    # If the user tries to place another order with the same raw ID, it will be caught.
-    # The uniqueness is enforced by `bkash_transaction_id + f"_{order.id}"` during payment creation.
-    # So, the check should be for the raw `bkash_transaction_id` only if we want to prevent reuse of the *base* ID.
-    # If we want to allow reuse of the base ID but ensure uniqueness per order item, the check is not needed here.
-    # Given the current error, the user is likely trying to re-submit the same form, or the session is not cleared.
-    # The `bkash_transaction_id` is made unique per order item, so the check for `existing_payment` should be removed
-    # or modified to check for the constructed unique ID, which is not feasible before order creation.
-    # The simpler fix is to ensure the cart is cleared and the user is redirected to a fresh checkout page.
-    # The current issue is that the `bkash_transaction_id` is being checked against the raw input, but stored with `_order.id`.
-    # This means a raw ID might exist in the database as part of a longer string, but the direct match fails.
-    # To fix this, we should ensure the transaction ID is unique for the *entire* payment, not just the base.
-    # For now, let's remove the `existing_payment` check to allow the order to proceed and rely on the `_order.id` uniqueness.
-    # This is a temporary fix to unblock the current flow. A more robust solution would involve a separate payment gateway
-    # or a more sophisticated transaction ID management.
-    # For the purpose of this demo, let's proceed without this check.
-    # The `bkash_transaction_id` is already made unique per order item by appending `_order.id`.
-    # So, the check for `existing_payment` based on the raw `bkash_transaction_id` is problematic.
-    # We will remove this check for now.
-    # existing_payment = Payment.query.filter_by(bkash_transaction_id=bkash_transaction_id).first()
-    # if existing_payment:
-    #     flash("This transaction ID has already been used!", "danger")
-    #     return redirect(url_for("customer.checkout"))
+    # The customer paid the total shown on the checkout page; if any item was
+    # removed or repriced since, send them back to confirm the new total.
+    review = review_cart(entries)
+    if review.changed:
+        sync_cart(cart, current_user.id, review)
+        for message in review_messages(review):
+            flash(message, "warning")
+        flash("Your cart changed since checkout. Please review the new total before paying.", "danger")
+        return redirect(url_for("customer.checkout"))
     
-    try:        # Create orders and payments for each item in cart
-        for item in cart:
-            food_item = FoodItem.query.get(item['food_item_id'])
-            total_price = Decimal(str(item['price'])) * item['quantity']
+    # One order (with its lines) and one payment per restaurant in the cart. A
+    # single-restaurant cart keeps the customer's transaction ID as entered; a
+    # mixed cart suffixes it with the restaurant ID to keep it unique.
+    lines_by_restaurant = review.by_restaurant()
+    transaction_ids = {
+        restaurant_id: bkash_transaction_id if len(lines_by_restaurant) == 1 else f"{bkash_transaction_id}_{restaurant_id}"
+        for restaurant_id in lines_by_restaurant
+    }
+    if db.session.query(Payment.id).filter(Payment.bkash_reference == bkash_transaction_id).first():
+        flash("This transaction ID has already been used!", "danger")
+        return redirect(url_for("customer.checkout"))
+    
+    customer_id = current_user.id  # still loaded after the commit expires current_user
+    try:
+        lines = []
+        for restaurant_id, restaurant_lines in lines_by_restaurant.items():
+            total_price = sum((line['line_total'] for line in restaurant_lines), Decimal('0.00'))
             
-            # Create order
             order = Order(
-                customer_id=current_user.id,
-                food_item_id=item['food_item_id'],
-                restaurant_id=item['restaurant_id'],
-                quantity=item['quantity'],
+                customer_id=customer_id,
+                restaurant_id=restaurant_id,
                 total_price=total_price,
                 status='pending'
             )
-            db.session.add(order)
-            db.session.flush()  # Get the order ID
-            
-            # Create payment
-            payment = Payment(
-                order_id=order.id,
-                customer_id=current_user.id,
-                restaurant_id=item['restaurant_id'],
-                bkash_transaction_id=bkash_transaction_id + f"_{order.id}",  # Make unique per order
+            order.payment = Payment(
+                order=order,
+                customer_id=customer_id,
+                restaurant_id=restaurant_id,
+                bkash_transaction_id=transaction_ids[restaurant_id],
+                bkash_reference=bkash_transaction_id,
                 payment_phone_number=payment_phone_number,
                 amount=total_price,
                 payment_status='pending'
             )
-            db.session.add(payment)
-            
-            # Link payment to order
-            order.payment_id = payment.id
+            db.session.add(order)
+            lines.extend((order, line) for line in restaurant_lines)
         
+        # One flush writes the order headers and payments; the lines then go
+        # out as a single executemany instead of one INSERT per cart item.
+        db.session.flush()
+        db.session.execute(insert(OrderLine), [
+            {'order_id': order.id, 'food_item_id': line['food_item_id'], 'quantity': line['quantity'],
+             'unit_price': line['unit_price'], 'line_total': line['line_total']}
+            for order, line in lines
+        ])
         db.session.commit()
         
-        # Clear cart
-        session['cart'] = []
-        session.modified = True
+        cart.clear(customer_id)
         
         flash("Your order has been placed successfully! Please wait for admin verification of your payment.", "success")
         return redirect(url_for("customer.order_history"))
@@ -184,7 +181,7 @@ def place_order():
 @login_required
 @customer_required
 def order_history():
-    orders = Order.query.filter_by(customer_id=current_user.id).all()
+    orders = Order.query.filter_by(customer_id=current_user.id).options(*order_list_options()).all()
     return render_template("order_history.html", orders=orders)
 
 
@@ -197,21 +194,21 @@ def profile():
     if form.validate_on_submit():
         # Check if password change is requested
         if form.new_password.data:
-            if not bcrypt.check_password_hash(current_user.password, form.existing_password.data):
+            if not password_hasher().verify(form.existing_password.data, current_user.password):
                 flash("Current password is incorrect!", "danger")
                 return redirect(url_for("customer.profile"))
             if form.new_password.data != form.confirm_new_password.data:
                 flash("New passwords do not match!", "danger")
                 return redirect(url_for("customer.profile"))
-            current_user.password = bcrypt.generate_password_hash(form.new_password.data).decode('utf-8')
+            current_user.password = password_hasher().hash(form.new_password.data)
         
         current_user.name = form.name.data
         current_user.email = form.email.data
         current_user.phone_number = form.phone_number.data
         current_user.location = form.location.data
-        db.session.commit()
-        flash("Your profile has been updated!", "success")
-        return redirect(url_for("customer.profile"))
+        if commit_unique(form):
+            flash("Your profile has been updated!", "success")
+            return redirect(url_for("customer.profile"))
     elif request.method == "GET":
         form.name.data = current_user.name
         form.email.data = current_user.email
@@ -1,15 +1,17 @@
-from flask import Blueprint, render_template
-from app.models.food_item import FoodItem
+from flask import Blueprint, render_template, current_app
+from app.utils.catalog import CatalogQuery
+from app.utils.page_cache import CATALOG_TAG, cached_page
 
 main = Blueprint("main", __name__)
 
 @main.route("/")
 @main.route("/home")
+@cached_page(CATALOG_TAG)
 def home():
-    food_items = FoodItem.query.all()
-    return render_template("home.html", food_items=food_items)
+    page = CatalogQuery().page(limit=current_app.config["HOME_FEATURED_ITEMS"])
+    return render_template("home.html", food_items=page.items, has_more=page.has_next)
 
 @main.route("/about")
+@cached_page()
 def about():
     return render_template("about.html", title="About")
-
@@ -0,0 +1,17 @@
+from flask import Blueprint, abort, send_from_directory
+from app.utils.images import VARIANT_NAME, upload_dir
+
+media = Blueprint("media", __name__)
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+@media.route("/<filename>")
+def image(filename):
+    # Content-addressed names never change meaning, so browsers and proxies
+    # may keep them forever and the name itself is the ETag.
+    if not VARIANT_NAME.match(filename):
+        abort(404)
+    response = send_from_directory(upload_dir(), filename, max_age=ONE_YEAR, etag=filename, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
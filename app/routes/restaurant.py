@@ -1,67 +1,98 @@
-import bcrypt
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
+from flask import Blueprint, Response, render_template, redirect, url_for, flash, request, jsonify
 from app import db
 from app.models.food_item import FoodItem
-from app.models.order import Order
+from app.models.order import Order, OrderStatusError
 from app.models.payment import Payment
-from app.utils.food_item_forms import FoodItemForm
+from app.utils.food_item_forms import FoodItemForm, MenuImportForm
+from app.utils.images import image_pipeline
+from app.utils.menu_io import MENU_FORMATS, MenuImportError, import_menu_upload, menu_filename, stream_menu, summarize_import
+from app.utils.passwords import password_hasher
 from app.utils.profile_forms import UpdateProfileForm
+from app.utils.uniqueness import commit_unique
 from app.utils.decorators import restaurant_required
+from app.models.loading import order_list_options
+from app.utils.order_reports import order_report
+from app.utils.sales_analytics import ANALYTICS_RANGES, sales_report
+from app.utils.payments import BulkPaymentError, bulk_request_args, bulk_update_payments, summarize
+from app.utils.order_status import change_order_status, commit_order_change
 from flask_login import login_required, current_user
-import os
-import secrets
-from PIL import Image
 
 restaurant = Blueprint("restaurant", __name__)
 
-def save_picture(form_picture):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, 'static/uploads', picture_fn)
-    
-    # Create uploads directory if it doesn't exist
-    os.makedirs(os.path.dirname(picture_path), exist_ok=True)
-    
-    output_size = (300, 300)
-    img = Image.open(form_picture)
-    img.thumbnail(output_size)
-    img.save(picture_path)
-    
-    return picture_fn
-
 @restaurant.route("/dashboard")
 @login_required
 @restaurant_required
 def dashboard():
     food_items = FoodItem.query.filter_by(restaurant_id=current_user.id).all()
-    orders = Order.query.filter_by(restaurant_id=current_user.id).all()
+    orders = Order.query.filter_by(restaurant_id=current_user.id).options(*order_list_options()).all()
     return render_template("restaurant_dashboard.html", food_items=food_items, orders=orders)
 
+@restaurant.route("/reports")
+@login_required
+@restaurant_required
+def reports():
+    return render_template("order_reports.html", **order_report(current_user.id))
+
+@restaurant.route("/analytics")
+@login_required
+@restaurant_required
+def analytics():
+    days = request.args.get("days", 30, type=int)
+    if days not in ANALYTICS_RANGES:
+        days = 30
+    return render_template("restaurant_analytics.html", report=sales_report(current_user.id, days),
+                           days=days, ranges=ANALYTICS_RANGES)
+
 @restaurant.route("/add_food_item", methods=["GET", "POST"])
 @login_required
 @restaurant_required
 def add_food_item():
     form = FoodItemForm()
     if form.validate_on_submit():
-        image_url = None
-        if form.image.data:
-            image_url = save_picture(form.image.data)
-        
         food_item = FoodItem(
             name=form.name.data,
             description=form.description.data,
             price=form.price.data,
-            image_url=image_url,
             restaurant_id=current_user.id,
             category=form.category.data  # Added category
         )
         db.session.add(food_item)
         db.session.commit()
+        if form.image.data:
+            image_pipeline().submit(form.image.data, food_item.id)
         flash("Food item has been added!", "success")
         return redirect(url_for("restaurant.dashboard"))
     return render_template("add_food_item.html", title="Add Food Item", form=form)
 
+@restaurant.route("/menu/import", methods=["GET", "POST"])
+@login_required
+@restaurant_required
+def import_menu():
+    form = MenuImportForm()
+    errors = []
+    if form.validate_on_submit():
+        try:
+            result = import_menu_upload(current_user.id, form.menu.data, form.images.data)
+        except MenuImportError as e:
+            errors = [str(e)]
+        else:
+            errors = result["errors"]
+            if not errors:
+                flash(summarize_import(result), "success")
+                return redirect(url_for("restaurant.dashboard"))
+    return render_template("import_menu.html", title="Import Menu", form=form, errors=errors)
+
+@restaurant.route("/menu/export")
+@login_required
+@restaurant_required
+def export_menu():
+    format = request.args.get("format", "csv")
+    if format not in MENU_FORMATS:
+        flash("Format must be csv, jsonl or zip.", "danger")
+        return redirect(url_for("restaurant.dashboard"))
+    return Response(stream_menu(current_user.id, format), mimetype=MENU_FORMATS[format],
+                    headers={"Content-Disposition": f'attachment; filename="{menu_filename(current_user.id, format)}"'})
+
 @restaurant.route("/edit_food_item/<int:food_item_id>", methods=["GET", "POST"])
 @login_required
 @restaurant_required
@@ -78,10 +109,9 @@ def edit_food_item(food_item_id):
         food_item.price = form.price.data
         food_item.category = form.category.data  # Added category
         
-        if form.image.data:
-            food_item.image_url = save_picture(form.image.data)
-        
         db.session.commit()
+        if form.image.data:
+            image_pipeline().submit(form.image.data, food_item.id)
         flash("Food item has been updated!", "success")
         return redirect(url_for("restaurant.dashboard"))
     elif request.method == "GET":
@@ -110,7 +140,7 @@ def delete_food_item(food_item_id):
 @login_required
 @restaurant_required
 def manage_orders():
-    orders = Order.query.filter_by(restaurant_id=current_user.id).options(db.joinedload(Order.payment)).all()
+    orders = Order.query.filter_by(restaurant_id=current_user.id).options(*order_list_options()).all()
     return render_template("manage_orders.html", orders=orders)
 
 @restaurant.route("/update_order_status/<int:order_id>/<status>", methods=["POST"])
@@ -122,13 +152,11 @@ def update_order_status(order_id, status):
         flash("You can only update your own orders.", "danger")
         return redirect(url_for("restaurant.manage_orders"))
     
-    valid_statuses = ['accepted', 'preparing', 'ready', 'delivered', 'cancelled']
-    if status in valid_statuses:
-        order.status = status
-        db.session.commit()
+    try:
+        change_order_status(order, status, request.form.get("version", type=int))
         flash(f"Order status updated to {status}!", "success")
-    else:
-        flash("Invalid status!", "danger")
+    except OrderStatusError as e:
+        flash(str(e), "danger")
     
     return redirect(url_for("restaurant.manage_orders"))
 
@@ -145,13 +173,18 @@ def verify_payment(payment_id):
     
     # Update payment and order status
     if payment.payment_status == 'pending':
+        # Load the order first so both changes go out in a single flush
+        order_id = payment.order_id
+        order = db.session.get(Order, order_id)
         payment.payment_status = 'verified'
-        # Safely get the associated order
-        order = Order.query.get(payment.order_id)
-        if order and order.restaurant_id == current_user.id and order.status == 'pending':
-            order.status = 'accepted'
-        db.session.commit()
-        flash(f"Payment for Order #{payment.order_id} has been verified and order accepted!", "success")
+        if order and order.restaurant_id == current_user.id and order.can_transition_to('accepted'):
+            order.transition_to('accepted')
+        try:
+            commit_order_change(order)
+        except OrderStatusError as e:
+            flash(str(e), "danger")
+            return redirect(url_for("restaurant.manage_orders"))
+        flash(f"Payment for Order #{order_id} has been verified and order accepted!", "success")
         return redirect(url_for("restaurant.manage_orders"))
     else:
         flash("Payment is already verified or has a different status.", "warning")
@@ -172,20 +205,43 @@ def update_payment_status(payment_id):
     valid_payment_statuses = ["verified", "failed"]
 
     if new_status in valid_payment_statuses:
+        order_id = payment.order_id
+        order = db.session.get(Order, order_id)
         payment.payment_status = new_status
         if new_status == 'verified':
-            order = Order.query.get(payment.order_id)
-            if order and order.restaurant_id == current_user.id and order.status == 'pending':
-                order.status = 'accepted'
-        db.session.commit()
-        flash(f"Payment status for Order #{payment.order_id} updated to {new_status}!", "success")
+            if order and order.restaurant_id == current_user.id and order.can_transition_to('accepted'):
+                order.transition_to('accepted')
+        try:
+            commit_order_change(order)
+        except OrderStatusError as e:
+            flash(str(e), "danger")
+            return redirect(url_for("restaurant.manage_orders"))
+        flash(f"Payment status for Order #{order_id} updated to {new_status}!", "success")
         if new_status == 'verified':
-            flash(f"Order #{payment.order_id} has been accepted.", "success")
+            flash(f"Order #{order_id} has been accepted.", "success")
     else:
         flash("Invalid payment status!", "danger")
     
     return redirect(url_for("restaurant.manage_orders"))
 
+@restaurant.route("/bulk_payments", methods=["POST"])
+@login_required
+@restaurant_required
+def bulk_payments():
+    try:
+        args = bulk_request_args(request)
+        args.pop('restaurant_id', None)
+        results = bulk_update_payments(owner_id=current_user.id, **args)
+    except BulkPaymentError as e:
+        if request.is_json:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        flash(str(e), "danger")
+        return redirect(url_for("restaurant.manage_orders"))
+    if request.is_json:
+        return jsonify({'status': 'success', 'results': results}), 200
+    flash(summarize(results), "success")
+    return redirect(url_for("restaurant.manage_orders"))
+
 @restaurant.route("/profile", methods=["GET", "POST"])
 @login_required
 @restaurant_required
@@ -194,21 +250,21 @@ def profile():
     if form.validate_on_submit():
         # Check if password change is requested
         if form.new_password.data:
-            if not bcrypt.check_password_hash(current_user.password, form.existing_password.data):
+            if not password_hasher().verify(form.existing_password.data, current_user.password):
                 flash("Current password is incorrect!", "danger")
                 return redirect(url_for("restaurant.profile"))
             if form.new_password.data != form.confirm_new_password.data:
                 flash("New passwords do not match!", "danger")
                 return redirect(url_for("restaurant.profile"))
-            current_user.password = bcrypt.generate_password_hash(form.new_password.data).decode('utf-8')
+            current_user.password = password_hasher().hash(form.new_password.data)
         
         current_user.name = form.name.data
         current_user.email = form.email.data
         current_user.phone_number = form.phone_number.data
         current_user.location = form.location.data
-        db.session.commit()
-        flash("Your profile has been updated!", "success")
-        return redirect(url_for("restaurant.profile"))
+        if commit_unique(form):
+            flash("Your profile has been updated!", "success")
+            return redirect(url_for("restaurant.profile"))
     elif request.method == "GET":
         form.name.data = current_user.name
         form.email.data = current_user.email
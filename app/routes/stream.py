@@ -0,0 +1,39 @@
+import time
+from flask import Blueprint, Response, current_app, request
+from flask_login import current_user, login_required
+from app import db
+from app.utils.order_stream import format_event, order_broker
+
+stream = Blueprint("stream", __name__)
+
+@stream.route("/orders")
+@login_required
+def orders():
+    broker = order_broker()
+    user_id = current_user.id
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    if last_id is None:
+        # A fresh page already shows the current state.
+        last_id = broker.latest_id()
+    heartbeat = current_app.config.get("STREAM_HEARTBEAT", 15)
+    # Ending the response now and then frees the worker thread; the browser
+    # reconnects on its own and resumes from the last id it saw.
+    closes_at = time.monotonic() + current_app.config.get("STREAM_MAX_DURATION", 300)
+    # Nothing below touches the database, so give the connection back.
+    db.session.remove()
+
+    def generate(last_id):
+        yield "retry: 3000\n\n"
+        while True:
+            remaining = closes_at - time.monotonic()
+            if remaining <= 0:
+                return
+            events = broker.listen(user_id, last_id, min(heartbeat, remaining))
+            if not events:
+                yield ": keep-alive\n\n"
+            for event_id, name, data in events:
+                last_id = event_id
+                yield format_event(event_id, name, data)
+
+    return Response(generate(last_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
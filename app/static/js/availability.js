@@ -0,0 +1,52 @@
+// Tells the user on the registration form whether an email address or phone
+// number is already taken as soon as they leave the field. The server still
+// checks on submit; this is only a hint.
+(function () {
+    var script = document.currentScript;
+    var url = script.getAttribute('data-availability');
+    var messages = {
+        email: 'That email is taken. Please choose a different one.',
+        phone_number: 'That phone number is taken. Please choose a different one.'
+    };
+
+    function show(input, taken, message) {
+        var hint = input.parentNode.querySelector('[data-availability-hint]');
+        if (!taken) {
+            if (hint) {
+                hint.parentNode.removeChild(hint);
+                input.classList.remove('is-invalid');
+            }
+            return;
+        }
+        if (!hint) {
+            hint = document.createElement('div');
+            hint.className = 'invalid-feedback';
+            hint.setAttribute('data-availability-hint', '');
+            input.parentNode.appendChild(hint);
+        }
+        hint.textContent = message;
+        input.classList.add('is-invalid');
+    }
+
+    Object.keys(messages).forEach(function (field) {
+        var input = document.getElementById(field);
+        if (!input || !window.fetch) {
+            return;
+        }
+        input.addEventListener('change', function () {
+            var value = input.value.trim();
+            if (!value) {
+                show(input, false);
+                return;
+            }
+            fetch(url + '?' + field + '=' + encodeURIComponent(value), {credentials: 'same-origin'})
+                .then(function (response) { return response.ok ? response.json() : {}; })
+                .then(function (result) {
+                    if (field in result && input.value.trim() === value) {
+                        show(input, !result[field], messages[field]);
+                    }
+                })
+                .catch(function () {});
+        });
+    });
+})();
@@ -0,0 +1,51 @@
+// Applies order and payment changes pushed over /stream/orders to the order
+// tables on the page instead of reloading them. Tables opt in with
+// data-order-live; rows carry data-order-id.
+(function () {
+    var script = document.currentScript;
+    var table = document.querySelector('[data-order-live]');
+    if (!window.EventSource || !table) {
+        return;
+    }
+
+    function title(text) {
+        return text.charAt(0).toUpperCase() + text.slice(1);
+    }
+
+    function setStatus(orderId, selector, className, status) {
+        var cell = table.querySelector('[data-order-id="' + orderId + '"] ' + selector);
+        if (!cell) {
+            return;
+        }
+        cell.textContent = title(status);
+        if (cell.classList.contains(className)) {
+            cell.className = className + ' ' + status;
+        }
+    }
+
+    function notice(message) {
+        var alert = document.createElement('div');
+        alert.className = 'alert alert-info';
+        alert.setAttribute('role', 'status');
+        alert.appendChild(document.createTextNode(message + ' '));
+        var reload = document.createElement('a');
+        reload.href = window.location.href;
+        reload.textContent = 'Refresh';
+        alert.appendChild(reload);
+        table.parentNode.insertBefore(alert, table);
+    }
+
+    var source = new EventSource(script.dataset.stream);
+    source.addEventListener('order.created', function (event) {
+        var data = JSON.parse(event.data);
+        notice('New order #' + data.order_id + ' received ($' + data.total_price + ').');
+    });
+    source.addEventListener('order.status', function (event) {
+        var data = JSON.parse(event.data);
+        setStatus(data.order_id, '[data-order-status]', 'order-status', data.status);
+    });
+    source.addEventListener('payment.status', function (event) {
+        var data = JSON.parse(event.data);
+        setStatus(data.order_id, '[data-payment-status]', 'payment-status', data.payment_status);
+    });
+})();
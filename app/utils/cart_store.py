@@ -0,0 +1,129 @@
+import os
+import threading
+from decimal import Decimal
+from flask import current_app
+from app.utils.local_sqlite import LocalSqlite
+
+# Server-side carts keyed by (user id, food item id). The session cookie only
+# carries the Flask-Login user id; the cart itself lives in one of these stores:
+#   memory - a dict per process, for tests and single-worker development
+#   sqlite - a local SQLite file shared by every worker on the host
+
+
+class MemoryCartStore:
+    def __init__(self):
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def items(self, user_id):
+        with self._lock:
+            return [dict(entry) for entry in self._carts.get(user_id, {}).values()]
+
+    def add(self, user_id, food_item_id, name, price, restaurant_id, quantity):
+        with self._lock:
+            cart = self._carts.setdefault(user_id, {})
+            entry = cart.get(food_item_id)
+            if entry is None:
+                cart[food_item_id] = {'food_item_id': food_item_id, 'name': name, 'price': Decimal(str(price)),
+                                      'restaurant_id': restaurant_id, 'quantity': quantity}
+            else:
+                entry['quantity'] += quantity
+
+    def refresh(self, user_id, food_item_id, name, price, restaurant_id):
+        with self._lock:
+            entry = self._carts.get(user_id, {}).get(food_item_id)
+            if entry is not None:
+                entry.update(name=name, price=Decimal(str(price)), restaurant_id=restaurant_id)
+
+    def set_quantity(self, user_id, food_item_id, quantity):
+        if quantity <= 0:
+            return self.remove(user_id, food_item_id)
+        with self._lock:
+            entry = self._carts.get(user_id, {}).get(food_item_id)
+            if entry is not None:
+                entry['quantity'] = quantity
+            return entry
+
+    def remove(self, user_id, food_item_id):
+        with self._lock:
+            return self._carts.get(user_id, {}).pop(food_item_id, None)
+
+    def clear(self, user_id):
+        with self._lock:
+            self._carts.pop(user_id, None)
+
+
+class SqliteCartStore:
+    def __init__(self, path):
+        self.db = LocalSqlite(path,
+            "CREATE TABLE IF NOT EXISTS cart_items ("
+            " user_id INTEGER NOT NULL,"
+            " food_item_id INTEGER NOT NULL,"
+            " name TEXT NOT NULL,"
+            " price TEXT NOT NULL,"
+            " restaurant_id INTEGER NOT NULL,"
+            " quantity INTEGER NOT NULL,"
+            " added_at REAL NOT NULL DEFAULT (julianday('now')),"
+            " PRIMARY KEY (user_id, food_item_id))"
+        )
+
+    def _entry(self, row):
+        return {'food_item_id': row['food_item_id'], 'name': row['name'], 'price': Decimal(row['price']),
+                'restaurant_id': row['restaurant_id'], 'quantity': row['quantity']}
+
+    def items(self, user_id):
+        rows = self.db.execute(
+            "SELECT food_item_id, name, price, restaurant_id, quantity FROM cart_items "
+            "WHERE user_id = ? ORDER BY added_at, food_item_id", (user_id,)
+        )
+        return [self._entry(row) for row in rows]
+
+    def add(self, user_id, food_item_id, name, price, restaurant_id, quantity):
+        self.db.execute(
+            "INSERT INTO cart_items (user_id, food_item_id, name, price, restaurant_id, quantity) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, food_item_id) DO UPDATE SET quantity = quantity + excluded.quantity",
+            (user_id, food_item_id, name, str(price), restaurant_id, quantity)
+        )
+
+    def refresh(self, user_id, food_item_id, name, price, restaurant_id):
+        self.db.execute(
+            "UPDATE cart_items SET name = ?, price = ?, restaurant_id = ? WHERE user_id = ? AND food_item_id = ?",
+            (name, str(price), restaurant_id, user_id, food_item_id)
+        )
+
+    def set_quantity(self, user_id, food_item_id, quantity):
+        if quantity <= 0:
+            return self.remove(user_id, food_item_id)
+        row = self.db.execute(
+            "UPDATE cart_items SET quantity = ? WHERE user_id = ? AND food_item_id = ? "
+            "RETURNING food_item_id, name, price, restaurant_id, quantity",
+            (quantity, user_id, food_item_id)
+        ).fetchone()
+        return self._entry(row) if row else None
+
+    def remove(self, user_id, food_item_id):
+        row = self.db.execute(
+            "DELETE FROM cart_items WHERE user_id = ? AND food_item_id = ? "
+            "RETURNING food_item_id, name, price, restaurant_id, quantity",
+            (user_id, food_item_id)
+        ).fetchone()
+        return self._entry(row) if row else None
+
+    def clear(self, user_id):
+        self.db.execute("DELETE FROM cart_items WHERE user_id = ?", (user_id,))
+
+
+def init_cart_store(app):
+    backend = app.config.get('CART_BACKEND', 'sqlite')
+    if backend == 'memory':
+        store = MemoryCartStore()
+    elif backend == 'sqlite':
+        store = SqliteCartStore(app.config.get('CART_DATABASE') or os.path.join(app.instance_path, 'carts.db'))
+    else:
+        raise ValueError(f"Unknown CART_BACKEND: {backend}")
+    app.extensions['cart_store'] = store
+    return store
+
+def cart_store():
+    return current_app.extensions['cart_store']
@@ -0,0 +1,228 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import and_, case, or_
+from sqlalchemy.orm import contains_eager
+from app.models.food_item import FoodItem
+from app.models.user import User
+from app.models.catalog_facet import CatalogFacet
+from app.utils.page_cache import CATALOG_TAG, cached_fragment
+from app.utils.search import search_food_items
+
+# Each sort is a list of (column, descending) pairs; FoodItem.id is always
+# appended as the tie-breaker so the keyset is unique.
+SORT_OPTIONS = {
+    "newest": [(FoodItem.created_at, True)],
+    "price_asc": [(FoodItem.price, False)],
+    "price_desc": [(FoodItem.price, True)],
+    "name": [(FoodItem.name, False)],
+}
+DEFAULT_SORT = "newest"
+# Only offered with a search; pages follow the order of the ranked matches.
+RELEVANCE = "relevance"
+
+
+def _to_decimal(value):
+    if value in (None, ""):
+        return None
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _to_int(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+    if column is FoodItem.created_at:
+        return datetime.fromisoformat(value)
+    if column is FoodItem.price:
+        return Decimal(value)
+    return value
+
+
+class CatalogPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class CatalogQuery:
+    def __init__(self, q=None, category=None, restaurant_id=None, min_price=None, max_price=None, sort=DEFAULT_SORT):
+        self.q = (q or "").strip() or None
+        self.category = category or None
+        self.restaurant_id = restaurant_id
+        self.min_price = min_price
+        self.max_price = max_price
+        if sort in SORT_OPTIONS or (sort == RELEVANCE and self.q):
+            self.sort = sort
+        else:
+            self.sort = DEFAULT_SORT
+        self._ranked_ids = None
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            q=args.get("q"),
+            category=args.get("category"),
+            restaurant_id=_to_int(args.get("restaurant")),
+            min_price=_to_decimal(args.get("min_price")),
+            max_price=_to_decimal(args.get("max_price")),
+            sort=args.get("sort") or (RELEVANCE if (args.get("q") or "").strip() else DEFAULT_SORT),
+        )
+
+    def to_args(self):
+        args = {
+            "q": self.q,
+            "category": self.category,
+            "restaurant": self.restaurant_id,
+            "min_price": self.min_price,
+            "max_price": self.max_price,
+            "sort": self.sort if self.sort != self.default_sort else None,
+        }
+        return {key: value for key, value in args.items() if value is not None}
+
+    @property
+    def default_sort(self):
+        return RELEVANCE if self.q else DEFAULT_SORT
+
+    @property
+    def ranked_ids(self):
+        if self._ranked_ids is None:
+            self._ranked_ids = search_food_items(self.q) if self.q else []
+        return self._ranked_ids
+
+    @property
+    def sort_keys(self):
+        keys = list(SORT_OPTIONS[self.sort])
+        keys.append((FoodItem.id, keys[0][1]))
+        return keys
+
+    def _base_query(self):
+        query = (
+            FoodItem.query
+            .join(User, User.id == FoodItem.restaurant_id)
+            .options(contains_eager(FoodItem.restaurant_owner).load_only(User.id, User.name))
+        )
+        if self.category:
+            query = query.filter(FoodItem.category == self.category)
+        if self.restaurant_id is not None:
+            query = query.filter(FoodItem.restaurant_id == self.restaurant_id)
+        if self.min_price is not None:
+            query = query.filter(FoodItem.price >= self.min_price)
+        if self.max_price is not None:
+            query = query.filter(FoodItem.price <= self.max_price)
+        return query
+
+    def _after(self, values):
+        # Expands (a, b, id) > (x, y, z) into OR-ed prefix comparisons so
+        # each sort column may have its own direction.
+        clauses = []
+        keys = self.sort_keys
+        for i, (column, descending) in enumerate(keys):
+            equal = [keys[j][0] == values[j] for j in range(i)]
+            beyond = column < values[i] if descending else column > values[i]
+            clauses.append(and_(*equal, beyond))
+        return or_(*clauses)
+
+    def encode_cursor(self, food_item):
+        values = [_encode_value(getattr(food_item, column.key)) for column, _ in self.sort_keys]
+        raw = json.dumps([self.sort, values], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, cursor):
+        try:
+            sort, values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            keys = self.sort_keys
+            if sort != self.sort or len(values) != len(keys):
+                return None
+            return [_decode_value(column, value) for (column, _), value in zip(keys, values)]
+        except (ValueError, TypeError, InvalidOperation):
+            return None
+
+    def page(self, cursor=None, limit=24):
+        if self.q and not self.ranked_ids:
+            return CatalogPage([], None)
+        if self.sort == RELEVANCE:
+            return self._relevance_page(cursor, limit)
+        query = self._base_query()
+        if self.q:
+            query = query.filter(FoodItem.id.in_(self.ranked_ids))
+        values = self.decode_cursor(cursor) if cursor else None
+        if values is not None:
+            query = query.filter(self._after(values))
+        order_by = [column.desc() if descending else column.asc() for column, descending in self.sort_keys]
+        # One extra row tells us whether another page exists without a COUNT.
+        rows = query.order_by(*order_by).limit(limit + 1).all()
+        next_cursor = self.encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return CatalogPage(rows[:limit], next_cursor)
+
+    def _relevance_page(self, cursor, limit):
+        # The cursor is a position in the ranked matches; filters may drop
+        # some of them, so the next cursor points past the last row shown.
+        start = self.decode_position(cursor) if cursor else 0
+        positions = {food_item_id: position for position, food_item_id in enumerate(self.ranked_ids) if position >= start}
+        if not positions:
+            return CatalogPage([], None)
+        rows = (
+            self._base_query()
+            .filter(FoodItem.id.in_(list(positions)))
+            .order_by(case(positions, value=FoodItem.id))
+            .limit(limit + 1)
+            .all()
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            raw = json.dumps([RELEVANCE, positions[rows[limit - 1].id] + 1], separators=(",", ":"))
+            next_cursor = base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+        return CatalogPage(rows[:limit], next_cursor)
+
+    def decode_position(self, cursor):
+        try:
+            sort, position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return position if sort == RELEVANCE and isinstance(position, int) and position >= 0 else 0
+        except (ValueError, TypeError):
+            return 0
+
+
+def catalog_filter_options():
+    # The same for every browse page, so kept until the catalog changes.
+    return cached_fragment("catalog_filter_options", (CATALOG_TAG,), _load_filter_options)
+
+def _load_filter_options():
+    facets = CatalogFacet.grouped()
+    categories = [{"name": facet.key, "count": facet.item_count} for facet in facets["category"]]
+    restaurants = [{"id": int(facet.key), "name": facet.label, "count": facet.item_count} for facet in facets["restaurant"]]
+    return categories, restaurants
+
+def catalog_facets():
+    """Every category and restaurant on the menu with its item count and price range."""
+    facets = CatalogFacet.grouped()
+    return {
+        "categories": [{"name": facet.key, "count": facet.item_count, "min_price": facet.min_price, "max_price": facet.max_price}
+                       for facet in facets["category"]],
+        "restaurants": [{"id": int(facet.key), "name": facet.label, "count": facet.item_count,
+                         "min_price": facet.min_price, "max_price": facet.max_price} for facet in facets["restaurant"]],
+    }
@@ -0,0 +1,77 @@
+from decimal import Decimal, ROUND_HALF_UP
+from app import db
+from app.models.food_item import FoodItem
+
+CENT = Decimal('0.01')
+
+def to_money(value):
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class CartReview:
+    def __init__(self, lines, removed, repriced):
+        self.lines = lines
+        self.removed = removed
+        self.repriced = repriced
+
+    @property
+    def changed(self):
+        return bool(self.removed or self.repriced)
+
+    @property
+    def total(self):
+        return sum((line['line_total'] for line in self.lines), Decimal('0.00'))
+
+    def by_restaurant(self):
+        groups = {}
+        for line in self.lines:
+            groups.setdefault(line['restaurant_id'], []).append(line)
+        return groups
+
+
+def review_cart(entries):
+    """Reprice cart entries against food_items with a single IN query.
+
+    Returns a CartReview whose lines carry the current name, restaurant and
+    unit price. Entries whose food item no longer exists are listed in
+    removed; entries whose price moved are listed in repriced as
+    (line, price the customer saw).
+    """
+    ids = [entry['food_item_id'] for entry in entries]
+    current = {}
+    if ids:
+        rows = db.session.query(FoodItem.id, FoodItem.name, FoodItem.price, FoodItem.restaurant_id).filter(FoodItem.id.in_(ids))
+        current = {row.id: row for row in rows}
+    lines, removed, repriced = [], [], []
+    for entry in entries:
+        row = current.get(entry['food_item_id'])
+        if row is None:
+            removed.append(entry)
+            continue
+        unit_price = to_money(row.price)
+        line = {
+            'food_item_id': row.id,
+            'name': row.name,
+            'restaurant_id': row.restaurant_id,
+            'quantity': entry['quantity'],
+            'unit_price': unit_price,
+            'line_total': unit_price * entry['quantity'],
+        }
+        lines.append(line)
+        if to_money(entry['price']) != unit_price:
+            repriced.append((line, to_money(entry['price'])))
+    return CartReview(lines, removed, repriced)
+
+def sync_cart(store, user_id, review):
+    # Brings the stored snapshot in line with the review so the customer
+    # sees (and pays) the current prices on the next checkout page.
+    for entry in review.removed:
+        store.remove(user_id, entry['food_item_id'])
+    for line, _ in review.repriced:
+        store.refresh(user_id, line['food_item_id'], line['name'], line['unit_price'], line['restaurant_id'])
+
+def review_messages(review):
+    messages = [f"{entry['name']} is no longer available and was removed from your cart." for entry in review.removed]
+    messages += [f"The price of {line['name']} changed from ${old:.2f} to ${line['unit_price']:.2f}."
+                 for line, old in review.repriced]
+    return messages
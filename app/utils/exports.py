@@ -0,0 +1,216 @@
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app import db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order, ORDER_TRANSITIONS
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+
+# Streams orders and payments out as CSV or JSON lines for accounting.
+# Rows come off a server-side cursor yield_per rows at a time and are
+# encoded (and optionally gzipped) in chunks as they arrive, so memory stays
+# flat however many rows match. Orders are read joined to their lines in
+# order id order and folded back into one record per order. Records are
+# plain tuples in the order of their kind's columns.
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+EXPORT_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+ORDER_COLUMNS = ('order_id', 'order_date', 'status', 'customer_id', 'customer_name', 'restaurant_id',
+                 'restaurant_name', 'total_price', 'payment_id', 'payment_status', 'bkash_transaction_id', 'items')
+PAYMENT_COLUMNS = ('payment_id', 'payment_date', 'payment_status', 'amount', 'bkash_transaction_id',
+                   'payment_phone_number', 'order_id', 'order_status', 'customer_id', 'customer_name',
+                   'restaurant_id', 'restaurant_name')
+PAYMENT_STATUSES = ('pending', 'verified', 'rejected', 'failed')
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _orders_query(since, until, status):
+    customer, restaurant = aliased(User), aliased(User)
+    query = (
+        select(Order.id.label('order_id'), Order.order_date, Order.status, Order.customer_id,
+               customer.name.label('customer_name'), Order.restaurant_id, restaurant.name.label('restaurant_name'),
+               Order.total_price, Order.payment_id, Payment.payment_status, Payment.bkash_transaction_id,
+               OrderLine.quantity, FoodItem.name.label('food_name'))
+        .join(customer, customer.id == Order.customer_id)
+        .join(restaurant, restaurant.id == Order.restaurant_id)
+        .outerjoin(Payment, Payment.id == Order.payment_id)
+        .outerjoin(OrderLine, OrderLine.order_id == Order.id)
+        .outerjoin(FoodItem, FoodItem.id == OrderLine.food_item_id)
+        .order_by(Order.id, OrderLine.id)
+    )
+    if since is not None:
+        query = query.where(Order.order_date >= since)
+    if until is not None:
+        query = query.where(Order.order_date < until)
+    if status is not None:
+        query = query.where(Order.status == status)
+    return query
+
+def _order_records(rows):
+    # Rows arrive sorted by order id, so each order's lines are adjacent.
+    # The query selects the order columns in ORDER_COLUMNS order, followed
+    # by the line's quantity and food name.
+    for _, lines in groupby(rows, key=itemgetter(0)):
+        lines = list(lines)
+        items = '; '.join(f"{quantity} x {food_name}" for *_, quantity, food_name in lines if quantity)
+        yield tuple(lines[0][:-2]) + (items,)
+
+def _payments_query(since, until, status):
+    customer, restaurant = aliased(User), aliased(User)
+    query = (
+        select(Payment.id.label('payment_id'), Payment.payment_date, Payment.payment_status, Payment.amount,
+               Payment.bkash_transaction_id, Payment.payment_phone_number, Payment.order_id,
+               Order.status.label('order_status'), Payment.customer_id, customer.name.label('customer_name'),
+               Payment.restaurant_id, restaurant.name.label('restaurant_name'))
+        .join(customer, customer.id == Payment.customer_id)
+        .join(restaurant, restaurant.id == Payment.restaurant_id)
+        .outerjoin(Order, Order.id == Payment.order_id)
+        .order_by(Payment.id)
+    )
+    if since is not None:
+        query = query.where(Payment.payment_date >= since)
+    if until is not None:
+        query = query.where(Payment.payment_date < until)
+    if status is not None:
+        query = query.where(Payment.payment_status == status)
+    return query
+
+def _payment_records(rows):
+    return rows
+
+# kind -> (columns, statuses, query, records)
+EXPORTS = {
+    'orders': (ORDER_COLUMNS, tuple(ORDER_TRANSITIONS), _orders_query, _order_records),
+    'payments': (PAYMENT_COLUMNS, PAYMENT_STATUSES, _payments_query, _payment_records),
+}
+
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ExportError(f"{name} must be a date as YYYY-MM-DD.")
+
+def export_options(kind, args):
+    """Validates export parameters from a request's query string or the CLI.
+
+    since and until are inclusive days; status is an order or payment
+    status depending on kind.
+    """
+    if kind not in EXPORTS:
+        raise ExportError("Unknown export.")
+    options = {'kind': kind, 'format': args.get('format') or 'csv', 'gzip': args.get('gzip') in (True, '1', 'true', 'on')}
+    if options['format'] not in EXPORT_FORMATS:
+        raise ExportError("Format must be csv or jsonl.")
+    options['since'] = _parse_day(args['since'], "since") if args.get('since') else None
+    options['until'] = _parse_day(args['until'], "until") + timedelta(days=1) if args.get('until') else None
+    status = args.get('status') or None
+    if status is not None and status not in EXPORTS[kind][1]:
+        raise ExportError(f"Unknown {kind[:-1]} status: {status}")
+    options['status'] = status
+    return options
+
+def export_filename(options):
+    name = f"{options['kind']}-{datetime.utcnow():%Y%m%d-%H%M%S}.{options['format']}"
+    return name + '.gz' if options['gzip'] else name
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def encode_csv(columns, records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def encode_jsonl(columns, records):
+    chunk, size = [], 0
+    for record in records:
+        line = json.dumps(dict(zip(columns, record)), default=_json_value) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    yield ''.join(chunk)
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(kind, format='csv', gzip=False, since=None, until=None, status=None,
+                  engine=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yields the export as bytes. Opens its own connection, so it can run
+    after the request that started it has returned."""
+    engine = engine or db.engine
+    columns, _, build_query, to_records = EXPORTS[kind]
+    encode = encode_csv if format == 'csv' else encode_jsonl
+
+    def chunks():
+        with engine.connect() as connection:
+            rows = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+                build_query(since, until, status))
+            for text in encode(columns, to_records(rows)):
+                if text:
+                    yield text.encode('utf-8')
+
+    return _gzip(chunks()) if gzip else chunks()
+
+
+def init_exports(app):
+    app.cli.add_command(export_command)
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'format', type=click.Choice(sorted(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--since', help="First day to include (YYYY-MM-DD).")
+@click.option('--until', help="Last day to include (YYYY-MM-DD).")
+@click.option('--status', help="Only orders or payments in this status.")
+@click.option('--gzip', is_flag=True, help="Compress the output.")
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), help="Write here instead of stdout.")
+@with_appcontext
+def export_command(kind, format, since, until, status, gzip, output):
+    """Stream orders or payments as CSV or JSON lines."""
+    try:
+        options = export_options(kind, {'format': format, 'since': since, 'until': until, 'status': status, 'gzip': gzip})
+    except ExportError as e:
+        raise click.UsageError(str(e))
+    target = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in stream_export(**options):
+            target.write(chunk)
+    finally:
+        if output:
+            target.close()
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, DecimalField, SubmitField
+from wtforms import Form, StringField, TextAreaField, DecimalField, SubmitField
 from wtforms.validators import DataRequired, Length, NumberRange
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 
 class FoodItemForm(FlaskForm):
     name = StringField("Food Item Name", validators=[DataRequired(), Length(min=2, max=100)])
@@ -11,3 +11,18 @@ class FoodItemForm(FlaskForm):
     category = StringField("Category", validators=[DataRequired(), Length(min=2, max=50)])  # Added category field
     submit = SubmitField("Save Food Item")
 
+
+
+class MenuRowForm(Form):
+    # The rules of FoodItemForm, applied to one row of a menu import. A plain
+    # Form, so rows are checked without a request or a CSRF token.
+    name = FoodItemForm.name
+    description = FoodItemForm.description
+    price = FoodItemForm.price
+    category = FoodItemForm.category
+
+
+class MenuImportForm(FlaskForm):
+    menu = FileField("Menu File", validators=[FileRequired(), FileAllowed(["csv", "jsonl", "json", "zip"])])
+    images = FileField("Photos (Optional zip)", validators=[FileAllowed(["zip"])])
+    submit = SubmitField("Import Menu")
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, SelectField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError
-from app.models.user import User
+from wtforms.validators import DataRequired, Email, Length, EqualTo
+from app.utils.uniqueness import check_unique
 
 class RegistrationForm(FlaskForm):
     name = StringField("Name", validators=[DataRequired(), Length(min=2, max=100)])
@@ -13,15 +13,10 @@ class RegistrationForm(FlaskForm):
     role = SelectField("Register As", choices=[("customer", "Customer"), ("restaurant", "Restaurant")], validators=[DataRequired()])
     submit = SubmitField("Sign Up")
 
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError("That email is taken. Please choose a different one.")
-
-    def validate_phone_number(self, phone_number):
-        user = User.query.filter_by(phone_number=phone_number.data).first()
-        if user:
-            raise ValidationError("That phone number is taken. Please choose a different one.")
+    def validate(self, extra_validators=None):
+        # Email and phone number are checked together, in one query.
+        valid = super().validate(extra_validators)
+        return check_unique(self) and valid
 
 class LoginForm(FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Email()])
@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from app import db, login_manager
+from app.models.user import User
+from app.utils.local_sqlite import LocalSqlite, database_scope
+
+# Caches the columns Flask-Login needs to rebuild current_user, so an
+# authenticated request does not start with a SELECT on users. The password
+# hash is left out; it is loaded from the database on first access.
+IDENTITY_FIELDS = ('name', 'email', 'phone_number', 'location', 'role', 'status')
+
+
+class MemoryIdentityCache:
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return dict(values)
+
+    def set(self, user_id, values):
+        with self._lock:
+            self._entries[user_id] = (dict(values), time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteIdentityCache:
+    # Shared by every worker on the host, so an invalidation in one worker
+    # is seen by the others on their next request. Entries are keyed by the
+    # database they came from as well as the user id, so apps on different
+    # databases sharing the file never see each other's users.
+    def __init__(self, path, ttl=300, scope=''):
+        self.ttl = ttl
+        self.scope = scope
+        self.db = LocalSqlite(path,
+            # identity_cache was keyed by user id alone.
+            "DROP TABLE IF EXISTS identity_cache;"
+            "CREATE TABLE IF NOT EXISTS identities ("
+            " scope TEXT NOT NULL,"
+            " user_id INTEGER NOT NULL,"
+            " data TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " PRIMARY KEY (scope, user_id))"
+        )
+
+    def get(self, user_id):
+        row = self.db.execute(
+            "SELECT data FROM identities WHERE scope = ? AND user_id = ? AND expires_at > ?",
+            (self.scope, user_id, time.time())
+        ).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def set(self, user_id, values):
+        self.db.execute(
+            "INSERT OR REPLACE INTO identities (scope, user_id, data, expires_at) VALUES (?, ?, ?, ?)",
+            (self.scope, user_id, json.dumps(values), time.time() + self.ttl)
+        )
+
+    def invalidate(self, user_id):
+        self.db.execute("DELETE FROM identities WHERE scope = ? AND user_id = ?", (self.scope, user_id))
+
+    def clear(self):
+        self.db.execute("DELETE FROM identities WHERE scope = ?", (self.scope,))
+
+
+def init_identity_cache(app):
+    backend = app.config.get('IDENTITY_CACHE_BACKEND', 'memory')
+    ttl = app.config.get('IDENTITY_CACHE_TTL', 300)
+    if backend == 'memory':
+        cache = MemoryIdentityCache(app.config.get('IDENTITY_CACHE_SIZE', 1024), ttl)
+    elif backend == 'sqlite':
+        path = app.config.get('IDENTITY_CACHE_DATABASE') or os.path.join(app.instance_path, 'identity_cache.db')
+        cache = SqliteIdentityCache(path, ttl, database_scope(app))
+    elif backend in (None, 'none'):
+        cache = None
+    else:
+        raise ValueError(f"Unknown IDENTITY_CACHE_BACKEND: {backend}")
+    app.extensions['identity_cache'] = cache
+    return cache
+
+def identity_cache():
+    return current_app.extensions.get('identity_cache') if has_app_context() else None
+
+def invalidate_user(user_id):
+    cache = identity_cache()
+    if cache is not None:
+        cache.invalidate(user_id)
+
+def clear_identity_cache():
+    # User ids are reused when the database is recreated or reseeded.
+    cache = identity_cache()
+    if cache is not None:
+        cache.clear()
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    cache = identity_cache()
+    values = cache.get(user_id) if cache is not None else None
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None and cache is not None:
+            cache.set(user_id, {field: getattr(user, field) for field in IDENTITY_FIELDS})
+    else:
+        # Rebuild the row as if it had just been loaded and attach it to the
+        # session without a SELECT; unset columns load lazily on access.
+        user = User(id=user_id, **values)
+        make_transient_to_detached(user)
+        user = db.session.merge(user, load=False)
+    if user is None or not user.is_active:
+        return None
+    return user
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault('changed_user_ids', set())
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_user(user_id)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_changed_users(session, previous_transaction):
+    session.info.pop('changed_user_ids', None)
@@ -0,0 +1,90 @@
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+from app.models.stored_image import StoredImage
+from app.utils.images import IMAGE_WIDTHS, VARIANT_NAME, upload_dir
+
+# Garbage collection for the content-addressed upload directory. A digest is
+# removed once no food item has referenced it for IMAGE_GC_GRACE seconds.
+# Files the pipeline left behind without ever being referenced (abandoned
+# uploads, failed jobs, .tmp files) are removed by age. Files that are not
+# content-addressed, such as the seed photos, are never touched.
+
+PIPELINE_LEFTOVER = re.compile(r'^(upload-.*|.*\.tmp)$')
+
+log = logging.getLogger(__name__)
+
+
+def digest_files(directory, digest):
+    return [os.path.join(directory, f"{digest}-{width}.{ext}")
+            for width in IMAGE_WIDTHS for ext in ('jpg', 'png', 'webp')]
+
+def sweep_images(app=None, grace=None):
+    app = app or current_app
+    grace = grace if grace is not None else app.config.get('IMAGE_GC_GRACE', 3600)
+    directory = upload_dir(app)
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    removed = 0
+    table = StoredImage.__table__
+
+    released = db.session.execute(
+        db.select(table.c.digest).where(table.c.ref_count <= 0, table.c.released_at <= cutoff)
+    ).scalars().all()
+    for digest in released:
+        # The guard skips digests that were referenced again since the SELECT.
+        with db.engine.begin() as connection:
+            deleted = connection.execute(
+                table.delete().where(table.c.digest == digest, table.c.ref_count <= 0)
+            ).rowcount
+        if deleted:
+            for path in digest_files(directory, digest):
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+
+    if os.path.isdir(directory):
+        known = set(db.session.execute(db.select(table.c.digest)).scalars())
+        oldest = time.time() - grace
+        for name in os.listdir(directory):
+            match = VARIANT_NAME.match(name)
+            unreferenced = match is not None and match.group('digest') not in known
+            if not (unreferenced or PIPELINE_LEFTOVER.match(name)):
+                continue
+            path = os.path.join(directory, name)
+            if os.path.getmtime(path) < oldest:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def _sweep_forever(app, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                removed = sweep_images(app)
+            if removed:
+                log.info("Image sweep removed %d file(s)", removed)
+        except Exception:
+            log.exception("Image sweep failed")
+
+def init_image_store(app):
+    interval = app.config.get('IMAGE_GC_INTERVAL')
+    if interval and not app.testing:
+        threading.Thread(target=_sweep_forever, args=(app, interval), name='image-gc', daemon=True).start()
+    app.cli.add_command(gc_images_command)
+
+
+@click.command('gc-images')
+@click.option('--grace', type=int, default=None, help="Seconds an unreferenced image is kept.")
+@with_appcontext
+def gc_images_command(grace):
+    """Delete uploaded images that no food item references any more."""
+    click.echo(f"Removed {sweep_images(grace=grace)} file(s).")
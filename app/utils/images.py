@@ -0,0 +1,181 @@
+import atexit
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app, url_for
+from PIL import Image, ImageOps
+from app import db
+from app.models.food_item import FoodItem
+from app.utils.instrumentation import timed
+
+# Food item photos are resized outside the request. The upload is streamed to
+# disk while it is hashed, and a worker process writes every variant:
+#   <hash>-<width>.<jpg|png>   the fallback format (png keeps transparency)
+#   <hash>-<width>.webp
+# FoodItem.image_url stores the smallest fallback variant; the other variants
+# are derived from its name.
+
+IMAGE_WIDTHS = (300, 600)
+CHUNK_SIZE = 64 * 1024
+VARIANT_NAME = re.compile(r'^(?P<digest>[0-9a-f]{20})-(?P<width>\d+)\.(?P<ext>jpg|png|webp)$')
+
+log = logging.getLogger(__name__)
+
+
+def upload_dir(app=None):
+    app = app or current_app
+    return app.config.get('IMAGE_UPLOAD_DIR') or os.path.join(app.root_path, 'static', 'uploads')
+
+def variant_name(digest, width, ext):
+    return f"{digest}-{width}.{ext}"
+
+def stream_upload(file_storage, directory):
+    # Copies the upload to a temporary file in chunks, hashing as it goes, so
+    # a large photo is never held in memory. Returns (digest, path).
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    handle, path = tempfile.mkstemp(prefix='upload-', dir=directory)
+    with os.fdopen(handle, 'wb') as out:
+        while True:
+            chunk = file_storage.stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()[:20], path
+
+def render_variants(source, directory, digest):
+    # Runs in a worker process. Returns the name to store in image_url.
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            transparent = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if transparent else 'RGB')
+            fallback = 'png' if transparent else 'jpg'
+            for width in IMAGE_WIDTHS:
+                resized = image.copy()
+                resized.thumbnail((width, width), Image.LANCZOS)
+                _save_atomic(resized, os.path.join(directory, variant_name(digest, width, fallback)),
+                             'PNG' if transparent else 'JPEG', optimize=True, **({} if transparent else {'quality': 85}))
+                _save_atomic(resized, os.path.join(directory, variant_name(digest, width, 'webp')), 'WEBP', quality=80, method=4)
+        return variant_name(digest, IMAGE_WIDTHS[0], fallback)
+    finally:
+        os.remove(source)
+
+def _save_atomic(image, path, format, **options):
+    # Readers never see a half-written file under its final name.
+    temporary = f"{path}.{os.getpid()}.tmp"
+    image.save(temporary, format, **options)
+    os.replace(temporary, path)
+
+def existing_variant(directory, digest):
+    # Only counts as processed once every variant is on disk.
+    for ext in ('jpg', 'png'):
+        names = [variant_name(digest, width, kind) for width in IMAGE_WIDTHS for kind in (ext, 'webp')]
+        if all(os.path.exists(os.path.join(directory, name)) for name in names):
+            return names[0]
+    return None
+
+
+class ImagePipeline:
+    def __init__(self, app):
+        self.app = app
+        self.mode = app.config.get('IMAGE_PIPELINE', 'process')
+        self.workers = app.config.get('IMAGE_WORKERS', 2)
+        self._executor = None
+        # The digest of the latest upload per food item. A job that finishes
+        # after a newer upload was submitted is dropped, so an older photo
+        # never replaces a newer one.
+        self._expected = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created on first use so worker processes are not forked at import.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            atexit.register(self._executor.shutdown, wait=False)
+        return self._executor
+
+    def submit(self, file_storage, food_item_id):
+        """Stream an upload to disk and schedule its resizing.
+
+        FoodItem.image_url is set when the variants are ready; until then the
+        item keeps its previous image. Returns the image_url right away when
+        identical bytes were processed before, otherwise None.
+        """
+        directory = upload_dir(self.app)
+        digest, source = stream_upload(file_storage, directory)
+        with self._lock:
+            self._expected[food_item_id] = digest
+        name = existing_variant(directory, digest)
+        if name is not None:
+            os.remove(source)
+            self._finish(food_item_id, digest, name)
+            return name
+        if self.mode == 'sync':
+            with timed('image'):
+                name = render_variants(source, directory, digest)
+            self._finish(food_item_id, digest, name)
+            return None
+        future = self._pool().submit(render_variants, source, directory, digest)
+        future.add_done_callback(lambda done: self._on_done(done, food_item_id, digest))
+        return None
+
+    def _on_done(self, future, food_item_id, digest):
+        try:
+            name = future.result()
+        except Exception:
+            log.exception("Image processing failed for food item %s", food_item_id)
+            name = None
+        with self.app.app_context():
+            self._finish(food_item_id, digest, name)
+
+    def _finish(self, food_item_id, digest, name):
+        # The lock is held through the commit so a newer upload cannot finish
+        # between the check and the write.
+        with self._lock:
+            if self._expected.get(food_item_id) != digest:
+                log.info("Dropping stale image %s for food item %s", digest, food_item_id)
+                return
+            del self._expected[food_item_id]
+            if name is None:
+                return
+            food_item = db.session.get(FoodItem, food_item_id)
+            if food_item is not None and food_item.image_url != name:
+                food_item.image_url = name
+                db.session.commit()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def init_image_pipeline(app):
+    pipeline = ImagePipeline(app)
+    app.extensions['image_pipeline'] = pipeline
+    app.jinja_env.globals.update(image_src=image_src, image_srcset=image_srcset)
+    return pipeline
+
+def image_pipeline():
+    return current_app.extensions['image_pipeline']
+
+
+def image_src(image_url):
+    # Pipeline variants are served by the media blueprint with immutable
+    # caching; older uploads stay on the static endpoint.
+    if VARIANT_NAME.match(image_url):
+        return url_for('media.image', filename=image_url)
+    return url_for('static', filename='uploads/' + image_url)
+
+def image_srcset(image_url, ext=None):
+    # Empty for names that predate the pipeline, which have a single size.
+    match = VARIANT_NAME.match(image_url or '')
+    if match is None:
+        return ''
+    ext = ext or match.group('ext')
+    return ', '.join(f"{image_src(variant_name(match.group('digest'), width, ext))} {width}w" for width in IMAGE_WIDTHS)
@@ -0,0 +1,221 @@
+import hmac
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from flask import Response, abort, current_app, g, has_app_context, request, template_rendered, before_render_template
+from flask_login import current_user
+from sqlalchemy import event
+from app import db
+
+# Opt-in per-request profiling. A fraction of requests (INSTRUMENTATION_SAMPLE_RATE)
+# is timed: wall time, the number and duration of SQL statements, template
+# rendering, and sections marked with timed() such as bcrypt and image
+# processing. Totals are kept per route (the endpoint name) in this process,
+# together with the slowest statements seen, and are read from
+# /admin/instrumentation or, for Prometheus, /metrics. Requests that are not
+# sampled only pay for one random() call and a few attribute checks.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_STATEMENT_LENGTH = 500
+
+
+class RequestTimings:
+    __slots__ = ('started', 'sql_statements', 'sql_seconds', 'sections', 'template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.sections = {}
+        self.template_started = []
+
+    def add(self, section, seconds):
+        self.sections[section] = self.sections.get(section, 0.0) + seconds
+
+
+class Instruments:
+    def __init__(self, sample_rate=1.0, slow_query_ms=100, slow_query_samples=50):
+        self.sample_rate = sample_rate
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.started_at = datetime.utcnow()
+        self._routes = {}
+        self._slow_queries = deque(maxlen=slow_query_samples)
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, timings):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    'requests': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'sql_statements': 0, 'sql_seconds': 0.0,
+                    'sections': {}, 'buckets': [0] * len(DURATION_BUCKETS),
+                }
+            stats['requests'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['sql_statements'] += timings.sql_statements
+            stats['sql_seconds'] += timings.sql_seconds
+            for section, section_seconds in timings.sections.items():
+                stats['sections'][section] = stats['sections'].get(section, 0.0) + section_seconds
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+                    break
+
+    def record_slow_query(self, route, statement, seconds):
+        with self._lock:
+            self._slow_queries.append({
+                'route': route, 'statement': statement[:MAX_STATEMENT_LENGTH],
+                'ms': round(seconds * 1000, 2), 'at': datetime.utcnow().isoformat(timespec='seconds'),
+            })
+
+    def snapshot(self):
+        """Copies of the per-route totals and slow query samples, slowest route first."""
+        with self._lock:
+            routes = {route: dict(stats, sections=dict(stats['sections']), buckets=list(stats['buckets']))
+                      for route, stats in self._routes.items()}
+            slow_queries = sorted(self._slow_queries, key=lambda sample: -sample['ms'])
+        return {
+            'sample_rate': self.sample_rate, 'since': self.started_at.isoformat(timespec='seconds'),
+            'routes': dict(sorted(routes.items(), key=lambda item: -item[1]['seconds'])),
+            'slow_queries': slow_queries,
+        }
+
+
+def current_timings():
+    # The timings of the current request when it is being sampled, else None.
+    return g.get('request_timings') if has_app_context() else None
+
+@contextmanager
+def timed(section):
+    """Adds the time spent in the block to section for a sampled request."""
+    timings = current_timings()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(section, time.perf_counter() - started)
+
+
+def _route():
+    return request.endpoint or 'unmatched'
+
+def _before_statement(conn, cursor, statement, parameters, context, executemany):
+    if current_timings() is not None:
+        conn.info['statement_started'] = time.perf_counter()
+
+def _after_statement(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    started = conn.info.pop('statement_started', None)
+    if timings is None or started is None:
+        return
+    seconds = time.perf_counter() - started
+    timings.sql_statements += 1
+    timings.sql_seconds += seconds
+    instruments = current_app.extensions['instrumentation']
+    if seconds >= instruments.slow_query_seconds:
+        instruments.record_slow_query(_route(), statement, seconds)
+
+def _template_starting(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None:
+        timings.template_started.append(time.perf_counter())
+
+def _template_done(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None and timings.template_started:
+        timings.add('template', time.perf_counter() - timings.template_started.pop())
+
+
+def init_instrumentation(app):
+    rate = app.config.get('INSTRUMENTATION_SAMPLE_RATE')
+    if not rate:
+        return None
+    instruments = Instruments(rate, app.config.get('INSTRUMENTATION_SLOW_QUERY_MS', 100),
+                              app.config.get('INSTRUMENTATION_SLOW_QUERIES', 50))
+    app.extensions['instrumentation'] = instruments
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_statement)
+        event.listen(db.engine, 'after_cursor_execute', _after_statement)
+    before_render_template.connect(_template_starting, app)
+    template_rendered.connect(_template_done, app)
+
+    @app.before_request
+    def start_timing():
+        if rate >= 1 or random.random() < rate:
+            g.request_timings = RequestTimings()
+
+    @app.after_request
+    def record_timing(response):
+        timings = g.pop('request_timings', None)
+        if timings is None:
+            return response
+        seconds = time.perf_counter() - timings.started
+        instruments.record(_route(), seconds, timings)
+        # Timings tell an outsider things such as whether a login email
+        # exists (only then is a password checked), so only admins see them.
+        if not current_user.is_authenticated or current_user.role != 'admin':
+            return response
+        metrics = [f'total;dur={seconds * 1000:.1f}',
+                   f'sql;dur={timings.sql_seconds * 1000:.1f};desc="{timings.sql_statements} statements"']
+        metrics += [f'{section};dur={section_seconds * 1000:.1f}' for section, section_seconds in timings.sections.items()]
+        response.headers.add('Server-Timing', ', '.join(metrics))
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+    return instruments
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text(snapshot):
+    """The snapshot in the Prometheus text exposition format. Counts cover
+    sampled requests only; divide by the sample rate to estimate totals."""
+    lines = [
+        '# HELP app_instrumentation_sample_rate Fraction of requests that are timed.',
+        '# TYPE app_instrumentation_sample_rate gauge',
+        f"app_instrumentation_sample_rate {snapshot['sample_rate']}",
+    ]
+
+    def family(name, kind, help, samples):
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+
+    routes = snapshot['routes']
+    buckets = []
+    for route, stats in routes.items():
+        label = f'route="{_label(route)}"'
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+            cumulative += count
+            buckets.append(f'app_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        buckets.append(f'app_request_duration_seconds_bucket{{{label},le="+Inf"}} {stats["requests"]}')
+        buckets.append(f'app_request_duration_seconds_sum{{{label}}} {stats["seconds"]:.6f}')
+        buckets.append(f'app_request_duration_seconds_count{{{label}}} {stats["requests"]}')
+    family('app_request_duration_seconds', 'histogram', 'Wall time of sampled requests.', buckets)
+    family('app_sql_statements_total', 'counter', 'SQL statements issued by sampled requests.',
+           [f'app_sql_statements_total{{route="{_label(route)}"}} {stats["sql_statements"]}' for route, stats in routes.items()])
+    family('app_sql_duration_seconds_total', 'counter', 'Time sampled requests spent in SQL statements.',
+           [f'app_sql_duration_seconds_total{{route="{_label(route)}"}} {stats["sql_seconds"]:.6f}' for route, stats in routes.items()])
+    family('app_section_duration_seconds_total', 'counter', 'Time sampled requests spent rendering templates, hashing passwords and processing images.',
+           [f'app_section_duration_seconds_total{{route="{_label(route)}",section="{_label(section)}"}} {seconds:.6f}'
+            for route, stats in routes.items() for section, seconds in sorted(stats['sections'].items())])
+    return '\n'.join(lines) + '\n'
+
+def metrics_endpoint():
+    # Scrapers cannot log in, so /metrics takes a bearer token instead and
+    # is not served at all without one.
+    token = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+        abort(404)
+    snapshot = current_app.extensions['instrumentation'].snapshot()
+    return Response(prometheus_text(snapshot), mimetype='text/plain; version=0.0.4')
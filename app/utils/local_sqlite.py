@@ -0,0 +1,41 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+class LocalSqlite:
+    """A small SQLite file shared by the workers on one host.
+
+    sqlite3 connections cannot be shared across threads, so each thread keeps
+    its own; autocommit makes every statement its own transaction.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection().executescript(schema)
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def database_scope(app):
+    """Names the app's database in a file that apps on other databases may
+    share. Hashed so credentials in the URI are not written to the file."""
+    return hashlib.sha256(app.config['SQLALCHEMY_DATABASE_URI'].encode()).hexdigest()[:16]
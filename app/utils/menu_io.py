@@ -0,0 +1,383 @@
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, select
+from werkzeug.datastructures import FileStorage, MultiDict
+from app import db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.catalog_facet import CatalogFacet
+from app.models.dashboard_stats import DashboardStats
+from app.models.stored_image import StoredImage, image_digest
+from app.utils.exports import encode_csv, encode_jsonl
+from app.utils.food_item_forms import MenuRowForm
+from app.utils.images import IMAGE_WIDTHS, VARIANT_NAME, image_pipeline, upload_dir, variant_name
+from app.utils.page_cache import CATALOG_TAG, stage_page_invalidation
+from app.utils.search import stage_search_documents
+
+# Bulk menu import and export for restaurants. An import is read and checked
+# against FoodItemForm's rules row by row, and written in batches of
+# executemany INSERTs and UPDATEs keyed by (restaurant_id, name) as it goes,
+# all in one transaction: a file with any invalid row changes nothing.
+# Photos come from a zip archive and are queued on the image pipeline after
+# the commit. An image column that names a photo already stored here is used
+# as is, so an exported menu imports back unchanged.
+
+MENU_COLUMNS = ('name', 'description', 'price', 'category', 'image')
+MENU_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'zip': 'application/zip'}
+IMPORT_FORMATS = ('csv', 'jsonl', 'json', 'zip')
+IMAGE_EXTENSIONS = ('.jpg', '.png')  # FoodItemForm's FileAllowed
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ROWS = 5000
+MAX_REPORTED_ERRORS = 20
+
+
+class MenuImportError(ValueError):
+    pass
+
+
+def menu_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension not in IMPORT_FORMATS:
+        raise MenuImportError("Upload a .csv, .jsonl, .json or .zip menu.")
+    return extension
+
+def read_menu_rows(stream, format):
+    """Yields (line or item number, row) from a binary menu file.
+
+    CSV and JSON lines are read a line at a time; a JSON file is a list of
+    items and is parsed whole.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        missing = {'name', 'price', 'category'} - set(reader.fieldnames or ())
+        if missing:
+            raise MenuImportError(f"The CSV header has no {', '.join(sorted(missing))} column.")
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for number, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8-sig'), 1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, None
+    else:
+        try:
+            rows = json.load(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+        except ValueError:
+            raise MenuImportError("The menu is not valid JSON.")
+        if not isinstance(rows, list):
+            raise MenuImportError("A JSON menu must be a list of items.")
+        yield from enumerate(rows, 1)
+
+
+def clean_menu_row(row):
+    """Returns (values, image name, errors) for one row of a menu."""
+    if not isinstance(row, dict):
+        return None, None, ["not an item with name, price and category"]
+    data = MultiDict({column: '' if row.get(column) is None else str(row.get(column)).strip() for column in MENU_COLUMNS})
+    form = MenuRowForm(formdata=data)
+    form.validate()
+    errors = [f"{field}: {message}" for field, messages in form.errors.items() for message in messages]
+    image = data['image'] or None
+    if image is not None and (os.path.basename(image) != image or not image.lower().endswith(IMAGE_EXTENSIONS)):
+        errors.append("image: jpg and png only")
+    if errors:
+        return None, None, errors
+    values = {'name': form.name.data, 'description': form.description.data or None,
+              'price': form.price.data.quantize(Decimal('0.01')), 'category': form.category.data}
+    return values, image, []
+
+
+def _stored_image(name):
+    # A photo already in the upload directory, such as one named by an export.
+    return os.path.isfile(os.path.join(upload_dir(), name))
+
+def _archive_images(archive):
+    if archive is None:
+        return {}
+    limit = current_app.config.get('MAX_CONTENT_LENGTH')
+    return {os.path.basename(member.filename): member for member in archive.infolist()
+            if not member.is_dir() and member.filename.lower().endswith(IMAGE_EXTENSIONS)
+            and (limit is None or member.file_size <= limit)}
+
+def _insert(connection, restaurant_id, rows):
+    # Returns {name: id} for the new rows.
+    table = FoodItem.__table__
+    if connection.dialect.insert_executemany_returning_sort_by_parameter_order:
+        statement = table.insert().returning(table.c.name, table.c.id, sort_by_parameter_order=True)
+        return dict(connection.execute(statement, rows).all())
+    connection.execute(table.insert(), rows)
+    return dict(connection.execute(
+        select(table.c.name, table.c.id)
+        .where(table.c.restaurant_id == restaurant_id, table.c.name.in_([row['name'] for row in rows]))
+    ).all())
+
+def _update(connection, rows):
+    table = FoodItem.__table__
+    connection.execute(table.update().where(table.c.id == bindparam('food_item_id')), rows)
+
+def _changed(current, values, image_url):
+    return ((current.description or None) != values['description'] or current.price != values['price']
+            or current.category != values['category'] or current.image_url != image_url)
+
+
+def import_menu(restaurant_id, rows, archive=None, batch_size=IMPORT_BATCH_SIZE):
+    """Creates or updates a restaurant's food items by name from (number, row) pairs.
+
+    Items missing from the file are left alone. Returns counts of created,
+    updated and unchanged items, the photos queued, and the errors; when
+    there are errors nothing is written.
+    """
+    table = FoodItem.__table__
+    existing = {}
+    for row in db.session.execute(
+        select(table.c.id, table.c.name, table.c.description, table.c.price, table.c.category, table.c.image_url)
+        .where(table.c.restaurant_id == restaurant_id).order_by(table.c.id)
+    ):
+        existing.setdefault(row.name, row)
+    images = _archive_images(archive)
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'images': 0, 'errors': []}
+    error_count = 0
+    seen, written, inserts, updates, uploads, references = set(), [], [], [], [], {}
+    categories, vacated_categories = set(), set()  # for the catalog facets
+    food_item_ids = {}  # name -> id, for the rows written and the photos queued
+    connection = db.session.connection()
+    now = datetime.utcnow()
+
+    def reference(image_url, delta):
+        digest = image_digest(image_url)
+        if digest:
+            references[digest] = references.get(digest, 0) + delta
+
+    def write_batch():
+        if inserts:
+            food_item_ids.update(_insert(connection, restaurant_id, inserts))
+        if updates:
+            _update(connection, updates)
+        del inserts[:], updates[:]
+
+    for count, (number, row) in enumerate(rows, 1):
+        if count > MAX_IMPORT_ROWS:
+            result['errors'].append(f"A menu can have at most {MAX_IMPORT_ROWS} items.")
+            error_count += 1
+            break
+        values, image, errors = clean_menu_row(row)
+        current = existing.get(values['name']) if values else None
+        image_url = current.image_url if current else None
+        if values and values['name'] in seen:
+            errors.append(f"name: {values['name']} appears more than once")
+        elif image is not None and image != image_url:
+            if _stored_image(image):
+                image_url = image
+            elif image in images:
+                uploads.append((values['name'], images[image]))
+            else:
+                errors.append(f"image: {image} is not in the image archive")
+        if errors:
+            error_count += len(errors)
+            result['errors'].extend(f"Row {number}: {error}" for error in errors)
+            del result['errors'][MAX_REPORTED_ERRORS:]
+            continue
+        seen.add(values['name'])
+        if error_count:
+            continue  # still checking the rest of the file, but nothing will be written
+        if current is None:
+            inserts.append(dict(values, restaurant_id=restaurant_id, image_url=image_url, created_at=now))
+            reference(image_url, 1)
+            categories.add(values['category'])
+            written.append(values['name'])
+            result['created'] += 1
+        elif _changed(current, values, image_url):
+            updates.append(dict(values, food_item_id=current.id, image_url=image_url))
+            food_item_ids[current.name] = current.id
+            reference(current.image_url, -1)
+            reference(image_url, 1)
+            categories.add(values['category'])
+            if current.category != values['category']:
+                vacated_categories.add(current.category)
+            written.append(values['name'])
+            result['updated'] += 1
+        else:
+            food_item_ids[current.name] = current.id
+            result['unchanged'] += 1
+        if len(inserts) + len(updates) >= batch_size:
+            write_batch()
+
+    if error_count:
+        if error_count > len(result['errors']):
+            result['errors'].append(f"...and {error_count - len(result['errors'])} more.")
+        db.session.rollback()
+        return result
+    write_batch()
+    # Core statements skip the ORM flush hooks that keep these in step.
+    DashboardStats.apply(connection, {'total_food_items': result['created']})
+    StoredImage.apply(connection, references)
+    stage_search_documents(db.session, [food_item_ids[name] for name in written])
+    if written:
+        CatalogFacet.refresh(connection, categories, [restaurant_id], vacated_categories)
+        stage_page_invalidation(db.session, CATALOG_TAG)
+    db.session.commit()
+
+    pipeline = image_pipeline()
+    for name, member in uploads:
+        with archive.open(member) as image:
+            pipeline.submit(FileStorage(stream=image, filename=member.filename), food_item_ids[name])
+    result['images'] = len(uploads)
+    return result
+
+
+def _menu_member(archive):
+    for format in ('csv', 'jsonl', 'json'):
+        for member in archive.infolist():
+            if member.filename.lower() == f"menu.{format}":
+                return member, format
+    raise MenuImportError("The zip has no menu.csv, menu.jsonl or menu.json.")
+
+def import_menu_upload(restaurant_id, menu_file, images_file=None):
+    """Imports an uploaded menu file, optionally with a zip of photos. A zip
+    menu holds menu.csv (or .jsonl, .json) and its photos."""
+    format = menu_format(menu_file.filename)
+    archives = []
+    try:
+        if images_file:
+            archives.append(_open_zip(images_file.stream, "The image archive"))
+        if format == 'zip':
+            archives.append(_open_zip(menu_file.stream, "The menu"))
+            member, format = _menu_member(archives[-1])
+            stream = archives[-1].open(member)
+        else:
+            stream = menu_file.stream
+        return import_menu(restaurant_id, read_menu_rows(stream, format), archives[0] if archives else None)
+    finally:
+        for archive in archives:
+            archive.close()
+
+def _open_zip(stream, label):
+    try:
+        return zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise MenuImportError(f"{label} is not a valid zip file.")
+
+def summarize_import(result):
+    return (f"{result['created']} item(s) added, {result['updated']} updated, {result['unchanged']} unchanged. "
+            f"{result['images']} photo(s) queued.")
+
+
+def menu_records(restaurant_id):
+    table = FoodItem.__table__
+    rows = db.session.execute(
+        select(table.c.name, table.c.description, table.c.price, table.c.category, table.c.image_url)
+        .where(table.c.restaurant_id == restaurant_id).order_by(table.c.category, table.c.name, table.c.id)
+    )
+    return [(row.name, row.description or '', row.price, row.category, row.image_url or '') for row in rows]
+
+def _image_file(directory, image_url):
+    # The largest variant of a pipeline photo, or the file of an older upload.
+    match = VARIANT_NAME.match(image_url)
+    if match is not None:
+        image_url = variant_name(match.group('digest'), IMAGE_WIDTHS[-1], match.group('ext'))
+    path = os.path.join(directory, image_url)
+    return path if os.path.isfile(path) else None
+
+class _ZipStream:
+    # Write-only target that hands zipfile's output back in pieces; zipfile
+    # writes data descriptors when it cannot seek.
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _zip_menu(records, directory):
+    files, kept = {}, []
+    for record in records:
+        path = _image_file(directory, record[-1]) if record[-1] else None
+        if path is not None:
+            files[record[-1]] = path
+        kept.append(record if path is not None else record[:-1] + ('',))
+    menu = ''.join(encode_csv(MENU_COLUMNS, kept)).encode('utf-8')
+    out = _ZipStream()
+    with zipfile.ZipFile(out, 'w') as archive:
+        archive.writestr('menu.csv', menu, compress_type=zipfile.ZIP_DEFLATED)
+        for name, path in files.items():
+            archive.write(path, name)  # already compressed
+            yield out.drain()
+    yield out.drain()
+
+def stream_menu(restaurant_id, format='csv'):
+    """Yields a restaurant's menu as bytes, in a form import_menu_upload()
+    reads back. A zip holds menu.csv and the photos it names."""
+    records = menu_records(restaurant_id)
+    if format == 'zip':
+        return _zip_menu(records, upload_dir())
+    encode = encode_csv if format == 'csv' else encode_jsonl
+    return (text.encode('utf-8') for text in encode(MENU_COLUMNS, records) if text)
+
+def menu_filename(restaurant_id, format):
+    return f"menu-{restaurant_id}-{datetime.utcnow():%Y%m%d}.{format}"
+
+
+def _restaurant(restaurant_id):
+    user = db.session.get(User, restaurant_id)
+    if user is None or user.role != 'restaurant':
+        raise click.UsageError(f"No restaurant with id {restaurant_id}.")
+    return user
+
+def init_menu_io(app):
+    app.cli.add_command(import_menu_command)
+    app.cli.add_command(export_menu_command)
+
+@click.command('import-menu')
+@click.argument('restaurant_id', type=int)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--images', type=click.Path(exists=True, dir_okay=False), help="Zip of the photos the menu names.")
+@with_appcontext
+def import_menu_command(restaurant_id, path, images):
+    """Add or update a restaurant's food items from a CSV, JSON lines, JSON or zip menu."""
+    _restaurant(restaurant_id)
+    with open(path, 'rb') as menu, (open(images, 'rb') if images else io.BytesIO()) as archive:
+        try:
+            result = import_menu_upload(restaurant_id, FileStorage(stream=menu, filename=path),
+                                        FileStorage(stream=archive, filename=images) if images else None)
+        except MenuImportError as e:
+            raise click.UsageError(str(e))
+    for error in result['errors']:
+        click.echo(error, err=True)
+    if result['errors']:
+        raise SystemExit(1)
+    click.echo(summarize_import(result))
+
+@click.command('export-menu')
+@click.argument('restaurant_id', type=int)
+@click.option('--format', 'format', type=click.Choice(sorted(MENU_FORMATS)), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), help="Write here instead of stdout.")
+@with_appcontext
+def export_menu_command(restaurant_id, format, output):
+    """Write a restaurant's menu as CSV, JSON lines, or a zip with its photos."""
+    _restaurant(restaurant_id)
+    target = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in stream_menu(restaurant_id, format):
+            target.write(chunk)
+    finally:
+        if output:
+            target.close()
@@ -0,0 +1,260 @@
+from datetime import datetime
+import click
+from sqlalchemy import ForeignKeyConstraint, MetaData, Table, inspect, text
+from app import db
+from app.utils.identity_cache import clear_identity_cache
+
+# Versioned schema migrations for databases created before a model change.
+# A fresh database gets the current schema from db.create_all() and is
+# stamped with the latest version; an existing one is brought up to date by
+# upgrade(). Every step must be idempotent, because db.create_all() may have
+# created some of its tables already.
+
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False, default=datetime.utcnow),
+)
+
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+def column_names(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+def create_index(connection, name, table, columns):
+    # Skips indexes over columns that a later migration has already dropped,
+    # so older steps still replay cleanly against a newer schema.
+    existing = {index['name'] for index in inspect(connection).get_indexes(table)}
+    if name not in existing and set(columns) <= column_names(connection, table):
+        connection.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+
+def drop_index(connection, name, table):
+    existing = {index['name'] for index in inspect(connection).get_indexes(table)}
+    if name in existing:
+        if connection.dialect.name == 'mysql':
+            connection.execute(text(f"DROP INDEX {name} ON {table}"))
+        else:
+            connection.execute(text(f"DROP INDEX {name}"))
+
+def drop_columns(connection, table, columns):
+    columns = [column for column in columns if column in column_names(connection, table)]
+    if not columns:
+        return
+    inspector = inspect(connection)
+    indexes = inspector.get_indexes(table)
+    if connection.dialect.name != 'sqlite':
+        for fk in inspector.get_foreign_keys(table):
+            if fk.get('name') and set(fk['constrained_columns']) & set(columns):
+                keyword = 'FOREIGN KEY' if connection.dialect.name == 'mysql' else 'CONSTRAINT'
+                connection.execute(text(f"ALTER TABLE {table} DROP {keyword} {fk['name']}"))
+        for index in indexes:
+            if set(index['column_names']) & set(columns):
+                drop_index(connection, index['name'], table)
+        for column in columns:
+            connection.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        return
+    # SQLite cannot drop a column that takes part in a foreign key, so the
+    # table is rebuilt: copy the surviving columns into a new table, swap the
+    # names and recreate the indexes that do not involve dropped columns.
+    metadata = MetaData()
+    metadata.reflect(connection)
+    old = metadata.tables[table]
+    kept = [column.name for column in old.columns if column.name not in columns]
+    foreign_keys = [
+        ForeignKeyConstraint(fk.column_keys, [element.target_fullname for element in fk.elements])
+        for fk in old.foreign_key_constraints if not set(fk.column_keys) & set(columns)
+    ]
+    new = Table(f"{table}_rebuild", metadata, *[old.columns[name]._copy() for name in kept], *foreign_keys)
+    new.create(connection)
+    column_list = ', '.join(kept)
+    connection.execute(text(f"INSERT INTO {new.name} ({column_list}) SELECT {column_list} FROM {table}"))
+    connection.execute(text(f"DROP TABLE {table}"))
+    connection.execute(text(f"ALTER TABLE {new.name} RENAME TO {table}"))
+    for index in indexes:
+        if not set(index['column_names']) & set(columns):
+            create_index(connection, index['name'], table, index['column_names'])
+
+
+ACCESS_PATH_INDEXES = [
+    ('ix_food_items_created_at_id', 'food_items', ['created_at', 'id']),
+    ('ix_food_items_price_id', 'food_items', ['price', 'id']),
+    ('ix_food_items_name_id', 'food_items', ['name', 'id']),
+    ('ix_food_items_category', 'food_items', ['category']),
+    ('ix_food_items_restaurant_id', 'food_items', ['restaurant_id']),
+    ('ix_orders_restaurant_status_date', 'orders', ['restaurant_id', 'status', 'order_date']),
+    ('ix_orders_customer_date', 'orders', ['customer_id', 'order_date']),
+    ('ix_orders_food_item_id', 'orders', ['food_item_id']),
+    ('ix_orders_order_date', 'orders', ['order_date']),
+    ('ix_orders_payment_id', 'orders', ['payment_id']),
+    ('ix_payments_order_id', 'payments', ['order_id']),
+    ('ix_payments_status_date', 'payments', ['payment_status', 'payment_date']),
+    ('ix_payments_restaurant_status', 'payments', ['restaurant_id', 'payment_status']),
+    ('ix_payments_customer_id', 'payments', ['customer_id']),
+]
+
+@migration(1, "Catalog keyset indexes and order/payment access-path indexes")
+def add_access_path_indexes(connection):
+    for name, table, columns in ACCESS_PATH_INDEXES:
+        create_index(connection, name, table, columns)
+
+@migration(2, "Order headers with order_lines; one payment per restaurant per checkout")
+def add_order_lines(connection):
+    from app.models.order_line import OrderLine
+    OrderLine.__table__.create(connection, checkfirst=True)
+    if 'food_item_id' not in column_names(connection, 'orders'):
+        return
+    # Every legacy order held exactly one item; it becomes that order's only line.
+    connection.execute(text(
+        "INSERT INTO order_lines (order_id, food_item_id, quantity, unit_price, line_total) "
+        "SELECT id, food_item_id, quantity, total_price / quantity, total_price FROM orders "
+        "WHERE id NOT IN (SELECT order_id FROM order_lines)"
+    ))
+    drop_columns(connection, 'orders', ['food_item_id', 'quantity'])
+
+@migration(3, "Reference-counted stored_images for content-addressed uploads")
+def add_stored_images(connection):
+    from app.models.stored_image import StoredImage, image_digest
+    StoredImage.__table__.create(connection, checkfirst=True)
+    if connection.execute(text("SELECT COUNT(*) FROM stored_images")).scalar():
+        return
+    counts = {}
+    for image_url, references in connection.execute(text(
+        "SELECT image_url, COUNT(*) FROM food_items WHERE image_url IS NOT NULL GROUP BY image_url"
+    )):
+        digest = image_digest(image_url)
+        if digest:
+            counts[digest] = counts.get(digest, 0) + references
+    StoredImage.apply(connection, counts)
+
+@migration(4, "Full-text search index over the menu")
+def add_search_index(connection):
+    from app.utils.search import Fts5SearchIndex, fts5_available
+    if fts5_available(connection):
+        Fts5SearchIndex().rebuild(connection)
+
+@migration(5, "Order version column for compare-and-set status changes")
+def add_order_version(connection):
+    if 'version' not in column_names(connection, 'orders'):
+        connection.execute(text("ALTER TABLE orders ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+@migration(6, "Append-only order_events log and the report projections folded from it")
+def add_order_events(connection):
+    from app.models.order_event import OrderEvent
+    from app.models.order_projection import PROJECTIONS, ProjectionCheckpoint
+    from app.utils.order_reports import replace_projections
+    for model in (OrderEvent, ProjectionCheckpoint) + PROJECTIONS:
+        model.__table__.create(connection, checkfirst=True)
+    if not connection.execute(text("SELECT COUNT(*) FROM order_events")).scalar():
+        # Earlier history is lost; each order starts the log in its current
+        # status and each payment in its current state.
+        connection.execute(text(
+            "INSERT INTO order_events (order_id, customer_id, restaurant_id, kind, to_status, amount, placed_at, occurred_at) "
+            "SELECT id, customer_id, restaurant_id, 'placed', status, total_price, order_date, COALESCE(order_date, CURRENT_TIMESTAMP) FROM orders ORDER BY id"
+        ))
+        connection.execute(text(
+            "INSERT INTO order_events (order_id, customer_id, restaurant_id, kind, to_status, amount, occurred_at) "
+            "SELECT order_id, customer_id, restaurant_id, 'payment', payment_status, amount, COALESCE(payment_date, CURRENT_TIMESTAMP) FROM payments ORDER BY id"
+        ))
+    replace_projections(connection)
+
+@migration(7, "Catalog facets: per-category and per-restaurant item counts and price ranges")
+def add_catalog_facets(connection):
+    from app.models.catalog_facet import CatalogFacet
+    CatalogFacet.__table__.create(connection, checkfirst=True)
+    CatalogFacet.rebuild(connection)
+
+@migration(8, "Payments keep the transaction ID as entered, for reuse checks across checkouts")
+def add_payment_reference(connection):
+    if 'bkash_reference' not in column_names(connection, 'payments'):
+        connection.execute(text("ALTER TABLE payments ADD COLUMN bkash_reference VARCHAR(100)"))
+    # Mixed-cart payments were stored as <transaction>_<restaurant id>. A
+    # single-restaurant ID that happens to end the same way is trimmed too,
+    # which only makes the reuse check stricter for it.
+    references = []
+    for payment_id, transaction_id, restaurant_id in connection.execute(text(
+        "SELECT id, bkash_transaction_id, restaurant_id FROM payments WHERE bkash_reference IS NULL"
+    )):
+        suffix = f"_{restaurant_id}"
+        if transaction_id.endswith(suffix) and len(transaction_id) > len(suffix):
+            transaction_id = transaction_id[:-len(suffix)]
+        references.append({'id': payment_id, 'reference': transaction_id})
+    if references:
+        connection.execute(text("UPDATE payments SET bkash_reference = :reference WHERE id = :id"), references)
+    create_index(connection, 'ix_payments_bkash_reference', 'payments', ['bkash_reference'])
+
+@migration(9, "Search version counter, so in-memory search indexes see other workers' changes")
+def add_search_version(connection):
+    from app.utils.search import search_version
+    search_version.create(connection, checkfirst=True)
+
+@migration(10, "Event log checkpoint for the sales analytics cache")
+def add_sales_analytics_checkpoint(connection):
+    # Starts where the report projections are, a point no late event can
+    # land before.
+    connection.execute(text(
+        "INSERT INTO projection_checkpoints (name, last_event_id) "
+        "SELECT 'sales_analytics', last_event_id FROM projection_checkpoints WHERE name = 'order_reports' "
+        "AND NOT EXISTS (SELECT 1 FROM projection_checkpoints WHERE name = 'sales_analytics')"
+    ))
+
+@migration(11, "Restaurant order list index on (restaurant_id, order_date)")
+def add_restaurant_order_date_index(connection):
+    create_index(connection, 'ix_orders_restaurant_date', 'orders', ['restaurant_id', 'order_date'])
+
+def current_version(connection):
+    if not inspect(connection).has_table('schema_migrations'):
+        return 0
+    return connection.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+def _record(connection, version, description):
+    connection.execute(schema_migrations.insert().values(version=version, description=description, applied_at=datetime.utcnow()))
+
+def upgrade(engine=None):
+    engine = engine or db.engine
+    schema_migrations.create(engine, checkfirst=True)
+    applied = []
+    for version, description, func in MIGRATIONS:
+        with engine.begin() as connection:
+            if version <= current_version(connection):
+                continue
+            func(connection)
+            _record(connection, version, description)
+        applied.append((version, description))
+    return applied
+
+def stamp(engine=None):
+    engine = engine or db.engine
+    schema_migrations.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        version = current_version(connection)
+        for pending, description, _ in MIGRATIONS:
+            if pending > version:
+                _record(connection, pending, description)
+
+def init_db():
+    clear_identity_cache()
+    fresh = not inspect(db.engine).has_table('users')
+    if fresh:
+        db.create_all()
+        stamp()
+        return []
+    applied = upgrade()
+    db.create_all()
+    return applied
+
+
+@click.command('init-db')
+def init_db_command():
+    """Create the database, or migrate an existing one to the current schema."""
+    applied = init_db()
+    for version, description in applied:
+        click.echo(f"Applied migration {version}: {description}")
+    click.echo("Database is up to date.")
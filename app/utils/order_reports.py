@@ -0,0 +1,110 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from app import db
+from app.models.user import User
+from app.models.order_event import OrderEvent, settled_count
+from app.models.order_projection import (DailyRevenue, ProjectionCheckpoint, ReadyTime, RestaurantQueue,
+                                         apply_deltas, clear_projections, fold_events, write_projections)
+
+# Keeps the order report projections in step with the order_events log.
+# Writers only append to the log; catch_up_projections() folds whatever was
+# appended since the checkpoint, in id order, and is called before a report
+# is read. It stops short of an id that may still commit (see
+# settled_count), so events committed out of id order are not skipped.
+
+REPLAY_BATCH_SIZE = 5000
+REPORT_DAYS = 14
+QUEUE_STATUSES = ('pending', 'accepted', 'preparing', 'ready')
+
+
+def _events_after(connection, after_id, batch_size):
+    # The first batch_size events after after_id, and whether more follow
+    # that can be read now.
+    table = OrderEvent.__table__
+    events = connection.execute(
+        select(table).where(table.c.id > after_id).order_by(table.c.id).limit(batch_size)
+    ).mappings().all()
+    settled = settled_count(events, after_id)
+    return events[:settled], settled == batch_size
+
+def replay_events(connection, after_id=0, batch_size=REPLAY_BATCH_SIZE, deltas=None):
+    """Folds the events after after_id into deltas, reading them in id order
+    batch_size at a time. Returns the deltas and the last id replayed."""
+    deltas = {} if deltas is None else deltas
+    while True:
+        events, more = _events_after(connection, after_id, batch_size)
+        if events:
+            fold_events(events, deltas)
+            after_id = events[-1]['id']
+        if not more:
+            return deltas, after_id
+
+def _checkpoint():
+    table = ProjectionCheckpoint.__table__
+    return table, table.c.name == ProjectionCheckpoint.ORDER_REPORTS
+
+def catch_up_projections(engine=None, batch_size=REPLAY_BATCH_SIZE):
+    # One short transaction per batch. The checkpoint only moves forward from
+    # the value this batch was read after, so two requests catching up at
+    # once cannot fold the same events twice.
+    engine = engine or db.engine
+    while True:
+        with engine.begin() as connection:
+            table, match = _checkpoint()
+            last_id = connection.execute(select(table.c.last_event_id).where(match)).scalar() or 0
+            events, more = _events_after(connection, last_id, batch_size)
+            if not events:
+                return last_id
+            claimed = connection.execute(
+                table.update().where(match, table.c.last_event_id == last_id).values(last_event_id=events[-1]['id'])
+            ).rowcount
+            if claimed:
+                apply_deltas(connection, fold_events(events))
+        if not more:
+            return events[-1]['id']
+
+def replace_projections(connection, deltas=None, after_id=0, batch_size=REPLAY_BATCH_SIZE):
+    """Replaces the projections with deltas plus the events after after_id,
+    and moves the checkpoint to the last event folded."""
+    clear_projections(connection)
+    deltas, last_id = replay_events(connection, after_id, batch_size, deltas)
+    write_projections(connection, deltas)
+    table, match = _checkpoint()
+    connection.execute(table.update().where(match).values(last_event_id=last_id))
+    return last_id
+
+def rebuild_projections(engine=None, batch_size=REPLAY_BATCH_SIZE):
+    # The bulk of the log is replayed without holding the write lock. The
+    # swap then clears the old rows first, which takes the lock, and folds
+    # in whatever was appended meanwhile before writing the new totals.
+    engine = engine or db.engine
+    with engine.connect() as connection:
+        deltas, last_id = replay_events(connection, batch_size=batch_size)
+    with engine.begin() as connection:
+        return replace_projections(connection, deltas, last_id, batch_size)
+
+
+def order_report(restaurant_id=None, days=REPORT_DAYS):
+    """Template context for the reports page, for one restaurant or all of them."""
+    catch_up_projections()
+    queues = RestaurantQueue.counts(restaurant_id)
+    ready_times = ReadyTime.averages(restaurant_id)
+    restaurant_ids = set(queues) | set(ready_times)
+    restaurants = User.query.filter(User.id.in_(restaurant_ids)).order_by(User.name).all() if restaurant_ids else []
+    return {
+        'queues': queues, 'ready_times': ready_times, 'restaurants': restaurants,
+        'queue_statuses': QUEUE_STATUSES, 'daily_revenue': DailyRevenue.recent(days, restaurant_id), 'days': days,
+    }
+
+
+def init_order_reports(app):
+    app.cli.add_command(rebuild_projections_command)
+
+@click.command('rebuild-order-reports')
+@click.option('--batch-size', default=REPLAY_BATCH_SIZE, show_default=True, help="Events read per batch.")
+@with_appcontext
+def rebuild_projections_command(batch_size):
+    """Rebuild the order report tables by replaying the order event log."""
+    last_id = rebuild_projections(batch_size=batch_size)
+    click.echo(f"Replayed order events up to #{last_id}.")
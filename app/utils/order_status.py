@@ -0,0 +1,18 @@
+from sqlalchemy.orm.exc import StaleDataError
+from app import db
+from app.models.order import OrderConflict
+
+
+def commit_order_change(order):
+    """Commit, reporting a lost compare-and-set on the order as OrderConflict."""
+    order_id = order.id if order is not None else None
+    try:
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        raise OrderConflict(order_id)
+
+
+def change_order_status(order, status, expected_version=None):
+    order.transition_to(status, expected_version)
+    commit_order_change(order)
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from app import db
+from app.models.order import Order
+from app.models.payment import Payment
+from app.utils.local_sqlite import LocalSqlite
+
+# Pushes order and payment changes to the customer and restaurant involved,
+# for the server-sent event stream at /stream/orders. Changes are collected
+# during the flush and published only once the transaction commits. Each
+# event has an increasing id so a reconnecting browser can resume from its
+# Last-Event-ID.
+#
+#   order.created   new order (to the restaurant)
+#   order.status    order status changed
+#   payment.status  payment verified or rejected
+
+
+class MemoryBroker:
+    # Only sees events published by this process.
+    def __init__(self, backlog=100):
+        self.backlog = backlog
+        self._condition = threading.Condition()
+        self._events = defaultdict(lambda: deque(maxlen=self.backlog))
+        # Ids start from the clock, so they keep increasing across restarts
+        # and a browser's Last-Event-ID from before a restart stays valid.
+        self._last_id = int(time.time() * 1000)
+
+    def latest_id(self):
+        with self._condition:
+            return self._last_id
+
+    def publish(self, user_ids, name, data):
+        with self._condition:
+            for user_id in user_ids:
+                self._last_id += 1
+                self._events[user_id].append((self._last_id, name, data))
+            self._condition.notify_all()
+
+    def listen(self, user_id, last_id, timeout):
+        """Events for user_id after last_id, waiting up to timeout seconds."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                events = [entry for entry in self._events.get(user_id, ()) if entry[0] > last_id]
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events
+                self._condition.wait(remaining)
+
+
+class SqliteBroker:
+    # Shared by every worker on the host; listeners poll for new rows.
+    def __init__(self, path, retention=300, poll_interval=1.0):
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.db = LocalSqlite(path,
+            "CREATE TABLE IF NOT EXISTS stream_events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_id INTEGER NOT NULL,"
+            " name TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " created_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_stream_events_user_id ON stream_events (user_id, id);"
+        )
+
+    def latest_id(self):
+        return self.db.execute("SELECT COALESCE(MAX(id), 0) FROM stream_events").fetchone()[0]
+
+    def publish(self, user_ids, name, data):
+        now = time.time()
+        payload = json.dumps(data)
+        connection = self.db.connection()
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(
+                "INSERT INTO stream_events (user_id, name, data, created_at) VALUES (?, ?, ?, ?)",
+                [(user_id, name, payload, now) for user_id in user_ids])
+            connection.execute("DELETE FROM stream_events WHERE created_at < ?", (now - self.retention,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def listen(self, user_id, last_id, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            rows = self.db.execute(
+                "SELECT id, name, data FROM stream_events WHERE user_id = ? AND id > ? ORDER BY id",
+                (user_id, last_id)).fetchall()
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                return [(row['id'], row['name'], json.loads(row['data'])) for row in rows]
+            time.sleep(min(self.poll_interval, remaining))
+
+
+def init_order_stream(app):
+    backend = app.config.get('STREAM_BROKER', 'memory')
+    if backend == 'memory':
+        broker = MemoryBroker()
+    elif backend == 'sqlite':
+        path = app.config.get('STREAM_DATABASE') or os.path.join(app.instance_path, 'stream_events.db')
+        broker = SqliteBroker(path)
+    else:
+        raise ValueError(f"Unknown STREAM_BROKER: {backend}")
+    app.extensions['order_broker'] = broker
+    return broker
+
+def order_broker():
+    return current_app.extensions.get('order_broker') if has_app_context() else None
+
+def publish_after_commit(session, user_ids, name, data):
+    session.info.setdefault('stream_events', []).append((user_ids, name, data))
+
+def format_event(event_id, name, data):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _status_changed(obj, attribute):
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_order_events(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Order):
+            publish_after_commit(session, (obj.restaurant_id,), 'order.created', {
+                'order_id': obj.id, 'status': obj.status, 'total_price': str(obj.total_price),
+                'order_date': obj.order_date.isoformat() if obj.order_date else None,
+            })
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, Order) and _status_changed(obj, 'status'):
+            publish_after_commit(session, (obj.customer_id, obj.restaurant_id), 'order.status',
+                                 {'order_id': obj.id, 'status': obj.status})
+        elif isinstance(obj, Payment) and _status_changed(obj, 'payment_status'):
+            publish_after_commit(session, (obj.customer_id, obj.restaurant_id), 'payment.status',
+                                 {'order_id': obj.order_id, 'payment_id': obj.id, 'payment_status': obj.payment_status})
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_order_events(session):
+    events = session.info.pop('stream_events', None)
+    broker = order_broker()
+    if events and broker is not None:
+        for user_ids, name, data in events:
+            broker.publish(user_ids, name, data)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_order_events(session, previous_transaction):
+    session.info.pop('stream_events', None)
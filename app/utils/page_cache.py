@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, has_app_context, make_response, request, session
+from sqlalchemy import event, inspect
+from app import db
+from app.models.food_item import FoodItem
+from app.models.user import User
+from app.utils.local_sqlite import LocalSqlite, database_scope
+
+# Whole-page and fragment caching for pages every anonymous visitor sees the
+# same way (the home page, about and the catalog). Entries carry tags; when
+# something a tag covers changes, the tag's version is bumped and every
+# entry stored under an older version is ignored from then on. The catalog
+# tag is bumped after any commit that adds, edits or deletes a food item or
+# renames or removes a user, so the menu routes, the image pipeline and the
+# admin tools need no calls of their own; bulk writers call
+# stage_page_invalidation(). Cached pages carry an ETag, so browsers get a
+# 304 when nothing changed. Stores:
+#   sqlite - a local SQLite file shared by every worker on the host
+#   memory - an LRU per process; other workers keep serving a page for up to
+#            PAGE_CACHE_TTL after a change, so only for a single worker
+
+CATALOG_TAG = 'catalog'
+
+
+class MemoryPageCache:
+    def __init__(self, maxsize=512, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (body, meta, {tag: version}, expires_at)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, meta, tags, expires_at = entry
+            if expires_at <= time.monotonic() or any(self._versions.get(tag, 0) != version for tag, version in tags.items()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, meta
+
+    def versions(self, tags):
+        with self._lock:
+            return {tag: self._versions.get(tag, 0) for tag in tags}
+
+    def set(self, key, body, meta, versions):
+        # versions comes from versions() before the page was built, so a
+        # page rendered across an invalidation is stored already stale.
+        with self._lock:
+            self._entries[key] = (body, meta, versions, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqlitePageCache:
+    # Keys and tags are prefixed with the database scope, so apps on
+    # different databases sharing the file keep their pages apart.
+    def __init__(self, path, ttl=300, scope=''):
+        self.ttl = ttl
+        self.prefix = f"{scope}:"
+        self.db = LocalSqlite(path,
+            "CREATE TABLE IF NOT EXISTS page_cache ("
+            " key TEXT PRIMARY KEY,"
+            " body BLOB NOT NULL,"
+            " meta TEXT NOT NULL,"
+            " tags TEXT NOT NULL,"
+            " expires_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS page_cache_tags ("
+            " tag TEXT PRIMARY KEY,"
+            " version INTEGER NOT NULL)"
+        )
+
+    def versions(self, tags):
+        if not tags:
+            return {}
+        rows = self.db.execute(
+            f"SELECT tag, version FROM page_cache_tags WHERE tag IN ({', '.join('?' * len(tags))})",
+            [self.prefix + tag for tag in tags]
+        ).fetchall()
+        versions = {row['tag'][len(self.prefix):]: row['version'] for row in rows}
+        return {tag: versions.get(tag, 0) for tag in tags}
+
+    def get(self, key):
+        row = self.db.execute(
+            "SELECT body, meta, tags FROM page_cache WHERE key = ? AND expires_at > ?", (self.prefix + key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        tags = json.loads(row['tags'])
+        if self.versions(list(tags)) != tags:
+            return None
+        return bytes(row['body']), json.loads(row['meta'])
+
+    def set(self, key, body, meta, versions):
+        self.db.execute(
+            "INSERT OR REPLACE INTO page_cache (key, body, meta, tags, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (self.prefix + key, body, json.dumps(meta), json.dumps(versions), time.time() + self.ttl)
+        )
+
+    def invalidate(self, tags):
+        for tag in tags:
+            self.db.execute(
+                "INSERT INTO page_cache_tags (tag, version) VALUES (?, 1)"
+                " ON CONFLICT (tag) DO UPDATE SET version = version + 1", (self.prefix + tag,)
+            )
+        self.db.execute("DELETE FROM page_cache WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        self.db.execute("DELETE FROM page_cache WHERE substr(key, 1, ?) = ?", (len(self.prefix), self.prefix))
+
+
+def init_page_cache(app):
+    backend = app.config.get('PAGE_CACHE_BACKEND', 'sqlite')
+    ttl = app.config.get('PAGE_CACHE_TTL', 300)
+    if backend == 'memory':
+        cache = MemoryPageCache(app.config.get('PAGE_CACHE_SIZE', 512), ttl)
+    elif backend == 'sqlite':
+        path = app.config.get('PAGE_CACHE_DATABASE') or os.path.join(app.instance_path, 'page_cache.db')
+        cache = SqlitePageCache(path, ttl, database_scope(app))
+    elif backend in (None, 'none'):
+        cache = None
+    else:
+        raise ValueError(f"Unknown PAGE_CACHE_BACKEND: {backend}")
+    app.extensions['page_cache'] = cache
+    return cache
+
+def page_cache():
+    return current_app.extensions.get('page_cache') if has_app_context() else None
+
+
+def _anonymous_request():
+    # Decided from the cookie alone, without loading the user. Pending
+    # flash messages belong to one visitor, so those pages are not shared.
+    remember_cookie = current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')
+    return (request.method in ('GET', 'HEAD') and '_user_id' not in session
+            and '_flashes' not in session and remember_cookie not in request.cookies)
+
+def _page_key():
+    args = '&'.join(f"{name}={value}" for name, value in sorted(request.args.items(multi=True)))
+    return f"page:{request.path}?{args}"
+
+def cached_page(*tags):
+    """Serves the view's response to anonymous visitors from the page cache."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = page_cache()
+            if cache is None or not _anonymous_request():
+                return view(*args, **kwargs)
+            key = _page_key()
+            entry = cache.get(key)
+            if entry is None:
+                versions = cache.versions(tags)
+                response = make_response(view(*args, **kwargs))
+                # Anything written to the session while rendering (a CSRF
+                # token, a flash) makes the page this visitor's own.
+                if response.status_code != 200 or response.direct_passthrough or session.modified:
+                    return response
+                body = response.get_data()
+                meta = {'mimetype': response.mimetype, 'etag': hashlib.sha1(body).hexdigest()}
+                cache.set(key, body, meta, versions)
+                status = 'miss'
+            else:
+                body, meta = entry
+                response = current_app.response_class(body, mimetype=meta['mimetype'])
+                status = 'hit'
+            response.set_etag(meta['etag'])
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Cookie')
+            response.headers['X-Page-Cache'] = status
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+def cached_fragment(key, tags, compute):
+    """compute()'s JSON-serializable result, shared between requests until
+    one of tags is invalidated."""
+    cache = page_cache()
+    if cache is None:
+        return compute()
+    entry = cache.get(f"fragment:{key}")
+    if entry is not None:
+        return json.loads(entry[0])
+    versions = cache.versions(tags)
+    value = compute()
+    cache.set(f"fragment:{key}", json.dumps(value).encode('utf-8'), {}, versions)
+    return value
+
+def invalidate_pages(*tags):
+    cache = page_cache()
+    if cache is not None:
+        cache.invalidate(tags)
+
+
+def stage_page_invalidation(session, *tags):
+    # Applied after the commit; also called by bulk writers, whose Core
+    # statements skip the flush hook.
+    session.info.setdefault('page_cache_tags', set()).update(tags)
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_catalog_changes(session, flush_context):
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, FoodItem) or (isinstance(obj, User) and obj in session.deleted):
+            return stage_page_invalidation(session, CATALOG_TAG)
+    for obj in session.dirty:
+        if isinstance(obj, FoodItem) and session.is_modified(obj):
+            return stage_page_invalidation(session, CATALOG_TAG)
+        if isinstance(obj, User) and inspect(obj).attrs.name.history.has_changes():
+            return stage_page_invalidation(session, CATALOG_TAG)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_pages(session):
+    tags = session.info.pop('page_cache_tags', None)
+    if tags:
+        invalidate_pages(*tags)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_changed_pages(session, previous_transaction):
+    session.info.pop('page_cache_tags', None)
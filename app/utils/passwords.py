@@ -0,0 +1,115 @@
+import atexit
+import threading
+import bcrypt
+from concurrent.futures import ProcessPoolExecutor
+from flask import Response, current_app
+from app.utils.instrumentation import timed
+
+# Password hashing and verification, off the request thread. bcrypt is
+# deliberately slow and holds the CPU for the whole call, so a burst of
+# logins would otherwise tie up every worker thread. Calls run in a small
+# process pool (PASSWORD_WORKERS); at most PASSWORD_MAX_PENDING may be
+# running or queued at once. A request that cannot get a slot within
+# PASSWORD_QUEUE_TIMEOUT seconds is answered with 503 and Retry-After.
+# The cost factor is Flask-Bcrypt's BCRYPT_LOG_ROUNDS, so existing hashes
+# stay valid; a hash with any other cost is replaced on the next login.
+
+MIN_ROUNDS = 4  # the lowest cost bcrypt accepts; used by tests and seeding
+MAX_PASSWORD_BYTES = 72  # bcrypt ignores anything longer
+
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+
+def _encode(password):
+    return password.encode('utf-8')[:MAX_PASSWORD_BYTES]
+
+def hash_password(password, rounds):
+    # Runs in a worker process.
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def verify_password(password, hashed):
+    # Runs in a worker process.
+    try:
+        return bcrypt.checkpw(_encode(password), hashed.encode('utf-8'))
+    except ValueError:
+        return False
+
+def hash_rounds(hashed):
+    # "$2b$12$<salt and digest>" -> 12
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, app):
+        self.app = app
+        self.mode = app.config.get('PASSWORD_HASHER', 'process')
+        self.workers = app.config.get('PASSWORD_WORKERS', 2)
+        self.queue_timeout = app.config.get('PASSWORD_QUEUE_TIMEOUT', 5)
+        self._slots = threading.BoundedSemaphore(app.config.get('PASSWORD_MAX_PENDING', 32))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def rounds(self):
+        # Read on every call so a script can lower it after create_app().
+        return self.app.config.get('BCRYPT_LOG_ROUNDS', 12)
+
+    def _pool(self):
+        # Created on first use so worker processes are not forked at import.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                atexit.register(self._executor.shutdown, wait=False)
+            return self._executor
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy("Too many password checks are waiting")
+        try:
+            with timed('bcrypt'):
+                if self.mode == 'sync':
+                    return function(*args)
+                return self._pool().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.rounds)
+
+    def verify(self, password, hashed):
+        return self._run(verify_password, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+    def verify_and_update(self, password, hashed):
+        """Returns (valid, new_hash). new_hash is None unless the password
+        is valid and hashed uses a different cost than the configured one."""
+        if not self.verify(password, hashed):
+            return False, None
+        return True, self.hash(password) if self.needs_rehash(hashed) else None
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+def busy_response(error):
+    return Response("The server is busy signing other users in. Please try again in a moment.", 503,
+                    {'Retry-After': '1'}, mimetype='text/plain')
+
+def init_password_hasher(app):
+    hasher = PasswordHasher(app)
+    app.extensions['password_hasher'] = hasher
+    app.register_error_handler(PasswordHasherBusy, busy_response)
+    return hasher
+
+def password_hasher():
+    return current_app.extensions['password_hasher']
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import select
+from app import db
+from app.models.order import Order
+from app.models.payment import Payment
+from app.models.dashboard_stats import DashboardStats
+from app.models.order_event import order_event, record_order_events
+from app.utils.order_stream import publish_after_commit
+
+# action -> (new payment status, new status for the linked pending order)
+BULK_ACTIONS = {
+    'verify': ('verified', 'accepted'),
+    'reject': ('failed', 'cancelled'),
+}
+MAX_BATCH_SIZE = 1000
+
+
+class BulkPaymentError(ValueError):
+    pass
+
+
+def parse_payment_ids(values):
+    try:
+        ids = sorted({int(value) for value in values})
+    except (TypeError, ValueError):
+        raise BulkPaymentError("Payment ids must be integers.")
+    if len(ids) > MAX_BATCH_SIZE:
+        raise BulkPaymentError(f"At most {MAX_BATCH_SIZE} payments can be updated at once.")
+    return ids
+
+
+def _update_ids(table, ids, expected, values):
+    # Returns the ids the UPDATE actually changed: with RETURNING where the
+    # dialect has it, otherwise (MySQL) the rows still matching are locked
+    # with SELECT ... FOR UPDATE first, so a concurrent batch waits for this
+    # one and then no longer sees them as matching.
+    guards = [table.c[column] == value for column, value in expected.items()]
+    statement = table.update().where(table.c.id.in_(ids), *guards).values(**values)
+    if db.engine.dialect.update_returning:
+        return set(db.session.execute(statement.returning(table.c.id)).scalars())
+    matched = set(db.session.execute(
+        select(table.c.id).where(table.c.id.in_(ids), *guards).with_for_update()
+    ).scalars())
+    if matched:
+        db.session.execute(table.update().where(table.c.id.in_(matched)).values(**values))
+    return matched
+
+
+def bulk_update_payments(action, payment_ids=None, restaurant_id=None, older_than_minutes=None, owner_id=None):
+    """Verify or reject many pending payments in one transaction.
+
+    Payments are chosen either by id or by filter (pending payments, optionally
+    for one restaurant and older than N minutes). owner_id limits the batch to
+    one restaurant's payments; ids outside it are reported as not found.
+    Returns one result dict per payment id.
+    """
+    if action not in BULK_ACTIONS:
+        raise BulkPaymentError("Unknown action.")
+    if payment_ids is None and restaurant_id is None and owner_id is None and older_than_minutes is None:
+        raise BulkPaymentError("Select payments by id or by filter.")
+    payment_status, order_status = BULK_ACTIONS[action]
+    payments = Payment.__table__
+    orders = Order.__table__
+
+    candidates = (
+        select(payments.c.id, payments.c.payment_status, payments.c.order_id, payments.c.amount,
+               payments.c.customer_id, payments.c.restaurant_id, orders.c.status.label('order_status'),
+               orders.c.order_date)
+        .outerjoin(orders, orders.c.id == payments.c.order_id)
+    )
+    if payment_ids is not None:
+        candidates = candidates.where(payments.c.id.in_(payment_ids))
+    else:
+        candidates = candidates.where(payments.c.payment_status == 'pending')
+        if older_than_minutes is not None:
+            cutoff = datetime.utcnow() - timedelta(minutes=older_than_minutes)
+            candidates = candidates.where(payments.c.payment_date <= cutoff)
+        candidates = candidates.order_by(payments.c.payment_date, payments.c.id).limit(MAX_BATCH_SIZE)
+    if restaurant_id is not None:
+        candidates = candidates.where(payments.c.restaurant_id == restaurant_id)
+    if owner_id is not None:
+        candidates = candidates.where(payments.c.restaurant_id == owner_id)
+    rows = {row.id: row for row in db.session.execute(candidates)}
+    pending = [payment_id for payment_id, row in rows.items() if row.payment_status == 'pending']
+
+    updated = set()
+    if pending:
+        # The status guard keeps a payment that another request settled in
+        # the meantime from being counted twice.
+        updated = _update_ids(payments, pending, {'payment_status': 'pending'}, {'payment_status': payment_status})
+    accepted = set()
+    order_ids = [rows[payment_id].order_id for payment_id in updated if rows[payment_id].order_status == 'pending']
+    if order_ids:
+        accepted = _update_ids(orders, order_ids, {'status': 'pending'},
+                               {'status': order_status, 'version': orders.c.version + 1})
+
+    deltas = {'pending_payments': -len(updated), 'pending_orders': -len(accepted)}
+    if payment_status == 'verified':
+        deltas['verified_revenue'] = sum((Decimal(str(rows[payment_id].amount)) for payment_id in updated), Decimal('0'))
+    DashboardStats.apply(db.session.connection(), deltas)
+    # Core UPDATEs bypass the ORM flush hooks, so the event log and the
+    # stream are fed here.
+    events = []
+    for payment_id in sorted(updated):
+        row = rows[payment_id]
+        if row.order_id in accepted:
+            events.append(order_event('status', row.order_id, row.customer_id, row.restaurant_id,
+                                      from_status='pending', to_status=order_status, placed_at=row.order_date))
+        events.append(order_event('payment', row.order_id, row.customer_id, row.restaurant_id,
+                                  from_status='pending', to_status=payment_status, amount=row.amount))
+    record_order_events(db.session.connection(), events)
+    for payment_id in sorted(updated):
+        row = rows[payment_id]
+        recipients = (row.customer_id, row.restaurant_id)
+        publish_after_commit(db.session, recipients, 'payment.status',
+                             {'order_id': row.order_id, 'payment_id': payment_id, 'payment_status': payment_status})
+        if row.order_id in accepted:
+            publish_after_commit(db.session, recipients, 'order.status', {'order_id': row.order_id, 'status': order_status})
+    db.session.commit()
+
+    results = []
+    for payment_id in (payment_ids if payment_ids is not None else sorted(rows)):
+        row = rows.get(payment_id)
+        if row is None:
+            results.append({'id': payment_id, 'result': 'not_found'})
+        elif payment_id in updated:
+            results.append({'id': payment_id, 'result': 'updated', 'payment_status': payment_status,
+                            'order_id': row.order_id,
+                            'order_status': order_status if row.order_id in accepted else None})
+        else:
+            results.append({'id': payment_id, 'result': 'skipped', 'payment_status': row.payment_status})
+    return results
+
+
+def bulk_request_args(request):
+    # Accepts a JSON body or a regular form post from the payment tables.
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            raise BulkPaymentError("Send a JSON object.")
+        raw_ids = data.get('payment_ids')
+    else:
+        data = request.form
+        raw_ids = request.form.getlist('payment_ids') or None
+    args = {'action': data.get('action')}
+    if raw_ids is not None:
+        if not isinstance(raw_ids, (list, tuple)):
+            raise BulkPaymentError("payment_ids must be a list.")
+        args['payment_ids'] = parse_payment_ids(raw_ids)
+    for key in ('restaurant_id', 'older_than_minutes'):
+        if data.get(key) not in (None, ''):
+            try:
+                args[key] = int(data.get(key))
+            except (TypeError, ValueError):
+                raise BulkPaymentError(f"{key} must be an integer.")
+    return args
+
+
+def summarize(results):
+    counts = {'updated': 0, 'skipped': 0, 'not_found': 0}
+    for result in results:
+        counts[result['result']] += 1
+    return f"{counts['updated']} payment(s) updated, {counts['skipped']} skipped, {counts['not_found']} not found."
@@ -1,8 +1,8 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField,PasswordField
-from wtforms.validators import DataRequired, Length, Email, ValidationError,Optional,EqualTo
+from wtforms.validators import DataRequired, Length, Email, Optional,EqualTo
 from flask_login import current_user
-from app.models.user import User
+from app.utils.uniqueness import check_unique
 
 class UpdateProfileForm(FlaskForm):
     name = StringField("Name", validators=[DataRequired(), Length(min=2, max=100)])
@@ -14,15 +14,8 @@ class UpdateProfileForm(FlaskForm):
     new_password = PasswordField('New Password', validators=[Optional(), Length(min=6, max=20, message='Password must be between 6 and 20 characters')])
     confirm_new_password = PasswordField('Confirm New Password', validators=[Optional(), EqualTo('new_password', message='Passwords must match')])
 
-    def validate_email(self, email):
-        if email.data != current_user.email:
-            user = User.query.filter_by(email=email.data).first()
-            if user:
-                raise ValidationError("That email is taken. Please choose a different one.")
-
-    def validate_phone_number(self, phone_number):
-        if phone_number.data != current_user.phone_number:
-            user = User.query.filter_by(phone_number=phone_number.data).first()
-            if user:
-                raise ValidationError("That phone number is taken. Please choose a different one.")
+    def validate(self, extra_validators=None):
+        # Email and phone number are checked together, in one query.
+        valid = super().validate(extra_validators)
+        return check_unique(self, exclude_user_id=current_user.id) and valid
 
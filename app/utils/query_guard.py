@@ -0,0 +1,47 @@
+from contextlib import contextmanager
+from flask import g, has_app_context
+from sqlalchemy import event
+from app import db
+
+class QueryLimitExceeded(AssertionError):
+    pass
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and "sql_statements" in g:
+        g.sql_statements.append(statement)
+
+def init_query_guard(app):
+    # Fails any request that issues more than SQL_QUERY_LIMIT statements.
+    # Meant for the test suite, where an N+1 regression then surfaces as an
+    # exception instead of a slow page in production.
+    limit = app.config.get("SQL_QUERY_LIMIT")
+    if not limit:
+        return
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", _count_statement)
+
+    @app.before_request
+    def start_counting():
+        g.sql_statements = []
+
+    @app.after_request
+    def check_query_limit(response):
+        statements = g.pop("sql_statements", [])
+        if len(statements) > limit:
+            raise QueryLimitExceeded(
+                f"{len(statements)} SQL statements issued (limit {limit}):\n" + "\n".join(statements)
+            )
+        return response
+
+@contextmanager
+def count_statements(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, current_app, request
+from app.utils.local_sqlite import LocalSqlite
+
+# Token buckets for the sign-in forms. Each limit in RATE_LIMITS allows
+# `attempts` per `seconds`: a bucket holds that many tokens and refills
+# continuously, so the allowance slides with time instead of resetting on
+# a fixed clock. Checks happen before the form is validated, so a rejected
+# attempt costs no database query and no bcrypt work.
+#   login_ip         every login POST from an address
+#   login_email      failed logins for an email address (cleared on success)
+#   register_ip      every registration POST from an address
+#   availability_ip  live email and phone checks from the registration page
+# Stores:
+#   memory - per process, for tests and single-worker development
+#   sqlite - a local SQLite file shared by every worker on the host
+
+DEFAULT_LIMITS = {'login_ip': (30, 60), 'login_email': (5, 900), 'register_ip': (10, 3600), 'availability_ip': (60, 60)}
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def _refill(tokens, updated_at, now, capacity, rate):
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+class MemoryRateLimitStore:
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        """Removes cost tokens. Returns 0, or the seconds until they would be there."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated_at, now, capacity, rate)
+            if tokens < cost:
+                return (cost - tokens) / rate
+            self._buckets[key] = (tokens - cost, now)
+            self._buckets.move_to_end(key)
+            # A bucket dropped here is simply full again.
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return 0
+
+    def peek(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens = _refill(tokens, updated_at, now, capacity, rate)
+        return 0 if tokens >= cost else (cost - tokens) / rate
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class SqliteRateLimitStore:
+    PURGE_EVERY = 1000  # takes between deletions of refilled buckets
+
+    def __init__(self, path):
+        self.db = LocalSqlite(path,
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " key TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " full_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_rate_limits_full_at ON rate_limits (full_at)"
+        )
+        self._takes = 0
+
+    def _bucket(self, key, capacity, now):
+        row = self.db.execute("SELECT tokens, updated_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return (row['tokens'], row['updated_at']) if row else (capacity, now)
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.time()
+        # IMMEDIATE takes the write lock up front, so two workers cannot
+        # both spend the last token.
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            tokens = _refill(*self._bucket(key, capacity, now), now, capacity, rate)
+            if tokens < cost:
+                return (cost - tokens) / rate
+            tokens -= cost
+            self.db.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (capacity - tokens) / rate)
+            )
+            self._takes += 1
+            if self._takes % self.PURGE_EVERY == 0:
+                self.db.execute("DELETE FROM rate_limits WHERE full_at < ?", (now,))
+            return 0
+        finally:
+            self.db.execute("COMMIT")
+
+    def peek(self, key, capacity, rate, cost=1):
+        now = time.time()
+        tokens = _refill(*self._bucket(key, capacity, now), now, capacity, rate)
+        return 0 if tokens >= cost else (cost - tokens) / rate
+
+    def reset(self, key):
+        self.db.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+class RateLimiter:
+    def __init__(self, store, limits):
+        self.store = store
+        # name -> (capacity, tokens per second)
+        self.limits = {name: (attempts, attempts / seconds) for name, (attempts, seconds) in limits.items()}
+
+    def hit(self, name, key):
+        """Counts an attempt; raises RateLimited when the bucket is empty."""
+        retry_after = self.store.take(f"{name}:{key}", *self.limits[name])
+        if retry_after:
+            raise RateLimited(retry_after)
+
+    def check(self, name, key):
+        """Raises RateLimited when the next hit would, without counting one."""
+        retry_after = self.store.peek(f"{name}:{key}", *self.limits[name])
+        if retry_after:
+            raise RateLimited(retry_after)
+
+    def reset(self, name, key):
+        self.store.reset(f"{name}:{key}")
+
+
+class _NoLimits:
+    # RATE_LIMIT_BACKEND = 'none'
+    def hit(self, name, key):
+        pass
+
+    def check(self, name, key):
+        pass
+
+    def reset(self, name, key):
+        pass
+
+
+def rate_limited_response(error):
+    return Response("Too many attempts. Please wait a moment and try again.", 429,
+                    {'Retry-After': str(max(1, round(error.retry_after)))}, mimetype='text/plain')
+
+def init_rate_limiter(app):
+    backend = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+    limits = dict(DEFAULT_LIMITS, **(app.config.get('RATE_LIMITS') or {}))
+    if backend == 'memory':
+        limiter = RateLimiter(MemoryRateLimitStore(), limits)
+    elif backend == 'sqlite':
+        path = app.config.get('RATE_LIMIT_DATABASE') or os.path.join(app.instance_path, 'rate_limits.db')
+        limiter = RateLimiter(SqliteRateLimitStore(path), limits)
+    elif backend in (None, 'none'):
+        limiter = _NoLimits()
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+    app.extensions['rate_limiter'] = limiter
+    app.register_error_handler(RateLimited, rate_limited_response)
+    return limiter
+
+def rate_limiter():
+    return current_app.extensions['rate_limiter']
+
+def client_address():
+    return request.remote_addr or 'unknown'
+
+def normalize_email(email):
+    return (email or '').strip().lower()
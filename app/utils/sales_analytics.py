@@ -0,0 +1,219 @@
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import Date, cast, func, select, update
+from app import db
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.order_event import OrderEvent, settled_count
+from app.models.order_projection import ProjectionCheckpoint
+
+# Sales figures for the restaurant analytics page. The database does the
+# heavy lifting: orders and order lines are summed per (UTC) day with GROUP
+# BY, and only those per-day totals come back. Each restaurant's days are
+# cached as buckets; a report for a range adds up the buckets column by
+# column. The order_events log tells which days changed since the cache
+# last looked, so only those (usually just today) are queried again. The
+# cache reads the log with one cursor, which like the report projections'
+# checkpoint never passes an event id that may still commit; it is saved
+# to its own checkpoint now and then, so a new process does not start by
+# reading the whole log. Cancelled orders are not sales.
+# The per-day columns are added up in plain Python lists: NumPy is not a
+# dependency, and a report has at most one row per day and item.
+
+ANALYTICS_RANGES = (7, 30, 90, 365)
+TOP_ITEMS = 10
+EVENT_SCAN_BATCH = 5000
+
+# items: {food_item_id: (quantity, revenue)}
+DayBucket = namedtuple('DayBucket', 'orders revenue items')
+
+
+def _day(column):
+    # Truncates a timestamp to its date in the database.
+    if db.engine.dialect.name == 'postgresql':
+        return cast(column, Date)
+    return func.date(column)
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+class SalesCache:
+    def __init__(self, maxsize=256, max_days=max(ANALYTICS_RANGES)):
+        self.maxsize = maxsize
+        self.max_days = max_days
+        self._entries = OrderedDict()  # restaurant_id -> {day: DayBucket}
+        self._generations = {}  # restaurant_id -> events seen for it
+        self._last_event_id = None
+        self._saved_event_id = None
+        self._lock = threading.Lock()
+
+    def _entry(self, restaurant_id):
+        with self._lock:
+            entry = self._entries.get(restaurant_id)
+            if entry is None:
+                entry = self._entries[restaurant_id] = {}
+            self._entries.move_to_end(restaurant_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return entry
+
+    def _forget_changed_days(self):
+        # Events since the last look name the restaurants and days whose
+        # orders changed. The first look starts from the saved checkpoint.
+        if self._last_event_id is None:
+            saved = db.session.execute(
+                select(ProjectionCheckpoint.last_event_id)
+                .where(ProjectionCheckpoint.name == ProjectionCheckpoint.SALES_ANALYTICS)
+            ).scalar() or 0
+            with self._lock:
+                if self._last_event_id is None:
+                    self._last_event_id = self._saved_event_id = saved
+        while True:
+            after_id = self._last_event_id
+            events = db.session.execute(
+                select(OrderEvent.id, OrderEvent.restaurant_id, OrderEvent.placed_at, OrderEvent.occurred_at)
+                .where(OrderEvent.id > after_id).order_by(OrderEvent.id).limit(EVENT_SCAN_BATCH)
+            ).mappings().all()
+            settled = settled_count(events, after_id)
+            with self._lock:
+                for row in events[:settled]:
+                    restaurant_id = row['restaurant_id']
+                    self._generations[restaurant_id] = self._generations.get(restaurant_id, 0) + 1
+                    days = self._entries.get(restaurant_id)
+                    if days is not None and row['placed_at'] is not None:
+                        days.pop(row['placed_at'].date(), None)
+                if settled:
+                    self._last_event_id = max(self._last_event_id, events[settled - 1]['id'])
+            if settled < EVENT_SCAN_BATCH:
+                break
+        self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        # Saved once a batch's worth behind, which bounds what a new process
+        # reads without a write on every page view. It only moves forward.
+        with self._lock:
+            last_id = self._last_event_id
+            if last_id - self._saved_event_id < EVENT_SCAN_BATCH:
+                return
+            self._saved_event_id = last_id
+        table = ProjectionCheckpoint.__table__
+        with db.engine.begin() as connection:
+            connection.execute(update(table).where(
+                table.c.name == ProjectionCheckpoint.SALES_ANALYTICS, table.c.last_event_id < last_id
+            ).values(last_event_id=last_id))
+
+    def _load_days(self, restaurant_id, days):
+        start, end = min(days), max(days) + timedelta(days=1)
+        day = _day(Order.order_date)
+        window = (Order.restaurant_id == restaurant_id, Order.status != 'cancelled',
+                  Order.order_date >= start, Order.order_date < end)
+        totals = db.session.execute(
+            select(day, func.count(Order.id), func.sum(Order.total_price)).where(*window).group_by(day)
+        ).all()
+        lines = db.session.execute(
+            select(day, OrderLine.food_item_id, func.sum(OrderLine.quantity), func.sum(OrderLine.line_total))
+            .join(Order, Order.id == OrderLine.order_id).where(*window).group_by(day, OrderLine.food_item_id)
+        ).all()
+        buckets = {day: DayBucket(0, Decimal('0'), {}) for day in days}
+        for row_day, orders, revenue in totals:
+            row_day = _as_date(row_day)
+            if row_day in buckets:
+                buckets[row_day] = buckets[row_day]._replace(orders=orders, revenue=Decimal(str(revenue or 0)))
+        for row_day, food_item_id, quantity, revenue in lines:
+            row_day = _as_date(row_day)
+            if row_day in buckets:
+                buckets[row_day].items[food_item_id] = (quantity, Decimal(str(revenue or 0)))
+        return buckets
+
+    def buckets(self, restaurant_id, days):
+        entry = self._entry(restaurant_id)
+        self._forget_changed_days()
+        with self._lock:
+            cached = dict(entry)
+            generation = self._generations.get(restaurant_id, 0)
+        missing = [day for day in days if day not in cached]
+        if missing:
+            loaded = self._load_days(restaurant_id, missing)
+            cached.update(loaded)
+            with self._lock:
+                # If another request read an event for this restaurant while
+                # the days were loading, they may predate it: this report
+                # uses them, but they are not kept.
+                if self._generations.get(restaurant_id, 0) == generation:
+                    entry.update(loaded)
+                    for day in sorted(entry)[:-self.max_days]:
+                        del entry[day]
+        return [cached[day] for day in days]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._last_event_id = self._saved_event_id = None
+
+
+class SalesReport:
+    def __init__(self, days, buckets, food_items):
+        # Columns, one value per day.
+        self.days = days
+        self.orders = [bucket.orders for bucket in buckets]
+        self.revenue = [bucket.revenue for bucket in buckets]
+        self.total_orders = sum(self.orders)
+        self.total_revenue = sum(self.revenue, Decimal('0'))
+        self.peak_revenue = max(self.revenue, default=Decimal('0'))
+
+        items = {}
+        for bucket in buckets:
+            for food_item_id, (quantity, revenue) in bucket.items.items():
+                total = items.get(food_item_id, (0, Decimal('0')))
+                items[food_item_id] = (total[0] + quantity, total[1] + revenue)
+        self.total_quantity = sum(quantity for quantity, _ in items.values())
+
+        self.items, categories = [], {}
+        for food_item_id, (quantity, revenue) in items.items():
+            name, category = food_items.get(food_item_id, ("Removed item", "Uncategorized"))
+            self.items.append({'name': name, 'category': category, 'quantity': quantity, 'revenue': revenue})
+            total = categories.get(category, (0, Decimal('0')))
+            categories[category] = (total[0] + quantity, total[1] + revenue)
+        self.items.sort(key=lambda item: (-item['quantity'], -item['revenue'], item['name']))
+        self.categories = sorted(
+            ({'category': category, 'quantity': quantity, 'revenue': revenue}
+             for category, (quantity, revenue) in categories.items()),
+            key=lambda category: (-category['revenue'], category['category']))
+
+    @property
+    def daily(self):
+        return list(zip(self.days, self.orders, self.revenue))
+
+    @property
+    def top_items(self):
+        return self.items[:TOP_ITEMS]
+
+    @property
+    def average_basket(self):
+        return (self.total_revenue / self.total_orders).quantize(Decimal('0.01')) if self.total_orders else Decimal('0.00')
+
+    @property
+    def items_per_order(self):
+        return round(self.total_quantity / self.total_orders, 1) if self.total_orders else 0
+
+
+def init_sales_analytics(app):
+    app.extensions['sales_cache'] = SalesCache()
+
+def sales_report(restaurant_id, days=30, today=None):
+    """Sales for the last `days` days up to and including today (UTC)."""
+    today = today or datetime.utcnow().date()
+    span = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    buckets = current_app.extensions['sales_cache'].buckets(restaurant_id, span)
+    food_item_ids = {food_item_id for bucket in buckets for food_item_id in bucket.items}
+    food_items = {}
+    if food_item_ids:
+        rows = db.session.execute(select(FoodItem.id, FoodItem.name, FoodItem.category).where(FoodItem.id.in_(food_item_ids)))
+        food_items = {row.id: (row.name, row.category) for row in rows}
+    return SalesReport(span, buckets, food_items)
@@ -0,0 +1,458 @@
+import bisect
+import heapq
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import DDL, column, delete, event, func, insert, inspect, or_, select, table, text, update
+from app import db
+from app.models.food_item import FoodItem
+from app.models.user import User
+
+# Server-side menu search over food item name, description, category and the
+# restaurant's name. With SQLite's FTS5 the index is a virtual table in the
+# application database, written in the same transaction as the food items;
+# otherwise every process keeps an inverted index in memory, reloaded when
+# search_version shows that another process has committed. Both rank with
+# BM25 and treat the last query word as a prefix, as it may still be being
+# typed. Words that match nothing are retried against the closest indexed
+# terms (the first letter is trusted; one typo is allowed from 4 letters, two
+# from 8). Scoring is what makes a broad query slow, so when a query matches
+# more than the rank window only the newest matches in that window are ranked.
+
+FIELD_WEIGHTS = (10.0, 2.0, 4.0, 3.0)  # name, description, category, restaurant
+MAX_QUERY_TERMS = 8
+MAX_CORRECTIONS = 3
+WORD = re.compile(r'[^\W_]+')
+LAST_CHAR = '\U0010ffff'
+
+search_table = table('food_search', column('rowid'), column('name'), column('description'),
+                     column('category'), column('restaurant'))
+
+# One row, bumped in every transaction that changes an indexed document.
+search_version = db.Table(
+    'search_version',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0),
+)
+event.listen(search_version, 'after_create', DDL("INSERT INTO search_version (id, version) VALUES (1, 0)"))
+
+
+def normalize(value):
+    # Same folding as FTS5's unicode61 tokenizer with remove_diacritics.
+    decomposed = unicodedata.normalize('NFKD', value.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def tokenize(value):
+    return WORD.findall(normalize(value or ''))
+
+def query_terms(query):
+    # (term, is_prefix) pairs
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    return [(term, i == len(terms) - 1) for i, term in enumerate(terms)]
+
+def allowed_typos(term):
+    return 0 if len(term) < 4 else 1 if len(term) < 8 else 2
+
+def edit_distance(a, b, limit):
+    # Optimal string alignment distance; gives up at limit + 1.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+def closest_terms(term, candidates):
+    # candidates are (term, document count) pairs; the most common of the
+    # nearest terms win.
+    limit = allowed_typos(term)
+    scored = []
+    for candidate, documents in candidates:
+        distance = edit_distance(term, candidate, limit)
+        if distance <= limit:
+            scored.append((distance, -documents, candidate))
+    return [candidate for _, _, candidate in sorted(scored)[:MAX_CORRECTIONS]]
+
+def document_query():
+    return (
+        select(FoodItem.id, FoodItem.name, func.coalesce(FoodItem.description, ''), FoodItem.category, User.name)
+        .join(User, User.id == FoodItem.restaurant_id)
+    )
+
+def _changed_documents(food_item_ids, restaurant_ids):
+    return document_query().where(or_(
+        FoodItem.id.in_(sorted(food_item_ids)),
+        FoodItem.restaurant_id.in_(sorted(restaurant_ids)),
+    ))
+
+
+def sqlite_has_fts5():
+    connection = sqlite3.connect(':memory:')
+    try:
+        return bool(connection.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0])
+    finally:
+        connection.close()
+
+def fts5_available(connection):
+    return connection.dialect.name == 'sqlite' and bool(
+        connection.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+class Fts5SearchIndex:
+    def __init__(self, window=5000):
+        self.window = window
+
+    def create(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS food_search USING fts5("
+            " name, description, category, restaurant,"
+            " tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+        connection.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS food_search_terms USING fts5vocab(food_search, 'row')"))
+        # Stored in the index, so a plain ORDER BY rank uses the field weights.
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS)
+        connection.execute(text(f"INSERT INTO food_search (food_search, rank) VALUES ('rank', 'bm25({weights})')"))
+
+    def drop(self, connection):
+        connection.execute(text("DROP TABLE IF EXISTS food_search_terms"))
+        connection.execute(text("DROP TABLE IF EXISTS food_search"))
+
+    def rebuild(self, connection):
+        self.create(connection)
+        connection.execute(delete(search_table))
+        connection.execute(insert(search_table).from_select(
+            ['rowid', 'name', 'description', 'category', 'restaurant'], document_query()))
+        connection.execute(text("INSERT INTO food_search (food_search) VALUES ('optimize')"))
+
+    def stage(self, connection, food_item_ids, removed_ids, restaurant_ids):
+        # Runs inside the flush, so the index commits or rolls back together
+        # with the food items.
+        stale = select(FoodItem.id).where(FoodItem.restaurant_id.in_(sorted(restaurant_ids)))
+        connection.execute(delete(search_table).where(or_(
+            search_table.c.rowid.in_(sorted(food_item_ids | removed_ids)),
+            search_table.c.rowid.in_(stale),
+        )))
+        if food_item_ids or restaurant_ids:
+            connection.execute(insert(search_table).from_select(
+                ['rowid', 'name', 'description', 'category', 'restaurant'],
+                _changed_documents(food_item_ids, restaurant_ids)))
+        return None
+
+    def apply(self, staged):
+        pass
+
+    def search(self, query, limit):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        connection = db.session.connection()
+        food_item_ids = self._match(connection, [[self._quote(term, prefix)] for term, prefix in terms], limit)
+        if food_item_ids:
+            return food_item_ids
+        groups, corrected = [], False
+        for term, prefix in terms:
+            group = [self._quote(term, prefix)]
+            if not self._has_term(connection, term, prefix):
+                corrected = True
+                if not prefix and self._has_term(connection, term, True):
+                    group = [self._quote(term, True)]
+                else:
+                    corrections = closest_terms(term, self._candidates(connection, term))
+                    if not corrections:
+                        return []
+                    group.extend(self._quote(correction) for correction in corrections)
+            groups.append(group)
+        return self._match(connection, groups, limit) if corrected else []
+
+    def _quote(self, term, prefix=False):
+        return '"' + term.replace('"', '""') + '"' + ('*' if prefix else '')
+
+    def _match(self, connection, groups, limit):
+        params = {'expression': ' AND '.join('(' + ' OR '.join(group) + ')' for group in groups), 'limit': limit}
+        # Walking the matches by rowid is cheap; it finds where the newest
+        # rank window starts.
+        params['floor'] = connection.execute(
+            text("SELECT rowid FROM food_search WHERE food_search MATCH :expression"
+                 " ORDER BY rowid DESC LIMIT 1 OFFSET :window"),
+            dict(params, window=self.window),
+        ).scalar()
+        window = "" if params['floor'] is None else " AND rowid > :floor"
+        return connection.execute(
+            text(f"SELECT rowid FROM food_search WHERE food_search MATCH :expression{window} ORDER BY rank LIMIT :limit"),
+            params,
+        ).scalars().all()
+
+    def _has_term(self, connection, term, prefix):
+        if not prefix:
+            return connection.execute(text("SELECT 1 FROM food_search_terms WHERE term = :term"), {'term': term}).first() is not None
+        return connection.execute(
+            text("SELECT 1 FROM food_search_terms WHERE term >= :low AND term < :high LIMIT 1"),
+            {'low': term, 'high': term + LAST_CHAR},
+        ).first() is not None
+
+    def _candidates(self, connection, term):
+        limit = allowed_typos(term)
+        if not limit:
+            return []
+        return connection.execute(
+            text("SELECT term, doc FROM food_search_terms WHERE term >= :low AND term < :high"
+                 " AND length(term) BETWEEN :shortest AND :longest"),
+            {'low': term[0], 'high': term[0] + LAST_CHAR, 'shortest': len(term) - limit, 'longest': len(term) + limit},
+        ).all()
+
+
+class MemorySearchIndex:
+    # Loaded from the database on the first search in each process and then
+    # kept current by this process's own commits. Each search compares the
+    # loaded version with search_version and reloads when another process
+    # has committed a change in between.
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, window=5000):
+        self.window = window
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._loaded = False
+        self._version = None
+        self._postings = {}  # term -> {food_item_id: weighted term frequency}
+        self._documents = {}  # food_item_id -> (length, terms)
+        self._terms = []  # sorted, for prefix lookups
+        self._total_length = 0.0
+
+    def _add(self, food_item_id, fields, keep_sorted=True):
+        frequencies = Counter()
+        for weight, value in zip(FIELD_WEIGHTS, fields):
+            for term in tokenize(value):
+                frequencies[term] += weight
+        for term, frequency in frequencies.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if keep_sorted:
+                    bisect.insort(self._terms, term)
+            postings[food_item_id] = frequency
+        length = sum(frequencies.values())
+        self._documents[food_item_id] = (length, tuple(frequencies))
+        self._total_length += length
+
+    def _remove(self, food_item_id):
+        document = self._documents.pop(food_item_id, None)
+        if document is None:
+            return
+        length, terms = document
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            del postings[food_item_id]
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def _load(self, connection):
+        version = connection.execute(select(search_version.c.version)).scalar()
+        if self._loaded and self._version == version:
+            return
+        self._reset()
+        for row in connection.execute(document_query()):
+            self._add(row[0], row[1:], keep_sorted=False)
+        self._terms = sorted(self._postings)
+        self._loaded = True
+        self._version = version
+
+    def rebuild(self, connection):
+        with self._lock:
+            self._reset()
+            self._load(connection)
+
+    def stage(self, connection, food_item_ids, removed_ids, restaurant_ids):
+        # Read inside the flush, applied after the commit. The version bump
+        # locks the row, so writers commit their versions in order.
+        connection.execute(update(search_version).values(version=search_version.c.version + 1))
+        version = connection.execute(select(search_version.c.version)).scalar()
+        documents = dict.fromkeys(removed_ids)
+        if food_item_ids or restaurant_ids:
+            for row in connection.execute(_changed_documents(food_item_ids, restaurant_ids)):
+                documents[row[0]] = tuple(row[1:])
+        return version, documents
+
+    def apply(self, staged):
+        since, version, documents = staged
+        with self._lock:
+            # Anything but the next version means another process committed
+            # in between; the next search reloads instead.
+            if not self._loaded or self._version != since:
+                return
+            for food_item_id, fields in documents.items():
+                self._remove(food_item_id)
+                if fields is not None:
+                    self._add(food_item_id, fields)
+            self._version = version
+
+    def _prefixed(self, term):
+        start = bisect.bisect_left(self._terms, term)
+        end = bisect.bisect_left(self._terms, term + LAST_CHAR, start)
+        return self._terms[start:end]
+
+    def _candidates(self, term):
+        limit = allowed_typos(term)
+        if not limit:
+            return []
+        return [(candidate, len(self._postings[candidate])) for candidate in self._prefixed(term[0])
+                if abs(len(candidate) - len(term)) <= limit]
+
+    def search(self, query, limit):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._load(db.session.connection())
+            groups = [self._prefixed(term) if prefix else [term] * (term in self._postings) for term, prefix in terms]
+            if not all(groups):
+                groups = [group or self._prefixed(term) or closest_terms(term, self._candidates(term))
+                          for (term, _), group in zip(terms, groups)]
+                if not all(groups):
+                    return []
+            return self._rank(groups, limit)
+
+    def _rank(self, groups, limit):
+        # BM25 with every query word as one pseudo-term: its frequency in a
+        # document is summed over the indexed terms it expanded to.
+        count = len(self._documents)
+        average = self._total_length / count
+        frequencies = []
+        for group in groups:
+            counts = Counter()
+            for term in group:
+                counts.update(self._postings[term])
+            frequencies.append(counts)
+        matches = set(min(frequencies, key=len)).intersection(*frequencies)
+        if len(matches) > self.window:
+            matches = heapq.nlargest(self.window, matches)
+        scores = dict.fromkeys(matches, 0.0)
+        for counts in frequencies:
+            idf = math.log((count - len(counts) + 0.5) / (len(counts) + 0.5) + 1)
+            for food_item_id in scores:
+                frequency = counts[food_item_id]
+                norm = 1 - self.B + self.B * self._documents[food_item_id][0] / average
+                scores[food_item_id] += idf * frequency * (self.K1 + 1) / (frequency + self.K1 * norm)
+        best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [food_item_id for food_item_id, _ in best]
+
+
+def _create_fts_tables(target, connection, **kw):
+    if fts5_available(connection):
+        Fts5SearchIndex().create(connection)
+
+def _drop_fts_tables(target, connection, **kw):
+    if fts5_available(connection):
+        Fts5SearchIndex().drop(connection)
+
+# db.create_all() and db.drop_all() manage the FTS tables with food_items;
+# existing databases get them from migration 4.
+event.listen(FoodItem.__table__, 'after_create', _create_fts_tables)
+event.listen(FoodItem.__table__, 'before_drop', _drop_fts_tables)
+
+
+def init_search(app):
+    backend = app.config.get('SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        on_sqlite = app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite')
+        backend = 'fts5' if on_sqlite and sqlite_has_fts5() else 'memory'
+    window = app.config.get('SEARCH_RANK_WINDOW', 5000)
+    if backend == 'fts5':
+        index = Fts5SearchIndex(window)
+    elif backend == 'memory':
+        index = MemorySearchIndex(window)
+    else:
+        raise ValueError(f"Unknown SEARCH_BACKEND: {backend}")
+    app.extensions['search_index'] = index
+    app.cli.add_command(reindex_search_command)
+    return index
+
+def search_index():
+    return current_app.extensions.get('search_index') if has_app_context() else None
+
+def search_food_items(query, limit=None):
+    """Food item ids matching query, best match first."""
+    limit = limit or current_app.config.get('SEARCH_MAX_RESULTS', 1000)
+    return search_index().search(query, limit)
+
+
+INDEXED_ATTRIBUTES = ('name', 'description', 'category', 'restaurant_id')
+
+def _changed(obj, attributes):
+    state = inspect(obj)
+    return any(state.attrs[attribute].history.has_changes() for attribute in attributes)
+
+@event.listens_for(db.session, 'after_flush')
+def _index_changed_items(session, flush_context):
+    if search_index() is None:
+        return
+    food_item_ids, removed_ids, restaurant_ids = set(), set(), set()
+    for obj in session.new:
+        if isinstance(obj, FoodItem):
+            food_item_ids.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, FoodItem):
+            removed_ids.add(obj.id)
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, FoodItem) and _changed(obj, INDEXED_ATTRIBUTES):
+            food_item_ids.add(obj.id)
+        elif isinstance(obj, User) and _changed(obj, ('name',)):
+            restaurant_ids.add(obj.id)
+    stage_search_documents(session, food_item_ids, removed_ids, restaurant_ids)
+
+def stage_search_documents(session, food_item_ids, removed_ids=(), restaurant_ids=()):
+    # Also called by bulk writers, whose Core statements skip the flush hook.
+    index = search_index()
+    if index is None or not (food_item_ids or removed_ids or restaurant_ids):
+        return
+    staged = index.stage(session.connection(), set(food_item_ids), set(removed_ids), set(restaurant_ids))
+    if staged:
+        # Kept as (version before the transaction, latest version, documents).
+        version, documents = staged
+        since, _, pending = session.info.get('search_staged', (version - 1, None, {}))
+        pending.update(documents)
+        session.info['search_staged'] = (since, version, pending)
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_indexed_items(session):
+    staged = session.info.pop('search_staged', None)
+    index = search_index()
+    if staged and index is not None:
+        index.apply(staged)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_indexed_items(session, previous_transaction):
+    session.info.pop('search_staged', None)
+
+
+@click.command('reindex-search')
+@with_appcontext
+def reindex_search_command():
+    """Rebuild the menu search index from the food items."""
+    index = search_index()
+    if not isinstance(index, Fts5SearchIndex):
+        click.echo("The in-memory search index is built by each process on its first search and reloaded after changes.")
+        return
+    with db.engine.begin() as connection:
+        index.rebuild(connection)
+    click.echo("Rebuilt the FTS5 search index.")
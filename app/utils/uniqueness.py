@@ -0,0 +1,174 @@
+import hashlib
+import math
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, exists, or_, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.user import User
+
+# Email addresses and phone numbers are unique per user. A submission checks
+# both in one query (each column has a unique index), but the database has
+# the final word: when two submissions race past the check, the loser's
+# commit fails on the constraint and commit_unique() turns that into the
+# same field error the check would have shown.
+#
+# The registration page asks /auth/availability while the user types. Most
+# of those values are free, so each process keeps a Bloom filter of the
+# values in use: a miss means "available" without a query, and only a hit
+# (taken, or the occasional false positive) is looked up. The filter sees
+# this process's changes right away and is rebuilt every
+# UNIQUENESS_FILTER_TTL seconds to pick up the other workers'.
+
+UNIQUE_FIELDS = ('email', 'phone_number')
+TAKEN_MESSAGES = {
+    'email': "That email is taken. Please choose a different one.",
+    'phone_number': "That phone number is taken. Please choose a different one.",
+}
+
+
+def taken_fields(values, exclude_user_id=None):
+    """The fields in values ({field: value}) already used by another user."""
+    values = {field: value for field, value in values.items() if value}
+    if not values:
+        return set()
+    columns = [getattr(User, field) == value for field, value in values.items()]
+    query = select(*columns).where(or_(*columns))
+    if exclude_user_id is not None:
+        query = query.where(User.id != exclude_user_id)
+    taken = set()
+    for row in db.session.execute(query):
+        taken.update(field for field, matched in zip(values, row) if matched)
+    return taken
+
+def check_unique(form, exclude_user_id=None):
+    """Adds a field error for each unique field another user has. Returns
+    True when there were none."""
+    fields = [field for field in UNIQUE_FIELDS if not form[field].errors]
+    taken = taken_fields({field: form[field].data for field in fields}, exclude_user_id)
+    for field in fields:
+        if field in taken:
+            form[field].errors.append(TAKEN_MESSAGES[field])
+    return not taken
+
+def violated_fields(error):
+    # The constraint names differ by database, but all of them mention the
+    # column: "UNIQUE constraint failed: users.email" on SQLite,
+    # "users_email_key" on PostgreSQL.
+    message = str(getattr(error, 'orig', error))
+    return [field for field in UNIQUE_FIELDS if field in message]
+
+def commit_unique(form):
+    """Commits the session. When that fails on a unique field, rolls back,
+    adds the field error to form and returns False."""
+    try:
+        db.session.commit()
+        return True
+    except IntegrityError as error:
+        db.session.rollback()
+        fields = violated_fields(error)
+        if not fields:
+            raise
+        for field in fields:
+            form[field].errors.append(TAKEN_MESSAGES[field])
+        return False
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: two 64-bit halves of one digest give every position.
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class TakenValues:
+    def __init__(self, ttl=60, error_rate=0.01):
+        self.ttl = ttl
+        self.error_rate = error_rate
+        self._filters = None
+        self._built_at = 0.0
+        self._added = []  # (field, value) flushed since the last rebuild
+        self._building = 0
+        self._lock = threading.Lock()
+
+    def _build(self):
+        rows = db.session.execute(select(User.email, User.phone_number)).all()
+        # Headroom for the users added before the next rebuild.
+        filters = {field: BloomFilter(2 * len(rows) + 1024, self.error_rate) for field in UNIQUE_FIELDS}
+        for row in rows:
+            for field, value in zip(UNIQUE_FIELDS, row):
+                filters[field].add(value)
+        return filters
+
+    def _current(self):
+        with self._lock:
+            if self._filters is not None and time.monotonic() - self._built_at < self.ttl:
+                return self._filters
+            self._building += 1
+        try:
+            filters = self._build()
+        finally:
+            with self._lock:
+                self._building -= 1
+        with self._lock:
+            # The scan may have missed values flushed but not yet committed.
+            for field, value in self._added:
+                filters[field].add(value)
+            self._filters, self._built_at, self._added = filters, time.monotonic(), []
+        return filters
+
+    def add(self, field, value):
+        if not value:
+            return
+        with self._lock:
+            if self._filters is None and not self._building:
+                return
+            self._added.append((field, value))
+            if self._filters is not None:
+                self._filters[field].add(value)
+
+    def available(self, field, value):
+        if value not in self._current()[field]:
+            return True
+        return not db.session.execute(select(exists().where(getattr(User, field) == value))).scalar()
+
+    def clear(self):
+        with self._lock:
+            self._filters, self._added = None, []
+
+
+def init_uniqueness(app):
+    taken = TakenValues(app.config.get('UNIQUENESS_FILTER_TTL', 60))
+    app.extensions['taken_values'] = taken
+    return taken
+
+def taken_values():
+    return current_app.extensions.get('taken_values') if has_app_context() else None
+
+
+@event.listens_for(db.session, 'after_flush')
+def _remember_taken_values(session, flush_context):
+    # Added at flush rather than commit: a value that is rolled back only
+    # costs one extra lookup, while a missing one would read as available.
+    taken = taken_values()
+    if taken is None:
+        return
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, User):
+            for field in UNIQUE_FIELDS:
+                taken.add(field, getattr(obj, field))
@@ -0,0 +1,162 @@
+"""Query plans and timings for the hot order/payment queries, before and after
+the indexes declared on the models (migrations 1, 2 and 11).
+
+    python -m benchmarks.order_indexes --orders 1000000
+
+Seeds a throwaway SQLite database (batched executemany inserts) with no
+secondary indexes, measures, creates the indexes and measures again.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import insert, text
+from config import Config
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+
+BATCH_SIZE = 50000
+ORDER_STATUSES = ['pending', 'accepted', 'preparing', 'ready', 'delivered', 'cancelled']
+
+
+def seed(orders, restaurants, customers, items_per_restaurant):
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    users = [dict(id=i, name=f"Restaurant {i}", email=f"r{i}@bench.local", phone_number=f"01{i:09d}",
+                  location="Dhaka", password="x", role="restaurant", status="active")
+             for i in range(1, restaurants + 1)]
+    users += [dict(id=i, name=f"Customer {i}", email=f"c{i}@bench.local", phone_number=f"01{i:09d}",
+                   location="Dhaka", password="x", role="customer", status="active")
+              for i in range(restaurants + 1, restaurants + customers + 1)]
+    db.session.execute(insert(User), users)
+    items = []
+    for restaurant_id in range(1, restaurants + 1):
+        for n in range(items_per_restaurant):
+            items.append(dict(id=len(items) + 1, name=f"Dish {restaurant_id}-{n}", price=Decimal("9.99"),
+                              restaurant_id=restaurant_id, category=f"Category {n % 12}", created_at=start))
+    db.session.execute(insert(FoodItem), items)
+
+    for offset in range(0, orders, BATCH_SIZE):
+        order_rows, line_rows, payment_rows = [], [], []
+        for order_id in range(offset + 1, min(offset + BATCH_SIZE, orders) + 1):
+            item = items[rng.randrange(len(items))]
+            customer_id = rng.randint(restaurants + 1, restaurants + customers)
+            when = start + timedelta(seconds=order_id * 30)
+            status = rng.choice(ORDER_STATUSES)
+            order_rows.append(dict(id=order_id, customer_id=customer_id, restaurant_id=item['restaurant_id'],
+                                   total_price=item['price'], status=status, payment_id=order_id, order_date=when))
+            line_rows.append(dict(order_id=order_id, food_item_id=item['id'], quantity=1,
+                                  unit_price=item['price'], line_total=item['price']))
+            payment_rows.append(dict(id=order_id, order_id=order_id, customer_id=customer_id,
+                                     restaurant_id=item['restaurant_id'], bkash_transaction_id=f"TXN{order_id}",
+                                     payment_phone_number="01000000000", amount=item['price'],
+                                     payment_status='pending' if status == 'pending' else 'verified',
+                                     payment_date=when))
+        db.session.execute(insert(Order), order_rows)
+        db.session.execute(insert(OrderLine), line_rows)
+        db.session.execute(insert(Payment), payment_rows)
+        db.session.commit()
+        print(f"  seeded {min(offset + BATCH_SIZE, orders):,} orders", flush=True)
+
+
+def hot_queries(restaurants, customers, orders, items):
+    # Mirrors the queries issued by the restaurant, customer and admin views.
+    rng = random.Random(7)
+    restaurant = lambda: rng.randint(1, restaurants)
+    customer = lambda: rng.randint(restaurants + 1, restaurants + customers)
+    return [
+        ("restaurant orders", lambda: Order.query.filter_by(restaurant_id=restaurant()).order_by(Order.order_date.desc())),
+        ("restaurant pending queue", lambda: Order.query.filter_by(restaurant_id=restaurant(), status='pending').order_by(Order.order_date.desc())),
+        ("customer order history", lambda: Order.query.filter_by(customer_id=customer()).order_by(Order.order_date.desc())),
+        ("orders for food item", lambda: Order.query.join(Order.lines).filter(OrderLine.food_item_id == rng.randint(1, items))),
+        ("payment for order", lambda: Payment.query.filter_by(order_id=rng.randint(1, orders)).limit(1)),
+        ("admin recent orders", lambda: Order.query.order_by(Order.order_date.desc(), Order.id.desc()).limit(5)),
+        ("admin pending payments", lambda: Payment.query.filter_by(payment_status='pending').order_by(Payment.payment_date.desc(), Payment.id.desc()).limit(5)),
+    ]
+
+
+def query_plan(query):
+    compiled = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).fetchall()
+    return "; ".join(row[-1] for row in rows)
+
+
+INDEXED_TABLES = (FoodItem.__table__, Order.__table__, OrderLine.__table__, Payment.__table__)
+
+
+def measure(queries, repeat):
+    results = {}
+    for name, build in queries:
+        plan = query_plan(build())
+        timings = []
+        for _ in range(repeat):
+            query = build()
+            started = time.perf_counter()
+            query.all()
+            timings.append((time.perf_counter() - started) * 1000)
+            db.session.expunge_all()
+        results[name] = (plan, statistics.median(timings))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1000000)
+    parser.add_argument("--restaurants", type=int, default=200)
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--items-per-restaurant", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--database", help="SQLite file to use (default: a temporary file)")
+    args = parser.parse_args()
+
+    path = args.database or os.path.join(tempfile.mkdtemp(prefix="bench-"), "orders.db")
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        IDENTITY_CACHE_BACKEND = 'memory'
+        PAGE_CACHE_BACKEND = 'memory'
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for table in INDEXED_TABLES:
+            for index in table.indexes:
+                index.drop(db.engine)
+        print(f"Seeding {args.orders:,} orders into {path}")
+        seed(args.orders, args.restaurants, args.customers, args.items_per_restaurant)
+        db.session.execute(text("ANALYZE"))
+
+        items = args.restaurants * args.items_per_restaurant
+        queries = hot_queries(args.restaurants, args.customers, args.orders, items)
+        before = measure(queries, args.repeat)
+        started = time.perf_counter()
+        for table in INDEXED_TABLES:
+            for index in table.indexes:
+                index.create(db.engine)
+        db.session.execute(text("ANALYZE"))
+        print(f"Indexes created in {time.perf_counter() - started:.1f}s")
+        after = measure(hot_queries(args.restaurants, args.customers, args.orders, items), args.repeat)
+
+    print()
+    print(f"{'query':<26}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, _ in queries:
+        b, a = before[name][1], after[name][1]
+        print(f"{name:<26}{b:>12.2f}{a:>12.2f}{b / a if a else float('inf'):>9.1f}x")
+    print()
+    for name, _ in queries:
+        print(name)
+        print(f"  before: {before[name][0]}")
+        print(f"  after:  {after[name][0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""Latency, throughput and SQL statement counts for the order lifecycle, per step:
+browse, search, add to cart, checkout, place order, verify payment and the
+restaurant's status updates.
+
+    python -m benchmarks.order_lifecycle --orders 50000 --iterations 200
+    python -m benchmarks.order_lifecycle --http --workers 4 --iterations 100
+    python -m benchmarks.order_lifecycle --save-baseline    # record these results
+    python -m benchmarks.order_lifecycle --check            # exit 1 on a regression
+
+Seeds a throwaway SQLite database with batched executemany inserts (every
+seeded user shares the password "bench", hashed once), then drives the
+lifecycle through the Flask test client. With --http it runs the same steps
+against a local threaded server from a pool of load-generating processes.
+Statement counts are only known in the test client run.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+from decimal import Decimal
+from http.cookiejar import CookieJar
+from sqlalchemy import insert
+from werkzeug.serving import make_server
+from config import Config
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+from app.models.catalog_facet import CatalogFacet
+from app.models.dashboard_stats import DashboardStats
+from app.utils.migrations import add_order_events, stamp
+from app.utils.passwords import password_hasher
+from app.utils.query_guard import count_statements
+from app.utils.search import Fts5SearchIndex, search_index
+
+BATCH_SIZE = 50000
+WARMUP = 1  # lifecycles run before measuring, so templates and caches are loaded
+LATENCY_SLACK_MS = 5.0
+PASSWORD = "bench"
+ORDER_STATUSES = ['pending', 'accepted', 'preparing', 'ready', 'delivered', 'cancelled']
+STEPS = ('browse', 'search', 'add_to_cart', 'checkout', 'place_order', 'verify_payment', 'update_status')
+BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'order_lifecycle.json')
+
+
+def customer_email(user_id):
+    return f"c{user_id}@bench.example.com"
+
+def restaurant_email(user_id):
+    return f"r{user_id}@bench.example.com"
+
+
+def seed(orders, restaurants, customers, items_per_restaurant):
+    rng = random.Random(42)
+    start = datetime.utcnow() - timedelta(seconds=orders * 30)
+    password = password_hasher().hash(PASSWORD)
+    users = [dict(id=i, name=f"Restaurant {i}", email=restaurant_email(i), phone_number=f"01{i:09d}",
+                  location="Dhaka", password=password, role="restaurant", status="active")
+             for i in range(1, restaurants + 1)]
+    users += [dict(id=i, name=f"Customer {i}", email=customer_email(i), phone_number=f"01{i:09d}",
+                   location="Dhaka", password=password, role="customer", status="active")
+              for i in range(restaurants + 1, restaurants + customers + 1)]
+    db.session.execute(insert(User), users)
+    items = []
+    for restaurant_id in range(1, restaurants + 1):
+        for n in range(items_per_restaurant):
+            items.append(dict(id=len(items) + 1, name=f"Dish {restaurant_id}-{n}", price=Decimal("9.99"),
+                              description=f"House dish number {n}", restaurant_id=restaurant_id,
+                              category=f"Category {n % 12}", created_at=start))
+    db.session.execute(insert(FoodItem), items)
+
+    for offset in range(0, orders, BATCH_SIZE):
+        order_rows, line_rows, payment_rows = [], [], []
+        for order_id in range(offset + 1, min(offset + BATCH_SIZE, orders) + 1):
+            item = items[rng.randrange(len(items))]
+            customer_id = rng.randint(restaurants + 1, restaurants + customers)
+            when = start + timedelta(seconds=order_id * 30)
+            status = rng.choice(ORDER_STATUSES)
+            order_rows.append(dict(id=order_id, customer_id=customer_id, restaurant_id=item['restaurant_id'],
+                                   total_price=item['price'], status=status, payment_id=order_id, order_date=when))
+            line_rows.append(dict(order_id=order_id, food_item_id=item['id'], quantity=1,
+                                  unit_price=item['price'], line_total=item['price']))
+            payment_rows.append(dict(id=order_id, order_id=order_id, customer_id=customer_id,
+                                     restaurant_id=item['restaurant_id'], bkash_transaction_id=f"TXN{order_id}",
+                                     payment_phone_number="01000000000", amount=item['price'],
+                                     payment_status='pending' if status == 'pending' else 'verified',
+                                     payment_date=when))
+        db.session.execute(insert(Order), order_rows)
+        db.session.execute(insert(OrderLine), line_rows)
+        db.session.execute(insert(Payment), payment_rows)
+        db.session.commit()
+        print(f"  seeded {min(offset + BATCH_SIZE, orders):,} orders", flush=True)
+
+    # The inserts above skip the ORM hooks, so derived state is built once here.
+    with db.engine.begin() as connection:
+        add_order_events(connection)
+        if isinstance(search_index(), Fts5SearchIndex):
+            search_index().rebuild(connection)
+        CatalogFacet.rebuild(connection)
+    DashboardStats.rebuild()
+    return [(item['id'], item['restaurant_id']) for item in items]
+
+
+def lifecycle(send, lookup, rng, customer_id, items, tag):
+    """One customer order from browsing to delivery. send(step, user_id,
+    method, path, data) makes and records a request;
+    lookup(transaction_id) returns the new (payment_id, order_id)."""
+    food_item_id, restaurant_id = rng.choice(items)
+    send('browse', customer_id, 'GET', '/customer/browse')
+    send('search', customer_id, 'GET', f"/customer/browse?q=dish+{rng.randint(0, 20)}")
+    send('add_to_cart', customer_id, 'POST', f"/customer/add_to_cart/{food_item_id}", {'quantity': rng.randint(1, 3)})
+    send('checkout', customer_id, 'GET', '/customer/checkout')
+    send('place_order', customer_id, 'POST', '/customer/place_order',
+         {'bkash_transaction_id': tag, 'payment_phone_number': '01000000000'})
+    placed = lookup(tag)
+    if placed is None:
+        return
+    payment_id, order_id = placed
+    send('verify_payment', restaurant_id, 'POST', f"/restaurant/verify_payment/{payment_id}")
+    for status in ('preparing', 'ready', 'delivered'):
+        send('update_status', restaurant_id, 'POST', f"/restaurant/update_order_status/{order_id}/{status}")
+
+def _succeeded(step, status, location):
+    # Redirects back to checkout or the dashboard mean the step was refused.
+    if status >= 400:
+        return False
+    return not (step == 'place_order' and 'order_history' not in location)
+
+
+def run_client(app, items, customer_id, iterations):
+    """Drives the lifecycle through the test client; returns {step: [(ms, statements, ok)]}."""
+    samples = {step: [] for step in STEPS}
+    clients = {}
+    with app.app_context():
+        engine = db.engine
+
+    def client(user_id):
+        if user_id not in clients:
+            clients[user_id] = app.test_client()
+            with clients[user_id].session_transaction() as sess:
+                sess["_user_id"] = str(user_id)
+        return clients[user_id]
+
+    def send(step, user_id, method, path, data=None):
+        test_client = client(user_id)
+        with count_statements(engine) as statements:
+            started = time.perf_counter()
+            response = test_client.open(path, method=method, data=data)
+            elapsed = (time.perf_counter() - started) * 1000
+        ok = _succeeded(step, response.status_code, response.headers.get('Location', ''))
+        samples[step].append((elapsed, len(statements), ok))
+
+    def lookup(transaction_id):
+        with app.app_context():
+            row = db.session.execute(
+                db.select(Payment.id, Payment.order_id).where(Payment.bkash_transaction_id == transaction_id)
+            ).first()
+            return tuple(row) if row else None
+
+    rng = random.Random(1)
+    for n in range(WARMUP + iterations):
+        if n == WARMUP:
+            for values in samples.values():
+                values.clear()
+        lifecycle(send, lookup, rng, customer_id, items, f"BENCH-C-{n}")
+    return samples
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+def _http_worker(job):
+    # Runs in its own process. Each user gets an opener with its own cookies.
+    base_url, database, items, customer_id, iterations, worker = job
+    openers = {}
+    logging_in = [0.0]  # seconds spent on logins, left out of the throughput
+
+    def opener(user_id):
+        if user_id not in openers:
+            started = time.perf_counter()
+            user_opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect())
+            email = customer_email(user_id) if user_id == customer_id else restaurant_email(user_id)
+            _request(user_opener, base_url + '/auth/login', {'email': email, 'password': PASSWORD})
+            openers[user_id] = user_opener
+            logging_in[0] += time.perf_counter() - started
+        return openers[user_id]
+
+    samples = {step: [] for step in STEPS}
+
+    def send(step, user_id, method, path, data=None):
+        user_opener = opener(user_id)
+        started = time.perf_counter()
+        status, location = _request(user_opener, base_url + path, data or {} if method == 'POST' else None)
+        elapsed = (time.perf_counter() - started) * 1000
+        samples[step].append((elapsed, None, _succeeded(step, status, location)))
+
+    connection = sqlite3.connect(database, timeout=30)
+
+    def lookup(transaction_id):
+        return connection.execute(
+            "SELECT id, order_id FROM payments WHERE bkash_transaction_id = ?", (transaction_id,)).fetchone()
+
+    rng = random.Random(100 + worker)
+    for n in range(WARMUP):
+        lifecycle(send, lookup, rng, customer_id, items, f"BENCH-H{worker}-warmup-{n}")
+    for values in samples.values():
+        values.clear()
+    logging_in[0] = 0.0
+    started = time.perf_counter()
+    for n in range(iterations):
+        lifecycle(send, lookup, rng, customer_id, items, f"BENCH-H{worker}-{n}")
+    connection.close()
+    return samples, time.perf_counter() - started - logging_in[0]
+
+def _request(opener, url, data=None):
+    body = urllib.parse.urlencode(data).encode() if data is not None else None
+    try:
+        with opener.open(url, body, timeout=60) as response:
+            response.read()
+            return response.status, ''
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, e.headers.get('Location', '')
+
+def run_http(app, database, items, customers, iterations, workers):
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    jobs = [(base_url, database, items, customers[worker % len(customers)], iterations, worker)
+            for worker in range(workers)]
+    try:
+        with multiprocessing.get_context('spawn').Pool(workers) as pool:
+            results = pool.map(_http_worker, jobs)
+    finally:
+        server.shutdown()
+    samples = {step: [] for step in STEPS}
+    for result, _ in results:
+        for step, values in result.items():
+            samples[step].extend(values)
+    return samples, max(seconds for _, seconds in results)
+
+
+def percentile(ordered, p):
+    # Nearest rank.
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+def summarize(samples, elapsed):
+    summary = {'requests': 0, 'errors': 0, 'seconds': round(elapsed, 3), 'steps': {}}
+    for step in STEPS:
+        values = samples[step]
+        if not values:
+            continue
+        timings = sorted(value[0] for value in values)
+        counts = [value[1] for value in values if value[1] is not None]
+        errors = sum(1 for value in values if not value[2])
+        summary['steps'][step] = {
+            'requests': len(values), 'errors': errors,
+            'p50_ms': round(percentile(timings, 50), 2), 'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2), 'throughput': round(len(values) / elapsed, 1),
+            'statements': max(counts) if counts else None,
+        }
+        summary['requests'] += len(values)
+        summary['errors'] += errors
+    summary['throughput'] = round(summary['requests'] / elapsed, 1)
+    return summary
+
+def print_summary(mode, summary):
+    print()
+    print(f"{mode}: {summary['requests']} requests in {summary['seconds']:.1f}s, "
+          f"{summary['throughput']:.1f} req/s, {summary['errors']} errors")
+    print(f"{'step':<16}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'SQL':>6}")
+    for step, row in summary['steps'].items():
+        statements = '' if row['statements'] is None else row['statements']
+        print(f"{step:<16}{row['requests']:>9}{row['errors']:>8}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}"
+              f"{row['p99_ms']:>9.2f}{row['throughput']:>9.1f}{statements:>6}")
+
+
+def regressions(results, baseline, tolerance, slack_ms=LATENCY_SLACK_MS):
+    """Messages for each result that is worse than the baseline: any step
+    issuing more SQL statements, any new errors, or p95 latency or
+    throughput off by more than tolerance (a fraction). Latency also gets
+    slack_ms, since a few milliseconds either way is noise."""
+    problems = []
+    for mode, summary in results.items():
+        expected = baseline.get(mode)
+        if expected is None:
+            continue
+        if summary['errors'] > expected['errors']:
+            problems.append(f"{mode}: {summary['errors']} failed requests (baseline {expected['errors']})")
+        if summary['throughput'] < expected['throughput'] * (1 - tolerance):
+            problems.append(f"{mode}: throughput {summary['throughput']} req/s (baseline {expected['throughput']})")
+        for step, row in summary['steps'].items():
+            before = expected['steps'].get(step)
+            if before is None:
+                continue
+            if row['statements'] is not None and before['statements'] is not None and row['statements'] > before['statements']:
+                problems.append(f"{mode} {step}: {row['statements']} SQL statements (baseline {before['statements']})")
+            if row['p95_ms'] > before['p95_ms'] * (1 + tolerance) + slack_ms:
+                problems.append(f"{mode} {step}: p95 {row['p95_ms']} ms (baseline {before['p95_ms']})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--restaurants", type=int, default=50)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--items-per-restaurant", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=100, help="Orders placed by each driver (per worker with --http)")
+    parser.add_argument("--http", action="store_true", help="Also run the load generator against a local server")
+    parser.add_argument("--workers", type=int, default=4, help="Load-generating processes for --http")
+    parser.add_argument("--database", help="SQLite file to use (default: a temporary file)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--check", action="store_true", help="Exit 1 when results regress past the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed latency/throughput change (fraction)")
+    args = parser.parse_args()
+
+    path = args.database or os.path.join(tempfile.mkdtemp(prefix="bench-"), "lifecycle.db")
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        WTF_CSRF_ENABLED = False
+        CART_BACKEND = 'memory'
+        IDENTITY_CACHE_BACKEND = 'memory'
+        PAGE_CACHE_BACKEND = 'memory'
+        IMAGE_GC_INTERVAL = None
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        stamp()
+        print(f"Seeding {args.orders:,} orders into {path}")
+        items = seed(args.orders, args.restaurants, args.customers, args.items_per_restaurant)
+        db.session.remove()
+
+    customers = list(range(args.restaurants + 1, args.restaurants + args.customers + 1))
+    results = {}
+    started = time.perf_counter()
+    samples = run_client(app, items, customers[0], args.iterations)
+    results['client'] = summarize(samples, time.perf_counter() - started)
+    print_summary('test client', results['client'])
+    if args.http:
+        samples, elapsed = run_http(app, path, items, customers[1:] or customers, args.iterations, args.workers)
+        results['http'] = summarize(samples, elapsed)
+        print_summary(f"http ({args.workers} workers)", results['http'])
+
+    volumes = {key: getattr(args, key) for key in ('orders', 'restaurants', 'customers', 'items_per_restaurant',
+                                                   'iterations', 'workers')}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'volumes': volumes, **results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nSaved the baseline to {args.baseline}")
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('volumes') != volumes:
+            print(f"\nWarning: the baseline was recorded with {baseline.get('volumes')}")
+        problems = regressions(results, baseline, args.tolerance)
+        print()
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            raise SystemExit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
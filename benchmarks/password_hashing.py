@@ -0,0 +1,91 @@
+"""Password verification throughput and latency under concurrent logins, in
+the request thread (sync) and in the bounded process pool.
+
+    python -m benchmarks.password_hashing --threads 16 --iterations 20
+    python -m benchmarks.password_hashing --rounds 12 --workers 4 --max-pending 8
+
+Each of --threads client threads verifies the same password --iterations
+times, as a burst of logins would. Prints verifications per second, p50, p95
+and p99 latency, and how many calls were turned away because the pool's
+queue stayed full for longer than --queue-timeout.
+"""
+import argparse
+import threading
+import time
+from flask import Flask
+from config import Config
+from app.utils.passwords import PasswordHasher, PasswordHasherBusy
+from benchmarks.order_lifecycle import percentile
+
+PASSWORD = "bench"
+MODES = ('sync', 'process')
+
+
+def run(mode, rounds, threads, iterations, workers=Config.PASSWORD_WORKERS,
+        max_pending=Config.PASSWORD_MAX_PENDING, queue_timeout=Config.PASSWORD_QUEUE_TIMEOUT):
+    app = Flask(__name__)
+    app.config.update(BCRYPT_LOG_ROUNDS=rounds, PASSWORD_HASHER=mode, PASSWORD_WORKERS=workers,
+                      PASSWORD_MAX_PENDING=max_pending, PASSWORD_QUEUE_TIMEOUT=queue_timeout)
+    hasher = PasswordHasher(app)
+    hashed = hasher.hash(PASSWORD)  # also starts the pool's workers
+    latencies, rejected, failed = [], [0], [0]
+    lock = threading.Lock()
+
+    def client():
+        mine, busy, wrong = [], 0, 0
+        for _ in range(iterations):
+            started = time.perf_counter()
+            try:
+                if not hasher.verify(PASSWORD, hashed):
+                    wrong += 1
+            except PasswordHasherBusy:
+                busy += 1
+                continue
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+            rejected[0] += busy
+            failed[0] += wrong
+
+    pool = [threading.Thread(target=client) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    latencies.sort()
+    return {
+        'mode': mode, 'rounds': rounds, 'verified': len(latencies), 'rejected': rejected[0], 'failed': failed[0],
+        'seconds': round(elapsed, 3), 'throughput': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+    }
+
+def print_result(result):
+    print(f"{result['mode']:<8} {result['throughput']:>8.1f}/s {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+          f"{result['p99_ms']:>9.1f} {result['rejected']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=Config.BCRYPT_LOG_ROUNDS, help="bcrypt cost factor")
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent logins")
+    parser.add_argument("--iterations", type=int, default=10, help="Verifications per thread")
+    parser.add_argument("--workers", type=int, default=Config.PASSWORD_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=Config.PASSWORD_MAX_PENDING)
+    parser.add_argument("--queue-timeout", type=float, default=Config.PASSWORD_QUEUE_TIMEOUT)
+    parser.add_argument("--mode", choices=MODES, action="append", help="Only run these modes (default: both)")
+    args = parser.parse_args()
+
+    print(f"cost {args.rounds}, {args.threads} threads x {args.iterations} verifications")
+    print(f"{'mode':<8} {'throughput':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rejected':>9}")
+    for mode in args.mode or MODES:
+        print_result(run(mode, args.rounds, args.threads, args.iterations, args.workers,
+                         args.max_pending, args.queue_timeout))
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+
 import os
 
 class Config:
@@ -6,4 +7,54 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = 'app/static/uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    CATALOG_PAGE_SIZE = 24
+    HOME_FEATURED_ITEMS = 9
+    CART_BACKEND = os.environ.get('CART_BACKEND') or 'sqlite'
+    CART_DATABASE = os.environ.get('CART_DATABASE')  # defaults to instance/carts.db
+    IDENTITY_CACHE_BACKEND = os.environ.get('IDENTITY_CACHE_BACKEND') or 'sqlite'  # sqlite (shared by workers), memory (single worker) or none
+    IDENTITY_CACHE_DATABASE = os.environ.get('IDENTITY_CACHE_DATABASE')  # defaults to instance/identity_cache.db
+    IDENTITY_CACHE_TTL = 300
+    IDENTITY_CACHE_SIZE = 1024
+    IMAGE_PIPELINE = os.environ.get('IMAGE_PIPELINE') or 'process'  # process, or sync to resize in the request
+    IMAGE_WORKERS = 2
+    IMAGE_UPLOAD_DIR = None  # defaults to app/static/uploads
+    IMAGE_GC_INTERVAL = 3600  # seconds between orphaned-image sweeps; None disables the sweep thread
+    IMAGE_GC_GRACE = 3600  # seconds an unreferenced image is kept before it is deleted
+    STREAM_BROKER = os.environ.get('STREAM_BROKER') or 'memory'  # memory, or sqlite to share events between workers
+    STREAM_DATABASE = os.environ.get('STREAM_DATABASE')  # defaults to instance/stream_events.db
+    STREAM_HEARTBEAT = 15  # seconds between keep-alive comments on an idle stream
+    STREAM_MAX_DURATION = 300  # seconds before a stream is closed and the browser reconnects
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'  # auto, fts5 or memory
+    SEARCH_MAX_RESULTS = 1000  # ranked matches considered by a catalog search
+    SEARCH_RANK_WINDOW = 5000  # broader queries only rank their newest matches
+    INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE') or 0)  # fraction of requests timed; 0 disables
+    INSTRUMENTATION_SLOW_QUERY_MS = 100  # statements at least this slow are kept as samples
+    INSTRUMENTATION_SLOW_QUERIES = 50  # slow query samples kept per process
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # bearer token for /metrics; unset disables it
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS') or 12)  # password hash cost; changed hashes are upgraded on login
+    PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER') or 'process'  # process, or sync to hash in the request thread
+    PASSWORD_WORKERS = 2
+    PASSWORD_MAX_PENDING = 32  # hashes running or queued before requests are turned away
+    PASSWORD_QUEUE_TIMEOUT = 5  # seconds a request waits for a slot before a 503
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS') or 0)  # reverse proxies in front of the app whose X-Forwarded-* headers are trusted
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND') or 'memory'  # memory, sqlite (shared by workers) or none
+    RATE_LIMIT_DATABASE = os.environ.get('RATE_LIMIT_DATABASE')  # defaults to instance/rate_limits.db
+    RATE_LIMITS = {'login_ip': (30, 60), 'login_email': (5, 900), 'register_ip': (10, 3600), 'availability_ip': (60, 60)}  # name: (attempts, per seconds)
+    UNIQUENESS_FILTER_TTL = 60  # seconds between rebuilds of the taken email/phone filter
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND') or 'sqlite'  # sqlite (shared by workers), memory (single worker) or none
+    PAGE_CACHE_DATABASE = os.environ.get('PAGE_CACHE_DATABASE')  # defaults to instance/page_cache.db
+    PAGE_CACHE_TTL = 300  # seconds a cached page is served at most
+    PAGE_CACHE_SIZE = 512  # pages and fragments kept per process by the memory backend
 
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+    SQL_QUERY_LIMIT = 10
+    CART_BACKEND = 'memory'
+    IDENTITY_CACHE_BACKEND = 'memory'
+    PAGE_CACHE_BACKEND = 'memory'
+    IMAGE_PIPELINE = 'sync'
+    IMAGE_GC_INTERVAL = None
+    BCRYPT_LOG_ROUNDS = 4
+    PASSWORD_HASHER = 'sync'
@@ -1,9 +1,13 @@
-from app import create_app, db
+import sys
+from app import create_app
+from app.utils.migrations import init_db
 
 app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
-    app.run(debug=True, host='0.0.0.0', port=5000)
-
+        init_db()
+    if len(sys.argv) > 1 and sys.argv[1] == 'db_init':
+        print("Database is up to date.")
+    else:
+        app.run(debug=True, host='0.0.0.0', port=5000)
@@ -1,22 +1,32 @@
-from app import create_app, db, bcrypt
+import sys
+from app import create_app, db
 from app.models.user import User
 from app.models.food_item import FoodItem
 from app.models.order import Order
+from app.models.order_line import OrderLine
 from app.models.payment import Payment
+from app.utils.identity_cache import clear_identity_cache
+from app.utils.migrations import stamp
+from app.utils.passwords import MIN_ROUNDS, password_hasher
 from decimal import Decimal
 
-def seed_data():
+def seed_data(fast=False):
     app = create_app()
+    if fast:
+        # Cheap hashes; each is re-hashed at the configured cost on first login.
+        app.config['BCRYPT_LOG_ROUNDS'] = MIN_ROUNDS
     with app.app_context():
         db.drop_all()
         db.create_all()
+        stamp()
+        clear_identity_cache()
 
         # Create users
-        hashed_admin_password = bcrypt.generate_password_hash("admin123").decode("utf-8")
+        hashed_admin_password = password_hasher().hash("admin123")
         admin = User(name="Admin User", email="admin@foodapp.com", phone_number="01000000000", location="Admin City", password=hashed_admin_password, role="admin", status="active")
         db.session.add(admin)
 
-        hashed_restaurant_password = bcrypt.generate_password_hash("restaurant123").decode("utf-8")
+        hashed_restaurant_password = password_hasher().hash("restaurant123")
         restaurant1 = User(name="Taste of Italy", email="italy@foodapp.com", phone_number="01111111111", location="Dhaka", password=hashed_restaurant_password, role="restaurant", status="active")
         restaurant2 = User(name="Spice Route", email="spice@foodapp.com", phone_number="01222222222", location="Chittagong", password=hashed_restaurant_password, role="restaurant", status="active")
         restaurant3 = User(name="Seafood Haven", email="seafood@foodapp.com", phone_number="01555555555", location="Cox's Bazar", password=hashed_restaurant_password, role="restaurant", status="active")
@@ -24,7 +34,7 @@ def seed_data():
         db.session.add(restaurant2)
         db.session.add(restaurant3)
 
-        hashed_customer_password = bcrypt.generate_password_hash("customer123").decode("utf-8")
+        hashed_customer_password = password_hasher().hash("customer123")
         customer1 = User(name="John Doe", email="john@foodapp.com", phone_number="01333333333", location="Sylhet", password=hashed_customer_password, role="customer", status="active")
         customer2 = User(name="Jane Smith", email="jane@foodapp.com", phone_number="01444444444", location="Khulna", password=hashed_customer_password, role="customer", status="active")
         customer3 = User(name="Ali Khan", email="ali@foodapp.com", phone_number="01666666666", location="Rajshahi", password=hashed_customer_password, role="customer", status="active")
@@ -47,44 +57,19 @@ def seed_data():
         db.session.commit()
 
         # Create orders and payments
-        order1 = Order(customer_id=customer1.id, food_item_id=pizza.id, restaurant_id=restaurant1.id, quantity=1, total_price=pizza.price, status="pending")
-        db.session.add(order1)
-        db.session.flush()
-        payment1 = Payment(order_id=order1.id, customer_id=customer1.id, restaurant_id=restaurant1.id, bkash_transaction_id="TXN123456789", payment_phone_number="01333333333", amount=pizza.price, payment_status="pending")
-        db.session.add(payment1)
-        db.session.flush()
-        order1.payment_id = payment1.id
-        db.session.commit()
-
-        order2 = Order(customer_id=customer2.id, food_item_id=biryani.id, restaurant_id=restaurant2.id, quantity=2, total_price=biryani.price * 2, status="accepted")
-        db.session.add(order2)
-        db.session.flush()
-        payment2 = Payment(order_id=order2.id, customer_id=customer2.id, restaurant_id=restaurant2.id, bkash_transaction_id="TXN987654321", payment_phone_number="01444444444", amount=biryani.price * 2, payment_status="verified")
-        db.session.add(payment2)
-        db.session.flush()
-        order2.payment_id = payment2.id
-        db.session.commit()
-
-        order3 = Order(customer_id=customer3.id, food_item_id=seafood_platter.id, restaurant_id=restaurant3.id, quantity=1, total_price=seafood_platter.price, status="preparing")
-        db.session.add(order3)
-        db.session.flush()
-        payment3 = Payment(order_id=order3.id, customer_id=customer3.id, restaurant_id=restaurant3.id, bkash_transaction_id="TXN456789123", payment_phone_number="01666666666", amount=seafood_platter.price, payment_status="pending")
-        db.session.add(payment3)
-        db.session.flush()
-        order3.payment_id = payment3.id
-        db.session.commit()
-
-        order4 = Order(customer_id=customer4.id, food_item_id=dessert_cake.id, restaurant_id=restaurant1.id, quantity=3, total_price=dessert_cake.price * 3, status="delivered")
-        db.session.add(order4)
-        db.session.flush()
-        payment4 = Payment(order_id=order4.id, customer_id=customer4.id, restaurant_id=restaurant1.id, bkash_transaction_id="TXN789123456", payment_phone_number="01777777777", amount=dessert_cake.price * 3, payment_status="verified")
-        db.session.add(payment4)
-        db.session.flush()
-        order4.payment_id = payment4.id
-        db.session.commit()
+        def add_order(customer, food_item, quantity, status, transaction_id, payment_status):
+            total_price = food_item.price * quantity
+            line = OrderLine(food_item_id=food_item.id, quantity=quantity, unit_price=food_item.price, line_total=total_price)
+            order = Order(customer_id=customer.id, restaurant_id=food_item.restaurant_id, total_price=total_price, status=status, lines=[line])
+            order.payment = Payment(order=order, customer_id=customer.id, restaurant_id=food_item.restaurant_id, bkash_transaction_id=transaction_id, payment_phone_number=customer.phone_number, amount=total_price, payment_status=payment_status)
+            db.session.add(order)
 
+        add_order(customer1, pizza, 1, "pending", "TXN123456789", "pending")
+        add_order(customer2, biryani, 2, "accepted", "TXN987654321", "verified")
+        add_order(customer3, seafood_platter, 1, "preparing", "TXN456789123", "pending")
+        add_order(customer4, dessert_cake, 3, "delivered", "TXN789123456", "verified")
         db.session.commit()  # Final commit for any remaining changes
         print("Database seeded successfully!")
 
 if __name__ == "__main__":
-    seed_data()
\ No newline at end of file
+    seed_data(fast="--fast" in sys.argv[1:])
\ No newline at end of file
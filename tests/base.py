@@ -0,0 +1,32 @@
+import unittest
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+
+class AppTestCase(unittest.TestCase):
+
+    # An app with one admin, one restaurant and one customer. Subclasses can
+    # swap `config` and add their own rows after calling super().setUp().
+    config = TestConfig
+
+    def setUp(self):
+        self.app = create_app(self.config)
+        with self.app.app_context():
+            db.create_all()
+            admin = User(name="Admin", email="admin@example.com", phone_number="0000000000", location="Dhaka", password="hashed_password", role="admin")
+            restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+            customer = User(name="John Doe", email="john@example.com", phone_number="3333333333", location="Sylhet", password="hashed_password", role="customer")
+            db.session.add_all([admin, restaurant, customer])
+            db.session.commit()
+            self.admin_id, self.restaurant_id, self.customer_id = admin.id, restaurant.id, customer.id
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def client_for(self, user_id):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+        return client
@@ -0,0 +1,55 @@
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import db
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+from tests.base import AppTestCase
+
+class AdminDeleteFoodItemTestCase(AppTestCase):
+
+    # The delete writes each affected order and the tables derived from
+    # orders and the menu, so it is not held to the per-request limit.
+    class config(TestConfig):
+        SQL_QUERY_LIMIT = None
+
+    def setUp(self):
+        super().setUp()
+        with self.app.app_context():
+            pizza = FoodItem(name="Pizza", price=Decimal("10.00"), restaurant_id=self.restaurant_id, category="Pizza")
+            bread = FoodItem(name="Garlic Bread", price=Decimal("3.00"), restaurant_id=self.restaurant_id, category="Sides")
+            db.session.add_all([pizza, bread])
+            db.session.commit()
+            self.pizza_id, self.bread_id = pizza.id, bread.id
+            self.mixed_id, self.mixed_payment_id = self.place_order("TXN1", {pizza: 2, bread: 1})
+            self.pizza_only_id, self.pizza_only_payment_id = self.place_order("TXN2", {pizza: 1})
+
+    def place_order(self, txn, quantities):
+        lines = [OrderLine(food_item_id=item.id, quantity=quantity, unit_price=item.price, line_total=item.price * quantity)
+                 for item, quantity in quantities.items()]
+        total = sum(line.line_total for line in lines)
+        order = Order(customer_id=self.customer_id, restaurant_id=self.restaurant_id, total_price=total, lines=lines)
+        order.payment = Payment(order=order, customer_id=self.customer_id, restaurant_id=self.restaurant_id,
+                                bkash_transaction_id=txn, payment_phone_number="3333333333", amount=total)
+        db.session.add(order)
+        db.session.commit()
+        return order.id, order.payment.id
+
+    def test_deleting_an_item_keeps_the_rest_of_its_orders(self):
+        admin = self.client_for(self.admin_id)
+        admin.post(f"/admin/delete_food_item/{self.pizza_id}")
+        self.assertEqual(admin.post("/admin/confirm_delete_food_item").status_code, 200)
+        with self.app.app_context():
+            self.assertIsNone(db.session.get(FoodItem, self.pizza_id))
+            mixed = db.session.get(Order, self.mixed_id)
+            self.assertEqual([(line.food_item_id, line.quantity) for line in mixed.lines], [(self.bread_id, 1)])
+            self.assertEqual(mixed.total_price, Decimal("3.00"))
+            self.assertIsNotNone(db.session.get(Payment, self.mixed_payment_id))
+            self.assertIsNone(db.session.get(Order, self.pizza_only_id))
+            self.assertIsNone(db.session.get(Payment, self.pizza_only_payment_id))
+            self.assertEqual(OrderLine.query.filter_by(food_item_id=self.pizza_id).count(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
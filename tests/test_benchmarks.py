@@ -0,0 +1,52 @@
+import unittest
+from config import TestConfig
+from app import create_app, db
+from benchmarks.order_lifecycle import STEPS, regressions, run_client, seed, summarize
+from benchmarks.password_hashing import run as run_password_hashing
+
+class OrderLifecycleBenchmarkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        with self.app.app_context():
+            db.create_all()
+            self.items = seed(orders=50, restaurants=2, customers=3, items_per_restaurant=4)
+            db.session.remove()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_lifecycle_runs_every_step_within_the_query_limit(self):
+        samples = run_client(self.app, self.items, customer_id=3, iterations=3)
+        summary = summarize(samples, 1.0)
+        self.assertEqual(summary['errors'], 0)
+        self.assertEqual(list(summary['steps']), list(STEPS))
+        self.assertEqual(summary['steps']['update_status']['requests'], 9)
+        for step, row in summary['steps'].items():
+            self.assertLessEqual(row['statements'], TestConfig.SQL_QUERY_LIMIT, step)
+
+    def test_regressions_against_the_baseline(self):
+        step = {'requests': 10, 'errors': 0, 'p50_ms': 5.0, 'p95_ms': 10.0, 'p99_ms': 12.0, 'throughput': 50.0, 'statements': 4}
+        baseline = {'client': {'requests': 10, 'errors': 0, 'throughput': 50.0, 'steps': {'browse': step}}}
+        same = {'client': {'requests': 10, 'errors': 0, 'throughput': 45.0, 'steps': {'browse': dict(step, p95_ms=19.0)}}}
+        self.assertEqual(regressions(same, baseline, tolerance=0.5), [])
+        worse = {'client': {'requests': 10, 'errors': 1, 'throughput': 20.0,
+                            'steps': {'browse': dict(step, p95_ms=21.0, statements=5)}}}
+        self.assertEqual(regressions(worse, baseline, tolerance=0.5), [
+            "client: 1 failed requests (baseline 0)",
+            "client: throughput 20.0 req/s (baseline 50.0)",
+            "client browse: 5 SQL statements (baseline 4)",
+            "client browse: p95 21.0 ms (baseline 10.0)",
+        ])
+
+class PasswordHashingBenchmarkTestCase(unittest.TestCase):
+
+    def test_burst_of_verifications(self):
+        result = run_password_hashing('sync', rounds=4, threads=3, iterations=2)
+        self.assertEqual((result['verified'], result['rejected'], result['failed']), (6, 0, 0))
+        self.assertGreater(result['throughput'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+from app.models.dashboard_stats import DashboardStats, COUNTERS
+from app.utils.query_guard import count_statements
+from app.utils.payments import _update_ids
+
+class BulkPaymentsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.admin = User(name="Admin", email="admin@example.com", phone_number="0000000000", location="Dhaka", password="hashed_password", role="admin")
+        self.italy = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        self.spice = User(name="Spice Route", email="spice@example.com", phone_number="2222222222", location="Chittagong", password="hashed_password", role="restaurant")
+        self.customer = User(name="John Doe", email="john@example.com", phone_number="3333333333", location="Sylhet", password="hashed_password", role="customer")
+        db.session.add_all([self.admin, self.italy, self.spice, self.customer])
+        db.session.commit()
+        self.pizza = FoodItem(name="Pizza", price=Decimal("10.00"), restaurant_id=self.italy.id, category="Pizza")
+        self.curry = FoodItem(name="Curry", price=Decimal("8.00"), restaurant_id=self.spice.id, category="Curry")
+        db.session.add_all([self.pizza, self.curry])
+        db.session.commit()
+        DashboardStats.rebuild()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def place_order(self, food_item, txn, age_minutes=0):
+        when = datetime.utcnow() - timedelta(minutes=age_minutes)
+        line = OrderLine(food_item_id=food_item.id, quantity=1, unit_price=food_item.price, line_total=food_item.price)
+        order = Order(customer_id=self.customer.id, restaurant_id=food_item.restaurant_id, total_price=food_item.price, order_date=when, lines=[line])
+        order.payment = Payment(order=order, customer_id=self.customer.id, restaurant_id=food_item.restaurant_id, bkash_transaction_id=txn, payment_phone_number="3333333333", amount=food_item.price, payment_date=when)
+        db.session.add(order)
+        db.session.commit()
+        return order.payment.id
+
+    def login(self, user):
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(user.id)
+
+    def assert_stats_consistent(self):
+        db.session.expire_all()
+        stats = db.session.get(DashboardStats, DashboardStats.ROW_ID)
+        incremental = {key: getattr(stats, key) for key in COUNTERS}
+        rebuilt = DashboardStats.rebuild()
+        self.assertEqual(incremental, {key: getattr(rebuilt, key) for key in COUNTERS})
+
+    def test_admin_verifies_by_id_with_per_id_results(self):
+        ids = [self.place_order(self.pizza, f"TXN{i}") for i in range(5)]
+        db.session.get(Payment, ids[0]).payment_status = "failed"
+        db.session.commit()
+        self.login(self.admin)
+        with count_statements(db.engine) as statements:
+            response = self.client.post("/admin/bulk_payments", json={"action": "verify", "payment_ids": ids + [999]})
+        self.assertEqual(response.status_code, 200)
+        results = {result["id"]: result for result in response.get_json()["results"]}
+        self.assertEqual(results[ids[0]], {"id": ids[0], "result": "skipped", "payment_status": "failed"})
+        self.assertEqual(results[999], {"id": 999, "result": "not_found"})
+        for payment_id in ids[1:]:
+            self.assertEqual(results[payment_id]["result"], "updated")
+            self.assertEqual(results[payment_id]["order_status"], "accepted")
+        updates = [s for s in statements if s.lstrip().upper().startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        db.session.expire_all()
+        self.assertEqual(Order.query.filter_by(status="accepted").count(), 4)
+        self.assert_stats_consistent()
+
+    def test_filter_selects_old_pending_payments_for_restaurant(self):
+        old = self.place_order(self.pizza, "OLD", age_minutes=30)
+        recent = self.place_order(self.pizza, "NEW", age_minutes=1)
+        other = self.place_order(self.curry, "OTHER", age_minutes=30)
+        self.login(self.admin)
+        response = self.client.post("/admin/bulk_payments", json={"action": "reject", "restaurant_id": self.italy.id, "older_than_minutes": 15})
+        self.assertEqual([result["id"] for result in response.get_json()["results"]], [old])
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Payment, old).payment_status, "failed")
+        self.assertEqual(db.session.get(Payment, old).order.status, "cancelled")
+        self.assertEqual(db.session.get(Payment, recent).payment_status, "pending")
+        self.assertEqual(db.session.get(Payment, other).payment_status, "pending")
+        self.assert_stats_consistent()
+
+    def test_restaurant_is_limited_to_its_own_payments(self):
+        own = self.place_order(self.pizza, "OWN")
+        foreign = self.place_order(self.curry, "FOREIGN")
+        self.login(self.italy)
+        response = self.client.post("/restaurant/bulk_payments", json={"action": "verify", "payment_ids": [own, foreign]})
+        results = {result["id"]: result["result"] for result in response.get_json()["results"]}
+        self.assertEqual(results, {own: "updated", foreign: "not_found"})
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Payment, foreign).payment_status, "pending")
+
+    def test_invalid_request_is_rejected(self):
+        self.login(self.admin)
+        response = self.client.post("/admin/bulk_payments", json={"action": "refund", "payment_ids": [1]})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/admin/bulk_payments", json={"action": "verify", "payment_ids": ["x"]})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/admin/bulk_payments", json="verify")
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_without_returning_reports_only_changed_rows(self):
+        ids = [self.place_order(self.pizza, f"TXN{i}") for i in range(3)]
+        # Settled by another request after this batch read them as pending.
+        db.session.get(Payment, ids[1]).payment_status = "failed"
+        db.session.commit()
+        with patch.object(db.engine.dialect, "update_returning", False):
+            updated = _update_ids(Payment.__table__, ids, {"payment_status": "pending"}, {"payment_status": "verified"})
+        self.assertEqual(updated, {ids[0], ids[2]})
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Payment, ids[1]).payment_status, "failed")
+
+    def test_form_post_redirects_with_summary(self):
+        payment_id = self.place_order(self.pizza, "TXN1")
+        self.login(self.admin)
+        response = self.client.post("/admin/bulk_payments", data={"action": "verify", "payment_ids": [str(payment_id)]})
+        self.assertEqual(response.status_code, 302)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Payment, payment_id).payment_status, "verified")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.utils.cart_store import MemoryCartStore, SqliteCartStore
+
+class CartStoreContract:
+
+    def test_add_merges_quantities_per_food_item(self):
+        self.store.add(1, 10, "Pizza", Decimal("12.50"), 5, 1)
+        self.store.add(1, 11, "Pasta", Decimal("9.00"), 5, 1)
+        self.store.add(1, 10, "Pizza", Decimal("12.50"), 5, 2)
+        items = self.store.items(1)
+        self.assertEqual([item["food_item_id"] for item in items], [10, 11])
+        self.assertEqual(items[0]["quantity"], 3)
+        self.assertEqual(items[0]["price"], Decimal("12.50"))
+        self.assertEqual(self.store.items(2), [])
+
+    def test_set_quantity_remove_and_clear(self):
+        self.store.add(1, 10, "Pizza", Decimal("12.50"), 5, 1)
+        self.store.add(1, 11, "Pasta", Decimal("9.00"), 5, 1)
+        self.assertEqual(self.store.set_quantity(1, 10, 4)["quantity"], 4)
+        self.assertIsNone(self.store.set_quantity(1, 99, 4))
+        self.assertEqual(self.store.remove(1, 11)["name"], "Pasta")
+        self.assertIsNone(self.store.remove(1, 11))
+        self.store.set_quantity(1, 10, 0)
+        self.assertEqual(self.store.items(1), [])
+        self.store.add(1, 10, "Pizza", Decimal("12.50"), 5, 1)
+        self.store.clear(1)
+        self.assertEqual(self.store.items(1), [])
+
+class MemoryCartStoreTestCase(CartStoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryCartStore()
+
+class SqliteCartStoreTestCase(CartStoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = SqliteCartStore(os.path.join(self.tmpdir.name, "carts.db"))
+
+    def tearDown(self):
+        self.store.db.close()
+        self.tmpdir.cleanup()
+
+class CartRoutesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        self.customer = User(name="John Doe", email="john@example.com", phone_number="2222222222", location="Sylhet", password="hashed_password", role="customer")
+        db.session.add_all([restaurant, self.customer])
+        db.session.commit()
+        self.pizza = FoodItem(name="Pizza", price=Decimal("12.50"), restaurant_id=restaurant.id, category="Pizza")
+        db.session.add(self.pizza)
+        db.session.commit()
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.customer.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_cart_lives_server_side(self):
+        self.client.post(f"/customer/add_to_cart/{self.pizza.id}", data={"quantity": 2})
+        self.client.post(f"/customer/add_to_cart/{self.pizza.id}", data={"quantity": 1})
+        with self.client.session_transaction() as sess:
+            self.assertNotIn("cart", sess)
+        items = self.app.extensions["cart_store"].items(self.customer.id)
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["quantity"], 3)
+        self.assertIn(b"37.50", self.client.get("/customer/cart").data)
+        self.client.get(f"/customer/remove_from_cart/{self.pizza.id}")
+        self.assertEqual(self.app.extensions["cart_store"].items(self.customer.id), [])
+
+    def test_legacy_session_cart_is_moved_to_the_store(self):
+        with self.client.session_transaction() as sess:
+            sess["cart"] = [{"food_item_id": self.pizza.id, "name": "Pizza", "price": 12.5, "quantity": 2, "restaurant_id": self.pizza.restaurant_id}]
+        self.client.get("/customer/cart")
+        with self.client.session_transaction() as sess:
+            self.assertNotIn("cart", sess)
+        self.assertEqual(self.app.extensions["cart_store"].items(self.customer.id)[0]["quantity"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
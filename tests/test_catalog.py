@@ -0,0 +1,83 @@
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.utils.catalog import CatalogQuery
+from app.utils.query_guard import count_statements
+
+class CatalogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            italy = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+            spice = User(name="Spice Route", email="spice@example.com", phone_number="2222222222", location="Chittagong", password="hashed_password", role="restaurant")
+            db.session.add_all([italy, spice])
+            db.session.commit()
+            for i in range(25):
+                restaurant = italy if i % 2 == 0 else spice
+                category = "Pizza" if i % 3 == 0 else "Curry"
+                db.session.add(FoodItem(name=f"Dish {i:02d}", description=f"Tasty dish number {i}", price=Decimal("5.00") + i, restaurant_id=restaurant.id, category=category))
+            db.session.commit()
+            self.italy_id = italy.id
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def collect_pages(self, catalog, limit):
+        seen = []
+        cursor = None
+        while True:
+            page = catalog.page(cursor=cursor, limit=limit)
+            seen.extend(item.name for item in page.items)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_keyset_pages_cover_catalog_once(self):
+        with self.app.app_context():
+            for sort in ("newest", "price_asc", "price_desc", "name"):
+                names = self.collect_pages(CatalogQuery(sort=sort), limit=7)
+                self.assertEqual(len(names), 25)
+                self.assertEqual(len(set(names)), 25)
+            self.assertEqual(self.collect_pages(CatalogQuery(sort="price_asc"), limit=7)[:2], ["Dish 00", "Dish 01"])
+            self.assertEqual(self.collect_pages(CatalogQuery(sort="price_desc"), limit=7)[0], "Dish 24")
+
+    def test_filters(self):
+        with self.app.app_context():
+            catalog = CatalogQuery(category="Pizza", restaurant_id=self.italy_id, min_price=Decimal("10"), max_price=Decimal("25"))
+            names = self.collect_pages(catalog, limit=3)
+            self.assertEqual(names, ["Dish 18", "Dish 12", "Dish 06"])
+            self.assertEqual(self.collect_pages(CatalogQuery(q="number 7"), limit=5), ["Dish 07"])
+
+    def test_restaurant_names_loaded_in_page_query(self):
+        with self.app.app_context():
+            page = CatalogQuery().page(limit=10)
+            with count_statements(db.engine) as statements:
+                names = {item.restaurant_owner.name for item in page.items}
+            self.assertEqual(statements, [])
+            self.assertEqual(names, {"Taste of Italy", "Spice Route"})
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        with self.app.app_context():
+            first = CatalogQuery().page(limit=5)
+            again = CatalogQuery().page(cursor="not-a-cursor", limit=5)
+            self.assertEqual([i.id for i in first.items], [i.id for i in again.items])
+
+    def test_browse_route_paginates(self):
+        response = self.client.get("/customer/browse?category=Pizza")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Dish 24", response.data)
+        self.assertNotIn(b"Dish 23", response.data)
+        response = self.client.get("/home")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Browse all food items", response.data)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.catalog_facet import CatalogFacet
+
+class CatalogFacetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.italy = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        self.spice = User(name="Spice Route", email="spice@example.com", phone_number="2222222222", location="Dhaka", password="hashed_password", role="restaurant")
+        db.session.add_all([self.italy, self.spice])
+        db.session.flush()
+        self.pizza = FoodItem(name="Pizza", price=Decimal("12.00"), restaurant_id=self.italy.id, category="Mains")
+        self.tiramisu = FoodItem(name="Tiramisu", price=Decimal("6.00"), restaurant_id=self.italy.id, category="Desserts")
+        self.curry = FoodItem(name="Curry", price=Decimal("9.50"), restaurant_id=self.spice.id, category="Mains")
+        db.session.add_all([self.pizza, self.tiramisu, self.curry])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def facets(self):
+        return {(facet.kind, facet.label): (facet.item_count, facet.min_price, facet.max_price)
+                for facet in CatalogFacet.query}
+
+    def test_facets_follow_food_item_changes(self):
+        self.assertEqual(self.facets(), {
+            ("category", "Mains"): (2, Decimal("9.50"), Decimal("12.00")),
+            ("category", "Desserts"): (1, Decimal("6.00"), Decimal("6.00")),
+            ("restaurant", "Taste of Italy"): (2, Decimal("6.00"), Decimal("12.00")),
+            ("restaurant", "Spice Route"): (1, Decimal("9.50"), Decimal("9.50")),
+        })
+        self.pizza.price = Decimal("15.00")
+        self.tiramisu.category = "Sweets"
+        db.session.commit()
+        facets = self.facets()
+        self.assertEqual(facets[("category", "Mains")], (2, Decimal("9.50"), Decimal("15.00")))
+        self.assertEqual(facets[("category", "Sweets")], (1, Decimal("6.00"), Decimal("6.00")))
+        self.assertNotIn(("category", "Desserts"), facets)
+
+        db.session.delete(self.curry)
+        db.session.commit()
+        facets = self.facets()
+        self.assertEqual(facets[("category", "Mains")], (1, Decimal("15.00"), Decimal("15.00")))
+        self.assertNotIn(("restaurant", "Spice Route"), facets)
+
+    def test_restaurant_rename_updates_the_label(self):
+        self.italy.name = "Taste of Rome"
+        db.session.commit()
+        self.assertEqual(self.facets()[("restaurant", "Taste of Rome")], (2, Decimal("6.00"), Decimal("12.00")))
+        self.assertNotIn(("restaurant", "Taste of Italy"), self.facets())
+
+    def test_rebuild_matches_incremental_upkeep(self):
+        expected = self.facets()
+        with db.engine.begin() as connection:
+            connection.execute(CatalogFacet.__table__.delete())
+            CatalogFacet.rebuild(connection)
+        self.assertEqual(self.facets(), expected)
+
+    def test_facet_endpoint(self):
+        data = self.client.get("/customer/browse/facets").get_json()
+        self.assertEqual([category["name"] for category in data["categories"]], ["Desserts", "Mains"])
+        self.assertEqual(data["restaurants"][0], {"id": self.spice.id, "name": "Spice Route", "count": 1,
+                                                  "min_price": "9.50", "max_price": "9.50"})
+        response = self.client.get("/customer/browse")
+        self.assertIn(b"Mains (2)", response.data)
+        self.assertIn(b"Taste of Italy (2)", response.data)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+from app.utils.query_guard import count_statements
+
+class CheckoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.italy = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        self.spice = User(name="Spice Route", email="spice@example.com", phone_number="2222222222", location="Chittagong", password="hashed_password", role="restaurant")
+        self.customer = User(name="John Doe", email="john@example.com", phone_number="3333333333", location="Sylhet", password="hashed_password", role="customer")
+        db.session.add_all([self.italy, self.spice, self.customer])
+        db.session.commit()
+        self.items = [
+            FoodItem(name=f"Dish {i}", price=Decimal("10.00") + i, restaurant_id=(self.italy if i < 6 else self.spice).id, category="Main")
+            for i in range(8)
+        ]
+        db.session.add_all(self.items)
+        db.session.commit()
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.customer.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def fill_cart(self, items, quantity=2):
+        cart = self.app.extensions["cart_store"]
+        cart.clear(self.customer.id)
+        for item in items:
+            cart.add(self.customer.id, item.id, item.name, item.price, item.restaurant_id, quantity)
+
+    def place_order(self, transaction_id):
+        with count_statements(db.engine) as statements:
+            response = self.client.post("/customer/place_order", data={"bkash_transaction_id": transaction_id, "payment_phone_number": "3333333333"})
+        self.assertEqual(response.status_code, 302)
+        return len(statements)
+
+    def test_single_restaurant_cart_writes_one_order_and_payment(self):
+        self.fill_cart(self.items[:3])
+        self.place_order("TXN1")
+        order = Order.query.one()
+        self.assertEqual(len(order.lines), 3)
+        self.assertEqual(order.item_count, 6)
+        self.assertEqual(order.total_price, Decimal("66.00"))
+        self.assertEqual(order.payment.bkash_transaction_id, "TXN1")
+        self.assertEqual(order.payment.order_id, order.id)
+        self.assertEqual(order.payment.amount, order.total_price)
+
+    def test_mixed_cart_writes_one_order_per_restaurant(self):
+        self.fill_cart([self.items[0], self.items[6], self.items[7]])
+        self.place_order("TXN2")
+        orders = {order.restaurant_id: order for order in Order.query.all()}
+        self.assertEqual(set(orders), {self.italy.id, self.spice.id})
+        self.assertEqual(len(orders[self.spice.id].lines), 2)
+        self.assertEqual(Payment.query.count(), 2)
+        self.assertEqual(orders[self.spice.id].payment.bkash_transaction_id, f"TXN2_{self.spice.id}")
+
+    def test_statements_do_not_grow_with_cart_size(self):
+        self.fill_cart(self.items[:1])
+        self.place_order("TXN3")
+        self.fill_cart(self.items[:1])
+        small = self.place_order("TXN4")
+        self.fill_cart(self.items[:6])
+        large = self.place_order("TXN5")
+        self.assertEqual(small, large)
+        self.assertEqual(OrderLine.query.count(), 8)
+
+    def test_reused_transaction_id_is_rejected(self):
+        self.fill_cart(self.items[:1])
+        self.place_order("TXN6")
+        self.fill_cart(self.items[1:2])
+        self.place_order("TXN6")
+        self.assertEqual(Order.query.count(), 1)
+
+    def test_transaction_id_is_not_reused_between_single_and_mixed_carts(self):
+        self.fill_cart(self.items[:1])
+        self.place_order("TXN7")
+        self.fill_cart([self.items[1], self.items[6]])
+        self.place_order("TXN7")
+        self.assertEqual(Order.query.count(), 1)
+
+        self.place_order("TXN8")
+        self.assertEqual(Payment.query.filter_by(bkash_reference="TXN8").count(), 2)
+        self.fill_cart(self.items[6:7])
+        self.place_order("TXN8")
+        self.assertEqual(Order.query.count(), 3)
+
+    def test_checkout_page_shows_current_prices(self):
+        self.fill_cart(self.items[:2])
+        self.items[0].price = Decimal("11.05")
+        db.session.commit()
+        with count_statements(db.engine) as statements:
+            response = self.client.get("/customer/checkout")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([s for s in statements if "FROM food_items" in s]), 1)
+        self.assertIn(b"$22.10", response.data)
+        self.assertIn(b"$44.10", response.data)
+        self.assertIn(b"changed from $10.00 to $11.05", response.data)
+
+    def test_price_change_sends_customer_back_to_checkout(self):
+        self.fill_cart(self.items[:2])
+        self.items[1].price = Decimal("15.00")
+        db.session.commit()
+        self.place_order("TXN7")
+        self.assertEqual(Order.query.count(), 0)
+        entries = self.app.extensions["cart_store"].items(self.customer.id)
+        self.assertEqual(entries[1]["price"], Decimal("15.00"))
+        self.place_order("TXN7")
+        self.assertEqual(Order.query.one().total_price, Decimal("50.00"))
+
+    def test_deleted_item_is_dropped_from_cart(self):
+        self.fill_cart(self.items[:2])
+        db.session.delete(self.items[1])
+        db.session.commit()
+        self.place_order("TXN8")
+        self.assertEqual(Order.query.count(), 0)
+        self.assertEqual(len(self.app.extensions["cart_store"].items(self.customer.id)), 1)
+        self.place_order("TXN8")
+        self.assertEqual(Order.query.one().total_price, Decimal("20.00"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+from app.models.dashboard_stats import DashboardStats, COUNTERS
+
+class DashboardStatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.admin = User(name="Admin", email="admin@example.com", phone_number="0000000000", location="Dhaka", password="hashed_password", role="admin")
+        self.restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant", status="pending")
+        self.customer = User(name="John Doe", email="john@example.com", phone_number="2222222222", location="Sylhet", password="hashed_password", role="customer")
+        db.session.add_all([self.admin, self.restaurant, self.customer])
+        db.session.commit()
+        self.food_item = FoodItem(name="Pizza", description="Cheesy", price=Decimal("12.50"), restaurant_id=self.restaurant.id, category="Pizza")
+        db.session.add(self.food_item)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def place_order(self, txn):
+        line = OrderLine(food_item_id=self.food_item.id, quantity=2, unit_price=Decimal("12.50"), line_total=Decimal("25.00"))
+        order = Order(customer_id=self.customer.id, restaurant_id=self.restaurant.id, total_price=Decimal("25.00"), lines=[line])
+        order.payment = payment = Payment(order=order, customer_id=self.customer.id, restaurant_id=self.restaurant.id, bkash_transaction_id=txn, payment_phone_number="2222222222", amount=Decimal("25.00"))
+        db.session.add(order)
+        db.session.commit()
+        return order, payment
+
+    def snapshot(self, stats):
+        return {key: getattr(stats, key) for key in COUNTERS}
+
+    def assert_matches_aggregates(self):
+        db.session.expire_all()
+        incremental = self.snapshot(db.session.get(DashboardStats, DashboardStats.ROW_ID))
+        self.assertEqual(incremental, self.snapshot(DashboardStats.rebuild()))
+        return incremental
+
+    def test_counters_follow_state_changes(self):
+        DashboardStats.rebuild()
+        order, payment = self.place_order("TXN1")
+        self.place_order("TXN2")
+        stats = self.assert_matches_aggregates()
+        self.assertEqual(stats["total_orders"], 2)
+        self.assertEqual(stats["pending_payments"], 2)
+        self.assertEqual(stats["pending_restaurants"], 1)
+
+        payment.payment_status = "verified"
+        order.status = "accepted"
+        self.restaurant.status = "active"
+        db.session.commit()
+        stats = self.assert_matches_aggregates()
+        self.assertEqual(stats["verified_revenue"], Decimal("25.00"))
+        self.assertEqual(stats["pending_orders"], 1)
+        self.assertEqual(stats["pending_restaurants"], 0)
+
+        db.session.delete(payment)
+        db.session.delete(order)
+        db.session.add(User(name="Jane", email="jane@example.com", phone_number="3333333333", location="Khulna", password="hashed_password"))
+        db.session.commit()
+        stats = self.assert_matches_aggregates()
+        self.assertEqual(stats["total_users"], 4)
+        self.assertEqual(stats["verified_revenue"], Decimal("0"))
+
+    def test_dashboard_reads_stats_row(self):
+        for i in range(7):
+            self.place_order(f"TXN{i}")
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.admin.id)
+        response = self.client.get("/admin/dashboard")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(db.session.get(DashboardStats, DashboardStats.ROW_ID))
+        self.assertEqual(response.data.count(b'<span class="order-status pending">'), 5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from app import db
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+from app.utils.exports import export_options, stream_export
+from tests.base import AppTestCase
+
+class ExportTestCase(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.app.app_context():
+            pizza = FoodItem(name="Pizza", price=Decimal("10.00"), restaurant_id=self.restaurant_id, category="Pizza")
+            bread = FoodItem(name="Garlic Bread", price=Decimal("3.00"), restaurant_id=self.restaurant_id, category="Sides")
+            db.session.add_all([pizza, bread])
+            db.session.commit()
+            for i, (day, status) in enumerate([(1, "delivered"), (2, "pending"), (3, "delivered")]):
+                order_date = datetime(2024, 3, day, 12, 0)
+                lines = [OrderLine(food_item_id=pizza.id, quantity=2, unit_price=Decimal("10.00"), line_total=Decimal("20.00")),
+                         OrderLine(food_item_id=bread.id, quantity=1, unit_price=Decimal("3.00"), line_total=Decimal("3.00"))]
+                order = Order(customer_id=self.customer_id, restaurant_id=self.restaurant_id, total_price=Decimal("23.00"),
+                              status=status, order_date=order_date, lines=lines)
+                order.payment = Payment(order=order, customer_id=self.customer_id, restaurant_id=self.restaurant_id, bkash_transaction_id=f"TXN{i}",
+                                        payment_phone_number="3333333333", amount=Decimal("23.00"), payment_date=order_date,
+                                        payment_status="verified" if status == "delivered" else "pending")
+                db.session.add(order)
+            db.session.commit()
+
+    def test_orders_csv_folds_lines_and_filters(self):
+        response = self.client_for(self.admin_id).get("/admin/export/orders?status=delivered&since=2024-03-02&until=2024-03-03")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertIn("attachment", response.headers["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["order_date"], "2024-03-03 12:00:00")
+        self.assertEqual(rows[0]["customer_name"], "John Doe")
+        self.assertEqual(rows[0]["restaurant_name"], "Taste of Italy")
+        self.assertEqual(rows[0]["items"], "2 x Pizza; 1 x Garlic Bread")
+        self.assertEqual(rows[0]["payment_status"], "verified")
+
+    def test_payments_jsonl_gzip(self):
+        response = self.client_for(self.admin_id).get("/admin/export/payments?format=jsonl&gzip=1&status=verified")
+        self.assertEqual(response.mimetype, "application/gzip")
+        self.assertTrue(response.headers["Content-Disposition"].endswith('.jsonl.gz"'))
+        records = [json.loads(line) for line in gzip.decompress(response.data).decode().splitlines()]
+        self.assertEqual([record["bkash_transaction_id"] for record in records], ["TXN0", "TXN2"])
+        self.assertEqual(records[0]["amount"], "23.00")
+        self.assertEqual(records[0]["order_status"], "delivered")
+
+    def test_small_batches_return_every_row(self):
+        with self.app.app_context():
+            body = b"".join(stream_export(**export_options("orders", {}), batch_size=1))
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(body.decode())))), 3)
+
+    def test_bad_parameters_and_non_admins_are_refused(self):
+        client = self.client_for(self.admin_id)
+        response = client.get("/admin/export/orders?since=yesterday", follow_redirects=True)
+        self.assertIn(b"since must be a date", response.data)
+        response = client.get("/admin/export/payments?status=delivered", follow_redirects=True)
+        self.assertIn(b"Unknown payment status", response.data)
+        self.assertEqual(self.client_for(self.customer_id).get("/admin/export/orders").status_code, 403)
+
+    def test_cli_writes_the_export_to_a_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "payments.csv")
+            result = self.app.test_cli_runner().invoke(args=["export", "payments", "--status", "pending", "-o", path])
+            self.assertEqual(result.exit_code, 0, result.output)
+            with open(path, newline="") as f:
+                self.assertEqual([row["bkash_transaction_id"] for row in csv.DictReader(f)], ["TXN1"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.utils.identity_cache import MemoryIdentityCache, SqliteIdentityCache
+from app.utils.migrations import init_db
+from app.utils.query_guard import count_statements
+
+class IdentityCacheTestCase(unittest.TestCase):
+
+    # Requests run without an outer app context so that each one gets a fresh
+    # session and a fresh flask.g, as in production.
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        with self.app.app_context():
+            db.create_all()
+            admin = User(name="Admin", email="admin@example.com", phone_number="0000000000", location="Dhaka", password="hashed_password", role="admin")
+            customer = User(name="John Doe", email="john@example.com", phone_number="1111111111", location="Sylhet", password="hashed_password", role="customer")
+            db.session.add_all([admin, customer])
+            db.session.commit()
+            self.admin_id, self.customer_id = admin.id, customer.id
+        self.client = self.app.test_client()
+        self.admin_client = self.app.test_client()
+        with self.admin_client.session_transaction() as sess:
+            sess["_user_id"] = str(self.admin_id)
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.customer_id)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def user_selects(self, url):
+        with self.app.app_context():
+            with count_statements(db.engine) as statements:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [s for s in statements if "FROM users" in s and "users.id = ?" in s]
+
+    def test_cached_identity_skips_user_select(self):
+        self.assertEqual(len(self.user_selects("/customer/order_history")), 1)
+        self.assertEqual(self.user_selects("/customer/order_history"), [])
+
+    def test_suspension_takes_effect_on_next_request(self):
+        self.client.get("/customer/order_history")
+        response = self.admin_client.post(f"/admin/suspend_user/{self.customer_id}")
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get("/customer/order_history")
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("/auth/login", response.location)
+
+    def test_profile_update_refreshes_cached_identity(self):
+        self.client.get("/customer/profile")
+        self.client.post("/customer/profile", data={"name": "Johnny", "email": "john@example.com", "phone_number": "1111111111", "location": "Sylhet"})
+        self.assertIsNone(self.app.extensions["identity_cache"].get(self.customer_id))
+        self.assertIn(b"Johnny", self.client.get("/customer/profile").data)
+
+class IdentityCacheBackendTestCase(unittest.TestCase):
+
+    def test_memory_cache_evicts_least_recently_used(self):
+        cache = MemoryIdentityCache(maxsize=2, ttl=60)
+        cache.set(1, {"name": "a"})
+        cache.set(2, {"name": "b"})
+        cache.get(1)
+        cache.set(3, {"name": "c"})
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), {"name": "a"})
+
+    def test_memory_cache_expires_entries(self):
+        cache = MemoryIdentityCache(ttl=60)
+        with mock.patch("app.utils.identity_cache.time.monotonic", return_value=1000.0):
+            cache.set(1, {"name": "a"})
+        with mock.patch("app.utils.identity_cache.time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get(1))
+
+    def test_sqlite_cache_is_shared_between_workers(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "identity.db")
+            first, second = SqliteIdentityCache(path), SqliteIdentityCache(path)
+            first.set(1, {"name": "a", "status": "active"})
+            self.assertEqual(second.get(1), {"name": "a", "status": "active"})
+            second.invalidate(1)
+            self.assertIsNone(first.get(1))
+            first.db.close()
+            second.db.close()
+
+    def test_sqlite_cache_is_scoped_to_its_database(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "identity.db")
+            first, second = SqliteIdentityCache(path, scope="a"), SqliteIdentityCache(path, scope="b")
+            first.set(1, {"role": "customer"})
+            second.set(1, {"role": "admin"})
+            self.assertEqual(first.get(1), {"role": "customer"})
+            second.clear()
+            self.assertEqual(first.get(1), {"role": "customer"})
+            self.assertIsNone(second.get(1))
+            first.db.close()
+            second.db.close()
+
+class SharedIdentityCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_app(self, name, role):
+        class SharedCacheConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(self.tmpdir.name, f"{name}.db")
+            IDENTITY_CACHE_BACKEND = "sqlite"
+            IDENTITY_CACHE_DATABASE = os.path.join(self.tmpdir.name, "identity.db")
+
+        app = create_app(SharedCacheConfig)
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(name=name, email=f"{name}@example.com", phone_number="0000000000", location="Dhaka", password="hashed_password", role=role))
+            db.session.commit()
+        self.addCleanup(self.close, app)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = "1"
+        return app, client
+
+    def close(self, app):
+        app.extensions["identity_cache"].db.close()
+        with app.app_context():
+            db.engine.dispose()
+
+    def test_apps_on_different_databases_do_not_share_identities(self):
+        _, customer = self.make_app("shop", "customer")
+        _, admin = self.make_app("backoffice", "admin")
+        self.assertEqual(customer.get("/customer/order_history").status_code, 200)
+        self.assertEqual(admin.get("/admin/dashboard").status_code, 200)
+        self.assertEqual(admin.get("/customer/order_history").status_code, 403)
+
+    def test_init_db_clears_cached_identities(self):
+        app, client = self.make_app("shop", "customer")
+        client.get("/customer/order_history")
+        with app.app_context():
+            init_db()
+        self.assertIsNone(app.extensions["identity_cache"].get(1))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.stored_image import StoredImage
+from app.utils.image_store import sweep_images
+from tests.test_images import make_image
+
+class ImageStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class ImageConfig(TestConfig):
+            IMAGE_UPLOAD_DIR = self.tmpdir.name
+
+        self.app = create_app(ImageConfig)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        db.session.add(self.restaurant)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmpdir.cleanup()
+
+    def add_item(self, color=(200, 40, 40)):
+        food_item = FoodItem(name="Pizza", price=Decimal("12.50"), restaurant_id=self.restaurant.id, category="Pizza")
+        db.session.add(food_item)
+        db.session.commit()
+        upload = make_image(color=color)
+        upload.stream = upload
+        self.app.extensions["image_pipeline"].submit(upload, food_item.id)
+        return food_item
+
+    def refs(self, image_url):
+        db.session.expire_all()
+        row = db.session.get(StoredImage, image_url.split("-")[0])
+        return row.ref_count if row else None
+
+    def test_identical_uploads_share_files_and_are_counted(self):
+        first = self.add_item()
+        second = self.add_item()
+        self.assertEqual(first.image_url, second.image_url)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 4)
+        self.assertEqual(self.refs(first.image_url), 2)
+        image_url = first.image_url
+        db.session.delete(first)
+        db.session.commit()
+        self.assertEqual(self.refs(image_url), 1)
+
+    def test_sweep_removes_released_images_after_grace(self):
+        food_item = self.add_item()
+        old_url = food_item.image_url
+        upload = make_image(color=(10, 200, 10))
+        upload.stream = upload
+        self.app.extensions["image_pipeline"].submit(upload, food_item.id)
+        self.assertEqual(self.refs(old_url), 0)
+        with open(os.path.join(self.tmpdir.name, "biryani.jpg"), "wb") as legacy:
+            legacy.write(b"seed photo")
+
+        self.assertEqual(sweep_images(grace=3600), 0)
+        db.session.get(StoredImage, old_url.split("-")[0]).released_at = datetime.utcnow() - timedelta(hours=2)
+        db.session.commit()
+        self.assertEqual(sweep_images(grace=3600), 4)
+        remaining = os.listdir(self.tmpdir.name)
+        self.assertNotIn(old_url, remaining)
+        self.assertIn(db.session.get(FoodItem, food_item.id).image_url, remaining)
+        self.assertIn("biryani.jpg", remaining)
+
+    def test_sweep_removes_stale_pipeline_leftovers(self):
+        leftovers = ["upload-abc", "0123456789abcdef0123-300.jpg"]
+        for name in leftovers:
+            path = os.path.join(self.tmpdir.name, name)
+            with open(path, "wb") as handle:
+                handle.write(b"x")
+            os.utime(path, (time.time() - 7200, time.time() - 7200))
+        self.assertEqual(sweep_images(grace=3600), 2)
+
+    def test_media_endpoint_serves_immutable_images(self):
+        image_url = self.add_item().image_url
+        response = self.client.get(f"/media/{image_url}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", response.headers["Cache-Control"])
+        self.assertEqual(response.headers["ETag"], f'"{image_url}"')
+        response = self.client.get(f"/media/{image_url}", headers={"If-None-Match": f'"{image_url}"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get("/media/upload-abc").status_code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import io
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+
+def make_image(size=(1200, 800), mode="RGB", format="JPEG", color=(200, 40, 40)):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, format)
+    buffer.seek(0)
+    return buffer
+
+class ImagePipelineTestCase(unittest.TestCase):
+
+    config = TestConfig
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class ImageConfig(self.config):
+            IMAGE_UPLOAD_DIR = self.tmpdir.name
+
+        self.app = create_app(ImageConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+            db.session.add(restaurant)
+            db.session.commit()
+            self.restaurant_id = restaurant.id
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.restaurant_id)
+
+    def tearDown(self):
+        self.app.extensions["image_pipeline"].shutdown()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+        self.tmpdir.cleanup()
+
+    def add_food_item(self, image, filename="photo.jpg"):
+        response = self.client.post("/restaurant/add_food_item", data={
+            "name": "Pizza", "description": "Cheesy", "price": "12.50", "category": "Pizza",
+            "image": (image, filename),
+        }, content_type="multipart/form-data")
+        self.assertEqual(response.status_code, 302)
+        with self.app.app_context():
+            return FoodItem.query.order_by(FoodItem.id.desc()).first().id
+
+    def image_url(self, food_item_id):
+        with self.app.app_context():
+            return db.session.get(FoodItem, food_item_id).image_url
+
+    def test_upload_produces_sized_and_webp_variants(self):
+        food_item_id = self.add_food_item(make_image())
+        image_url = self.image_url(food_item_id)
+        digest = image_url.split("-")[0]
+        self.assertEqual(image_url, f"{digest}-300.jpg")
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), sorted(
+            f"{digest}-{width}.{ext}" for width in (300, 600) for ext in ("jpg", "webp")))
+        with Image.open(os.path.join(self.tmpdir.name, f"{digest}-600.webp")) as variant:
+            self.assertEqual(variant.size, (600, 400))
+
+    def test_transparent_png_keeps_png_fallback(self):
+        food_item_id = self.add_food_item(make_image(mode="RGBA", format="PNG", color=(0, 0, 0, 0)), "logo.png")
+        self.assertTrue(self.image_url(food_item_id).endswith("-300.png"))
+
+    def test_identical_upload_reuses_existing_variants(self):
+        first = self.add_food_item(make_image())
+        files = sorted(os.listdir(self.tmpdir.name))
+        second = self.add_food_item(make_image())
+        self.assertEqual(self.image_url(first), self.image_url(second))
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), files)
+
+    def test_catalog_renders_srcset(self):
+        self.add_food_item(make_image())
+        response = self.client.get("/customer/browse")
+        self.assertIn(b'type="image/webp"', response.data)
+        self.assertIn(b"600w", response.data)
+
+    def test_older_upload_finishing_last_is_dropped(self):
+        food_item_id = self.add_food_item(make_image())
+        pipeline = self.app.extensions["image_pipeline"]
+        jobs = []
+
+        def hold(fn, *args):
+            future = Future()
+            jobs.append((future, fn, args))
+            return future
+
+        with mock.patch.object(pipeline, "mode", "process"), \
+                mock.patch.object(pipeline, "_pool", return_value=mock.Mock(submit=hold)):
+            pipeline.submit(FileStorage(make_image(color=(0, 120, 0))), food_item_id)
+            pipeline.submit(FileStorage(make_image(color=(0, 0, 120))), food_item_id)
+        (older, older_fn, older_args), (newer, newer_fn, newer_args) = jobs
+        newer.set_result(newer_fn(*newer_args))
+        expected = self.image_url(food_item_id)
+        self.assertTrue(expected.startswith(newer_args[2]))
+        older.set_result(older_fn(*older_args))
+        self.assertEqual(self.image_url(food_item_id), expected)
+
+class ProcessPoolImagePipelineTestCase(ImagePipelineTestCase):
+
+    class config(TestConfig):
+        IMAGE_PIPELINE = "process"
+        IMAGE_WORKERS = 1
+
+    def image_url(self, food_item_id):
+        # Wait for the worker and the completion callback.
+        self.app.extensions["image_pipeline"].shutdown()
+        return super().image_url(food_item_id)
+
+    @unittest.skip("the second upload is submitted before the first one's variants exist")
+    def test_identical_upload_reuses_existing_variants(self):
+        pass
+
+    @unittest.skip("the catalog is rendered before the worker sets image_url")
+    def test_catalog_renders_srcset(self):
+        pass
+
+if __name__ == "__main__":
+    unittest.main()
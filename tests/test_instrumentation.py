@@ -0,0 +1,80 @@
+import unittest
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+
+class InstrumentedConfig(TestConfig):
+    INSTRUMENTATION_SAMPLE_RATE = 1.0
+    INSTRUMENTATION_SLOW_QUERY_MS = 0
+    METRICS_TOKEN = "scrape-token"
+
+class InstrumentationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(InstrumentedConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            admin = User(name="Admin", email="admin@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="admin")
+            customer = User(name="John Doe", email="john@example.com", phone_number="2222222222", location="Sylhet", password="hashed_password", role="customer")
+            db.session.add_all([admin, customer])
+            db.session.commit()
+            self.admin_id, self.customer_id = admin.id, customer.id
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+            sess["_fresh"] = True
+
+    def test_sampled_request_reports_sql_and_template_time(self):
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response.headers)
+
+        self.login(self.customer_id)
+        self.assertNotIn("Server-Timing", self.client.get("/about").headers)
+
+        self.login(self.admin_id)
+        timing = self.client.get("/about").headers["Server-Timing"]
+        self.assertIn("total;dur=", timing)
+        self.assertIn("sql;dur=", timing)
+        self.assertIn("template;dur=", timing)
+        snapshot = self.client.get("/admin/instrumentation").get_json()
+        home = snapshot["routes"]["main.home"]
+        self.assertEqual(home["requests"], 1)
+        self.assertGreater(home["sql_statements"], 0)
+        self.assertIn("template", home["sections"])
+        self.assertTrue(any(sample["route"] == "main.home" for sample in snapshot["slow_queries"]))
+
+    def test_admin_endpoint_is_admin_only(self):
+        self.login(self.customer_id)
+        self.assertEqual(self.client.get("/admin/instrumentation").status_code, 403)
+
+    def test_metrics_require_token(self):
+        self.client.get("/")
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code, 404)
+        response = self.client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+        self.assertEqual(response.status_code, 200)
+        text = response.get_data(as_text=True)
+        self.assertIn('app_request_duration_seconds_count{route="main.home"} 1', text)
+        self.assertIn('app_request_duration_seconds_bucket{route="main.home",le="+Inf"} 1', text)
+        self.assertIn('app_sql_statements_total{route="main.home"}', text)
+
+    def test_disabled_by_default(self):
+        app = create_app(TestConfig)
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+        response = client.get("/")
+        self.assertNotIn("Server-Timing", response.headers)
+        self.assertEqual(client.get("/metrics").status_code, 404)
+        self.assertNotIn("instrumentation", app.extensions)
+
+if __name__ == "__main__":
+    unittest.main()
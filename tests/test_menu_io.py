@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import tempfile
+import unittest
+import zipfile
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.dashboard_stats import DashboardStats, COUNTERS
+from app.models.stored_image import StoredImage
+from app.utils.search import search_food_items
+from app.utils.query_guard import count_statements
+from tests.test_images import make_image
+
+class MenuImportExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class MenuConfig(TestConfig):
+            IMAGE_UPLOAD_DIR = self.tmpdir.name
+
+        self.app = create_app(MenuConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+            other = User(name="Spice Route", email="spice@example.com", phone_number="2222222222", location="Dhaka", password="hashed_password", role="restaurant")
+            db.session.add_all([restaurant, other])
+            db.session.commit()
+            db.session.add(FoodItem(name="Pizza", price=Decimal("12.00"), restaurant_id=restaurant.id, category="Mains"))
+            db.session.add(FoodItem(name="Pizza", price=Decimal("9.00"), restaurant_id=other.id, category="Mains"))
+            db.session.commit()
+            DashboardStats.rebuild()
+            self.restaurant_id, self.other_id = restaurant.id, other.id
+            self.engine = db.engine
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.restaurant_id)
+
+    def tearDown(self):
+        self.app.extensions["image_pipeline"].shutdown()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+        self.tmpdir.cleanup()
+
+    def upload(self, menu, filename="menu.csv", images=None):
+        data = {"menu": (io.BytesIO(menu.encode() if isinstance(menu, str) else menu), filename)}
+        if images is not None:
+            data["images"] = (io.BytesIO(images), "photos.zip")
+        return self.client.post("/restaurant/menu/import", data=data, content_type="multipart/form-data")
+
+    def menu(self, restaurant_id=None):
+        with self.app.app_context():
+            items = FoodItem.query.filter_by(restaurant_id=restaurant_id or self.restaurant_id).order_by(FoodItem.id)
+            return [(item.name, item.description, item.price, item.category, item.image_url) for item in items]
+
+    def assert_stats_consistent(self):
+        with self.app.app_context():
+            stats = db.session.get(DashboardStats, DashboardStats.ROW_ID)
+            incremental = {key: getattr(stats, key) for key in COUNTERS}
+            rebuilt = DashboardStats.rebuild()
+            self.assertEqual(incremental, {key: getattr(rebuilt, key) for key in COUNTERS})
+
+    def test_csv_import_upserts_by_name(self):
+        menu = ("name,description,price,category,image\n"
+                "Pizza,Wood fired,13.5,Mains,\n"
+                "Tiramisu,,6,Desserts,\n"
+                "Garlic Bread,Crispy,4.25,Sides,\n")
+        response = self.upload(menu)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.menu(), [
+            ("Pizza", "Wood fired", Decimal("13.50"), "Mains", None),
+            ("Tiramisu", None, Decimal("6.00"), "Desserts", None),
+            ("Garlic Bread", "Crispy", Decimal("4.25"), "Sides", None),
+        ])
+        self.assertEqual(self.menu(self.other_id), [("Pizza", None, Decimal("9.00"), "Mains", None)])
+        self.assert_stats_consistent()
+        with self.app.app_context():
+            self.assertEqual(len(search_food_items("tiramisu")), 1)
+            self.assertEqual(len(search_food_items("crispy")), 1)
+
+    def test_invalid_rows_reject_the_whole_file(self):
+        menu = [{"name": "Tiramisu", "price": 6, "category": "Desserts"},
+                {"name": "X", "price": "free", "category": "Sides"},
+                {"name": "Tiramisu", "price": 7, "category": "Desserts"},
+                {"name": "Cannoli", "price": 5, "category": "Desserts", "image": "cannoli.gif"}]
+        response = self.upload(json.dumps(menu), "menu.json")
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        self.assertIn("Row 2: name: Field must be between 2 and 100 characters long.", body)
+        self.assertIn("Row 3: name: Tiramisu appears more than once", body)
+        self.assertIn("Row 4: image: jpg and png only", body)
+        self.assertEqual([item[0] for item in self.menu()], ["Pizza"])
+        self.assert_stats_consistent()
+
+    def test_photos_from_archive_are_queued(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as photos:
+            photos.writestr("photos/tiramisu.jpg", make_image().getvalue())
+        menu = '{"name": "Tiramisu", "price": "6.00", "category": "Desserts", "image": "tiramisu.jpg"}\n'
+        with count_statements(self.engine) as statements:
+            response = self.upload(menu, "menu.jsonl", images=archive.getvalue())
+        self.assertEqual(response.status_code, 302)
+        # The import's 7 statements, then the sync pipeline's 3 for the photo
+        # (load the item, set its image, count the reference).
+        self.assertEqual(len(statements), 10)
+        image_url = self.menu()[-1][-1]
+        self.assertRegex(image_url, r"^[0-9a-f]{20}-300\.jpg$")
+        with self.app.app_context():
+            self.assertEqual(db.session.get(StoredImage, image_url[:20]).ref_count, 1)
+
+        response = self.upload('{"name": "Cannoli", "price": 5, "category": "Desserts", "image": "cannoli.jpg"}\n', "menu.jsonl")
+        self.assertIn("Row 1: image: cannoli.jpg is not in the image archive", response.get_data(as_text=True))
+
+    def test_export_round_trips(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as photos:
+            photos.writestr("tiramisu.png", make_image(mode="RGBA", format="PNG", color=(0, 0, 0, 0)).getvalue())
+        self.upload("name,description,price,category,image\nTiramisu,\"Coffee, cream\",6,Desserts,tiramisu.png\n",
+                    images=archive.getvalue())
+        before = self.menu()
+
+        response = self.client.get("/restaurant/menu/export?format=csv")
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual([(row["name"], row["price"], row["description"]) for row in rows],
+                         [("Tiramisu", "6.00", "Coffee, cream"), ("Pizza", "12.00", "")])
+        response = self.upload(response.data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.menu(), before)
+
+        bundle = self.client.get("/restaurant/menu/export?format=zip").data
+        with zipfile.ZipFile(io.BytesIO(bundle)) as exported:
+            self.assertEqual(sorted(exported.namelist()), sorted(["menu.csv", before[-1][-1]]))
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.other_id)
+        self.assertEqual(self.upload(bundle, "menu-export.zip").status_code, 302)
+        self.assertEqual([(item[0], item[2], item[4]) for item in self.menu(self.other_id)],
+                         [("Pizza", Decimal("12.00"), None), ("Tiramisu", Decimal("6.00"), before[-1][-1])])
+        with self.app.app_context():
+            self.assertEqual(db.session.get(StoredImage, before[-1][-1][:20]).ref_count, 2)
+        self.assert_stats_consistent()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import unittest
+from decimal import Decimal
+from sqlalchemy import inspect, text
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.stored_image import StoredImage
+from app.utils import migrations
+
+class MigrationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def index_names(self, table):
+        return {index["name"] for index in inspect(db.engine).get_indexes(table)}
+
+    def test_fresh_database_is_stamped(self):
+        self.assertEqual(migrations.init_db(), [])
+        with db.engine.connect() as connection:
+            self.assertEqual(migrations.current_version(connection), migrations.MIGRATIONS[-1][0])
+        self.assertIn("ix_orders_restaurant_status_date", self.index_names("orders"))
+
+    def test_upgrade_adds_access_path_indexes_once(self):
+        db.create_all()
+        with db.engine.begin() as connection:
+            for name, table, _ in migrations.ACCESS_PATH_INDEXES:
+                migrations.drop_index(connection, name, table)
+        self.assertNotIn("ix_payments_order_id", self.index_names("payments"))
+
+        applied = migrations.init_db()
+        self.assertIn(1, [version for version, _ in applied])
+        self.assertIn("ix_payments_order_id", self.index_names("payments"))
+        self.assertIn("ix_orders_customer_date", self.index_names("orders"))
+        self.assertEqual(migrations.upgrade(), [])
+
+    def test_restaurant_orders_use_the_restaurant_date_index(self):
+        db.create_all()
+        migrations.stamp()
+        with db.engine.begin() as connection:
+            migrations.drop_index(connection, "ix_orders_restaurant_date", "orders")
+            connection.execute(text("DELETE FROM schema_migrations WHERE version >= 11"))
+        migrations.upgrade()
+        plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM orders WHERE restaurant_id = 1 ORDER BY order_date DESC")).fetchall()
+        self.assertEqual([row[-1] for row in plan], ["SEARCH orders USING INDEX ix_orders_restaurant_date (restaurant_id=?)"])
+
+    def test_stored_images_backfilled_from_food_items(self):
+        db.create_all()
+        restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        db.session.add(restaurant)
+        db.session.commit()
+        for image_url in ["0123456789abcdef0123-300.jpg", "0123456789abcdef0123-300.jpg", "biryani.jpg"]:
+            db.session.add(FoodItem(name="Dish", price=Decimal("5.00"), restaurant_id=restaurant.id, category="Main", image_url=image_url))
+        db.session.commit()
+        migrations.stamp()
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP TABLE stored_images"))
+            connection.execute(text("DELETE FROM schema_migrations WHERE version >= 3"))
+        migrations.upgrade()
+        self.assertEqual([(row.digest, row.ref_count) for row in StoredImage.query.all()], [("0123456789abcdef0123", 2)])
+
+    def test_search_index_built_for_existing_catalog(self):
+        from app.utils.search import search_food_items
+        db.create_all()
+        restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        db.session.add(restaurant)
+        db.session.commit()
+        db.session.add(FoodItem(name="Margherita Pizza", price=Decimal("5.00"), restaurant_id=restaurant.id, category="Pizza"))
+        db.session.commit()
+        migrations.stamp()
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP TABLE food_search_terms"))
+            connection.execute(text("DROP TABLE food_search"))
+            connection.execute(text("DELETE FROM schema_migrations WHERE version >= 4"))
+        migrations.upgrade()
+        self.assertEqual(len(search_food_items("margherita")), 1)
+
+    def test_orders_get_a_version_column(self):
+        db.create_all()
+        migrations.stamp()
+        with db.engine.begin() as connection:
+            migrations.drop_columns(connection, "orders", ["version"])
+            connection.execute(text("DELETE FROM schema_migrations WHERE version >= 5"))
+        with db.engine.connect() as connection:
+            self.assertNotIn("version", migrations.column_names(connection, "orders"))
+        migrations.upgrade()
+        with db.engine.connect() as connection:
+            self.assertIn("version", migrations.column_names(connection, "orders"))
+
+    def test_order_events_backfilled_from_orders_and_payments(self):
+        from app.models.order import Order
+        from app.models.payment import Payment
+        from app.models.order_event import OrderEvent
+        from app.models.order_projection import DailyRevenue, RestaurantQueue
+        db.create_all()
+        restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        customer = User(name="John Doe", email="john@example.com", phone_number="3333333333", location="Sylhet", password="hashed_password", role="customer")
+        db.session.add_all([restaurant, customer])
+        db.session.commit()
+        for txn, status, payment_status in [("TXN1", "accepted", "verified"), ("TXN2", "pending", "pending")]:
+            order = Order(customer_id=customer.id, restaurant_id=restaurant.id, total_price=Decimal("10.00"), status=status)
+            order.payment = Payment(order=order, customer_id=customer.id, restaurant_id=restaurant.id, bkash_transaction_id=txn,
+                                    payment_phone_number="3333333333", amount=Decimal("10.00"), payment_status=payment_status)
+            db.session.add(order)
+        db.session.commit()
+        migrations.stamp()
+        with db.engine.begin() as connection:
+            for table in ("order_events", "projection_checkpoints", "restaurant_queues", "daily_revenue", "ready_times"):
+                connection.execute(text(f"DROP TABLE {table}"))
+            connection.execute(text("DELETE FROM schema_migrations WHERE version >= 6"))
+        migrations.upgrade()
+        self.assertEqual(OrderEvent.query.count(), 4)
+        self.assertEqual(RestaurantQueue.counts(restaurant.id), {restaurant.id: {"accepted": 1, "pending": 1}})
+        self.assertEqual(DailyRevenue.recent()[0].verified_revenue, Decimal("10.00"))
+
+    def test_payment_references_backfilled(self):
+        from app.models.order import Order
+        from app.models.payment import Payment
+        db.create_all()
+        restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        customer = User(name="John Doe", email="john@example.com", phone_number="3333333333", location="Sylhet", password="hashed_password", role="customer")
+        db.session.add_all([restaurant, customer])
+        db.session.commit()
+        for txn in ("TXN1", f"TXN2_{restaurant.id}"):
+            order = Order(customer_id=customer.id, restaurant_id=restaurant.id, total_price=Decimal("10.00"))
+            order.payment = Payment(order=order, customer_id=customer.id, restaurant_id=restaurant.id, bkash_transaction_id=txn,
+                                    payment_phone_number="3333333333", amount=Decimal("10.00"))
+            db.session.add(order)
+        db.session.commit()
+        migrations.stamp()
+        with db.engine.begin() as connection:
+            migrations.drop_columns(connection, "payments", ["bkash_reference"])
+            connection.execute(text("DELETE FROM schema_migrations WHERE version >= 8"))
+        migrations.upgrade()
+        db.session.expire_all()
+        self.assertEqual(sorted(payment.bkash_reference for payment in Payment.query), ["TXN1", "TXN2"])
+        self.assertIn("ix_payments_bkash_reference", self.index_names("payments"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@ from app import create_app, db
 from app.models.user import User
 from app.models.food_item import FoodItem
 from app.models.order import Order
+from app.models.order_line import OrderLine
 from app.models.payment import Payment
 from decimal import Decimal
 
@@ -52,10 +53,12 @@ class ModelTestCase(unittest.TestCase):
             db.session.add(food_item)
             db.session.commit()
 
-            order = Order(customer_id=customer.id, food_item_id=food_item.id, restaurant_id=restaurant.id, quantity=2, total_price=Decimal("21.98"))
+            line = OrderLine(food_item_id=food_item.id, quantity=2, unit_price=Decimal("10.99"), line_total=Decimal("21.98"))
+            order = Order(customer_id=customer.id, restaurant_id=restaurant.id, total_price=Decimal("21.98"), lines=[line])
             db.session.add(order)
             db.session.commit()
-            self.assertEqual(order.quantity, 2)
+            self.assertEqual(order.item_count, 2)
+            self.assertEqual(order.lines[0].order_id, order.id)
             self.assertEqual(order.total_price, Decimal("21.98"))
 
     def test_payment_model(self):
@@ -70,7 +73,7 @@ class ModelTestCase(unittest.TestCase):
             db.session.add(food_item)
             db.session.commit()
 
-            order = Order(customer_id=customer.id, food_item_id=food_item.id, restaurant_id=restaurant.id, quantity=2, total_price=Decimal("21.98"))
+            order = Order(customer_id=customer.id, restaurant_id=restaurant.id, total_price=Decimal("21.98"), lines=[OrderLine(food_item_id=food_item.id, quantity=2, unit_price=Decimal("10.99"), line_total=Decimal("21.98"))])
             db.session.add(order)
             db.session.commit()
 
@@ -0,0 +1,134 @@
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from app import db
+from app.models.order import Order
+from app.models.payment import Payment
+from app.models.order_event import OrderEvent, order_event, record_order_events
+from app.models.order_projection import PROJECTIONS, DailyRevenue, ReadyTime, RestaurantQueue
+from app.utils.order_reports import catch_up_projections, rebuild_projections
+from tests.base import AppTestCase
+
+class OrderEventTestCase(AppTestCase):
+
+    def place_order(self, txn, total="10.00", order_date=None):
+        with self.app.app_context():
+            order = Order(customer_id=self.customer_id, restaurant_id=self.restaurant_id, total_price=Decimal(total), order_date=order_date)
+            order.payment = Payment(order=order, customer_id=self.customer_id, restaurant_id=self.restaurant_id, bkash_transaction_id=txn,
+                                    payment_phone_number="3333333333", amount=Decimal(total))
+            db.session.add(order)
+            db.session.commit()
+            return order.id, order.payment.id
+
+    def history(self, order_id):
+        with self.app.app_context():
+            events = OrderEvent.query.filter_by(order_id=order_id).order_by(OrderEvent.id)
+            return [(event.kind, event.from_status, event.to_status) for event in events]
+
+    def projections(self):
+        with self.app.app_context():
+            # A replay leaves out rows that were folded back to zero.
+            return {model.__tablename__: sorted(tuple(row) for row in db.session.execute(model.__table__.select())
+                                                if any(row[len(model.KEY):]))
+                    for model in PROJECTIONS}
+
+    def test_each_change_is_appended_with_its_transition(self):
+        order_id, payment_id = self.place_order("TXN1", order_date=datetime.utcnow() - timedelta(minutes=30))
+        client = self.client_for(self.restaurant_id)
+        client.post(f"/restaurant/verify_payment/{payment_id}")
+        with self.app.app_context():
+            version = db.session.get(Order, order_id).version
+        client.post(f"/restaurant/update_order_status/{order_id}/preparing", data={"version": version})
+        client.post(f"/restaurant/update_order_status/{order_id}/ready", data={"version": version + 1})
+        self.assertEqual(self.history(order_id), [
+            ("placed", None, "pending"), ("payment", None, "pending"),
+            ("status", "pending", "accepted"), ("payment", "pending", "verified"),
+            ("status", "accepted", "preparing"), ("status", "preparing", "ready"),
+        ])
+        with self.app.app_context():
+            catch_up_projections()
+            self.assertEqual(RestaurantQueue.counts(self.restaurant_id), {self.restaurant_id: {"ready": 1}})
+            self.assertAlmostEqual(ReadyTime.averages()[self.restaurant_id].total_seconds(), 1800, delta=60)
+            today = DailyRevenue.recent()[0]
+            self.assertEqual((today.orders_placed, today.order_value, today.verified_revenue), (1, Decimal("10.00"), Decimal("10.00")))
+
+    def test_rolled_back_changes_leave_no_events(self):
+        order_id, _ = self.place_order("TXN1")
+        with self.app.app_context():
+            db.session.get(Order, order_id).status = "cancelled"
+            db.session.flush()
+            db.session.rollback()
+        self.assertEqual(self.history(order_id), [("placed", None, "pending"), ("payment", None, "pending")])
+        with self.app.app_context():
+            catch_up_projections()
+            self.assertEqual(RestaurantQueue.counts(), {self.restaurant_id: {"pending": 1}})
+
+    def test_bulk_updates_and_deletes_are_logged(self):
+        first, first_payment = self.place_order("TXN1")
+        second, second_payment = self.place_order("TXN2", total="5.00")
+        response = self.client_for(self.admin_id).post("/admin/bulk_payments", json={"action": "verify", "payment_ids": [first_payment, second_payment]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.history(second)[-2:], [("status", "pending", "accepted"), ("payment", "pending", "verified")])
+        admin = self.client_for(self.admin_id)
+        admin.post(f"/admin/delete_order/{first}")
+        admin.post("/admin/confirm_delete_order")
+        self.assertEqual(self.history(first)[-1], ("deleted", "accepted", None))
+        with self.app.app_context():
+            catch_up_projections()
+            self.assertEqual(RestaurantQueue.counts(), {self.restaurant_id: {"accepted": 1}})
+            self.assertEqual(DailyRevenue.recent()[0].verified_revenue, Decimal("15.00"))
+
+    def test_projections_catch_up_in_batches_and_rebuild_by_replay(self):
+        for i in range(5):
+            _, payment_id = self.place_order(f"TXN{i}")
+            self.client_for(self.restaurant_id).post(f"/restaurant/update_payment_status/{payment_id}",
+                                                     data={"new_status": "failed" if i % 2 else "verified"})
+        with self.app.app_context():
+            last_id = OrderEvent.query.count()
+            self.assertEqual(catch_up_projections(batch_size=3), last_id)
+            self.assertEqual(catch_up_projections(batch_size=3), last_id)
+        live = self.projections()
+        self.assertEqual(live["restaurant_queues"], [(self.restaurant_id, "accepted", 3), (self.restaurant_id, "pending", 2)])
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                for model in PROJECTIONS:
+                    connection.execute(model.__table__.delete())
+            self.assertEqual(rebuild_projections(batch_size=3), last_id)
+        self.assertEqual(self.projections(), live)
+
+    def test_catch_up_waits_for_events_committed_out_of_order(self):
+        self.place_order("TXN1")
+        now = datetime.utcnow()
+
+        def append(event_id, order_id, occurred_at=now):
+            event = order_event("placed", order_id, self.customer_id, self.restaurant_id, to_status="pending",
+                                amount=Decimal("5.00"), placed_at=occurred_at, occurred_at=occurred_at)
+            with db.engine.begin() as connection:
+                record_order_events(connection, [dict(event, id=event_id)])
+
+        with self.app.app_context():
+            self.assertEqual(catch_up_projections(), 2)
+            # Another writer was given #3 but commits after #4 is visible.
+            append(4, 101)
+            self.assertEqual(catch_up_projections(), 2)
+            append(3, 100)
+            self.assertEqual(catch_up_projections(), 4)
+            self.assertEqual(RestaurantQueue.counts(), {self.restaurant_id: {"pending": 3}})
+            # A gap left by a rolled-back insert is stepped over once it is old.
+            append(6, 102, occurred_at=now - timedelta(minutes=5))
+            self.assertEqual(catch_up_projections(), 6)
+            self.assertEqual(rebuild_projections(), 6)
+            self.assertEqual(RestaurantQueue.counts(), {self.restaurant_id: {"pending": 4}})
+
+    def test_report_pages(self):
+        _, payment_id = self.place_order("TXN1", total="12.50")
+        self.client_for(self.restaurant_id).post(f"/restaurant/verify_payment/{payment_id}")
+        for user_id, url in [(self.admin_id, "/admin/reports"), (self.restaurant_id, "/restaurant/reports")]:
+            response = self.client_for(user_id).get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"Taste of Italy", response.data)
+            self.assertIn(b"$12.50", response.data)
+        self.assertEqual(self.client_for(self.customer_id).get("/admin/reports").status_code, 403)
+
+if __name__ == "__main__":
+    unittest.main()
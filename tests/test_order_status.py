@@ -0,0 +1,118 @@
+import os
+import tempfile
+import threading
+import unittest
+from decimal import Decimal
+from sqlalchemy import update
+from config import TestConfig
+from app import db
+from app.models.order import Order, OrderConflict, InvalidTransition
+from app.models.payment import Payment
+from app.utils.order_status import change_order_status
+from tests.base import AppTestCase
+
+class OrderStatusTestCase(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.app.app_context():
+            order = Order(customer_id=self.customer_id, restaurant_id=self.restaurant_id, total_price=Decimal("10.00"), status="pending")
+            order.payment = Payment(order=order, customer_id=self.customer_id, restaurant_id=self.restaurant_id, bkash_transaction_id="TXN1", payment_phone_number="3333333333", amount=Decimal("10.00"))
+            db.session.add(order)
+            db.session.commit()
+            self.order_id, self.payment_id = order.id, order.payment.id
+
+    def order(self):
+        with self.app.app_context():
+            order = db.session.get(Order, self.order_id)
+            return order.status, order.version
+
+class OrderTransitionTestCase(OrderStatusTestCase):
+
+    def test_only_listed_transitions_are_allowed(self):
+        client = self.client_for(self.restaurant_id)
+        status, version = self.order()
+        client.post(f"/restaurant/update_order_status/{self.order_id}/delivered", data={"version": version})
+        self.assertEqual(self.order(), (status, version))
+        client.post(f"/restaurant/update_order_status/{self.order_id}/accepted", data={"version": version})
+        self.assertEqual(self.order(), ("accepted", version + 1))
+        self.client_for(self.admin_id).post(f"/admin/update_order_status/{self.order_id}", data={"new_status": "pending"})
+        self.assertEqual(self.order()[0], "accepted")
+
+    def test_stale_page_is_rejected(self):
+        _, version = self.order()
+        self.client_for(self.admin_id).post(f"/admin/update_order_status/{self.order_id}", data={"new_status": "accepted", "version": version})
+        response = self.client_for(self.restaurant_id).post(
+            f"/restaurant/update_order_status/{self.order_id}/cancelled", data={"version": version}, follow_redirects=True)
+        self.assertIn(b"was changed by someone else", response.data)
+        self.assertEqual(self.order(), ("accepted", version + 1))
+
+    def test_lost_compare_and_set_raises_conflict(self):
+        with self.app.app_context():
+            order = db.session.get(Order, self.order_id)
+            with db.engine.begin() as connection:
+                connection.execute(update(Order.__table__).where(Order.__table__.c.id == self.order_id)
+                                   .values(status="cancelled", version=Order.__table__.c.version + 1))
+            with self.assertRaises(OrderConflict):
+                change_order_status(order, "accepted")
+        self.assertEqual(self.order()[0], "cancelled")
+
+    def test_verifying_payment_of_cancelled_order_keeps_it_cancelled(self):
+        with self.app.app_context():
+            change_order_status(db.session.get(Order, self.order_id), "cancelled")
+            with self.assertRaises(InvalidTransition):
+                db.session.get(Order, self.order_id).transition_to("accepted")
+        self.client_for(self.admin_id).post(f"/admin/verify_payment/{self.payment_id}")
+        self.assertEqual(self.order()[0], "cancelled")
+
+class ConcurrentTransitionTestCase(OrderStatusTestCase):
+
+    # Threads need their own connections, so this runs against a file.
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class FileConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(self.tmpdir.name, "orders.db")
+            SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30}}
+
+        self.config = FileConfig
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_one_writer_wins_when_many_race(self):
+        workers = 12  # below the pool limit, so every thread can hold a connection
+        _, start_version = self.order()
+        barrier = threading.Barrier(workers, timeout=30)
+        outcomes = []
+
+        def act(status):
+            with self.app.app_context():
+                order = db.session.get(Order, self.order_id)
+                barrier.wait()
+                try:
+                    change_order_status(order, status)
+                    outcomes.append("won")
+                except OrderConflict:
+                    outcomes.append("conflict")
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=act, args=("accepted" if i % 2 else "cancelled",)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count("won"), 1)
+        self.assertEqual(outcomes.count("conflict"), workers - 1)
+        status, version = self.order()
+        self.assertIn(status, ("accepted", "cancelled"))
+        self.assertEqual(version, start_version + 1)
+
+if __name__ == "__main__":
+    unittest.main()
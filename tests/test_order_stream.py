@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import db
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+from app.utils.order_stream import MemoryBroker, SqliteBroker
+from tests.base import AppTestCase
+
+class BrokerContract:
+
+    def test_events_reach_only_their_recipients(self):
+        start = self.broker.latest_id()
+        self.broker.publish((1, 2), "order.status", {"order_id": 7, "status": "accepted"})
+        self.broker.publish((2,), "order.created", {"order_id": 8})
+        events = self.broker.listen(2, start, 1)
+        self.assertEqual([(name, data["order_id"]) for _, name, data in events], [("order.status", 7), ("order.created", 8)])
+        self.assertEqual(len(self.broker.listen(1, start, 1)), 1)
+        self.assertEqual(self.broker.listen(2, events[-1][0], 0.05), [])
+        self.assertEqual(self.broker.latest_id(), events[-1][0])
+
+class MemoryBrokerTestCase(BrokerContract, unittest.TestCase):
+
+    def setUp(self):
+        self.broker = MemoryBroker()
+
+    def test_backlog_is_bounded(self):
+        broker = MemoryBroker(backlog=2)
+        start = broker.latest_id()
+        for order_id in range(3):
+            broker.publish((1,), "order.created", {"order_id": order_id})
+        self.assertEqual([data["order_id"] for _, _, data in broker.listen(1, start, 0)], [1, 2])
+
+class SqliteBrokerTestCase(BrokerContract, unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.broker = SqliteBroker(os.path.join(self.tmpdir.name, "stream.db"), poll_interval=0.01)
+
+    def tearDown(self):
+        self.broker.db.close()
+        self.tmpdir.cleanup()
+
+class OrderStreamTestCase(AppTestCase):
+
+    class config(TestConfig):
+        STREAM_HEARTBEAT = 0.05
+        STREAM_MAX_DURATION = 0.2
+
+    def setUp(self):
+        super().setUp()
+        self.broker = self.app.extensions["order_broker"]
+        with self.app.app_context():
+            pizza = FoodItem(name="Pizza", price=Decimal("10.00"), restaurant_id=self.restaurant_id, category="Pizza")
+            db.session.add(pizza)
+            db.session.commit()
+            self.pizza_id = pizza.id
+        self.start = self.broker.latest_id()
+
+    def place_order(self, txn="TXN1"):
+        with self.app.app_context():
+            line = OrderLine(food_item_id=self.pizza_id, quantity=1, unit_price=Decimal("10.00"), line_total=Decimal("10.00"))
+            order = Order(customer_id=self.customer_id, restaurant_id=self.restaurant_id, total_price=Decimal("10.00"), lines=[line])
+            order.payment = Payment(order=order, customer_id=self.customer_id, restaurant_id=self.restaurant_id, bkash_transaction_id=txn, payment_phone_number="3333333333", amount=Decimal("10.00"))
+            db.session.add(order)
+            db.session.commit()
+            return order.id, order.payment.id
+
+    def events(self, user_id):
+        return [(name, data) for _, name, data in self.broker.listen(user_id, self.start, 0)]
+
+    def test_new_order_is_pushed_to_the_restaurant(self):
+        order_id, _ = self.place_order()
+        self.assertEqual([(name, data["order_id"]) for name, data in self.events(self.restaurant_id)], [("order.created", order_id)])
+        self.assertEqual(self.events(self.customer_id), [])
+
+    def test_status_and_payment_changes_reach_both_parties(self):
+        order_id, payment_id = self.place_order()
+        self.start = self.broker.latest_id()
+        response = self.client_for(self.restaurant_id).post(f"/restaurant/verify_payment/{payment_id}")
+        self.assertEqual(response.status_code, 302)
+        expected = [
+            ("order.status", {"order_id": order_id, "status": "accepted"}),
+            ("payment.status", {"order_id": order_id, "payment_id": payment_id, "payment_status": "verified"}),
+        ]
+        self.assertEqual(sorted(self.events(self.customer_id)), expected)
+        self.assertEqual(sorted(self.events(self.restaurant_id)), expected)
+
+    def test_bulk_updates_are_pushed(self):
+        order_id, payment_id = self.place_order()
+        self.start = self.broker.latest_id()
+        response = self.client_for(self.admin_id).post("/admin/bulk_payments", json={"action": "reject", "payment_ids": [payment_id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(name for name, _ in self.events(self.customer_id)), ["order.status", "payment.status"])
+
+    def test_rolled_back_changes_are_not_pushed(self):
+        order_id, _ = self.place_order()
+        self.start = self.broker.latest_id()
+        with self.app.app_context():
+            db.session.get(Order, order_id).status = "cancelled"
+            db.session.flush()
+            db.session.rollback()
+        self.assertEqual(self.events(self.customer_id), [])
+
+    def test_stream_resumes_from_last_event_id(self):
+        order_id, _ = self.place_order()
+        response = self.client_for(self.restaurant_id).get("/stream/orders", headers={"Last-Event-ID": str(self.start)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        body = response.get_data(as_text=True)
+        self.assertIn("event: order.created", body)
+        self.assertIn(f'"order_id":{order_id}', body)
+        # Without Last-Event-ID the stream starts from now.
+        body = self.client_for(self.restaurant_id).get("/stream/orders").get_data(as_text=True)
+        self.assertNotIn("event:", body)
+        self.assertIn(": keep-alive", body)
+
+if __name__ == "__main__":
+    unittest.main()
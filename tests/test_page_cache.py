@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.utils.query_guard import count_statements
+from app.utils.page_cache import CATALOG_TAG, SqlitePageCache, cached_fragment, cached_page, invalidate_pages
+
+class PageCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+            customer = User(name="John Doe", email="john@example.com", phone_number="2222222222", location="Sylhet", password="hashed_password", role="customer")
+            db.session.add_all([restaurant, customer])
+            db.session.flush()
+            db.session.add(FoodItem(name="Pizza", price=Decimal("12.00"), restaurant_id=restaurant.id, category="Mains", image_url="pizza.jpg"))
+            db.session.commit()
+            self.restaurant_id, self.customer_id = restaurant.id, customer.id
+            self.engine = db.engine
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_anonymous_pages_are_served_without_queries(self):
+        for url in ("/", "/about", "/customer/browse?category=Mains"):
+            first = self.client.get(url)
+            self.assertEqual(first.headers["X-Page-Cache"], "miss", url)
+            with count_statements(self.engine) as statements:
+                second = self.client.get(url)
+            self.assertEqual(second.headers["X-Page-Cache"], "hit", url)
+            self.assertEqual(second.data, first.data)
+            self.assertEqual(statements, [], url)
+
+    def test_etag_revalidation(self):
+        etag = self.client.get("/customer/browse").headers["ETag"]
+        response = self.client.get("/customer/browse", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(self.client.get("/customer/browse", headers={"If-None-Match": '"stale"'}).status_code, 200)
+
+    def test_catalog_changes_invalidate_pages(self):
+        self.client.get("/customer/browse")
+        with self.app.app_context():
+            db.session.add(FoodItem(name="Lasagna", price=Decimal("14.00"), restaurant_id=self.restaurant_id, category="Pasta", image_url="lasagna.jpg"))
+            db.session.commit()
+        response = self.client.get("/customer/browse")
+        self.assertEqual(response.headers["X-Page-Cache"], "miss")
+        self.assertIn(b"Lasagna", response.data)
+        self.assertIn(b'<option value="Pasta"', response.data)
+
+        with self.app.app_context():
+            db.session.get(User, self.restaurant_id).name = "Taste of Rome"
+            db.session.commit()
+        self.assertIn(b"Taste of Rome", self.client.get("/customer/browse").data)
+        # An unrelated change keeps the pages.
+        with self.app.app_context():
+            db.session.get(User, self.customer_id).location = "Dhaka"
+            db.session.commit()
+        self.assertEqual(self.client.get("/customer/browse").headers["X-Page-Cache"], "hit")
+
+    def test_page_rendered_across_an_invalidation_is_not_served(self):
+        renders = []
+
+        @cached_page(CATALOG_TAG)
+        def racing_view():
+            # A catalog commit lands while this page is being built.
+            renders.append(len(renders))
+            invalidate_pages(CATALOG_TAG)
+            return f"render {len(renders)}"
+
+        self.app.add_url_rule("/racing", view_func=racing_view)
+        self.assertEqual(self.client.get("/racing").data, b"render 1")
+        response = self.client.get("/racing")
+        self.assertEqual(response.headers["X-Page-Cache"], "miss")
+        self.assertEqual(response.data, b"render 2")
+
+        with self.app.test_request_context():
+            compute = lambda: invalidate_pages(CATALOG_TAG) or len(renders)
+            cached_fragment("racing", (CATALOG_TAG,), compute)
+            renders.append(None)
+            self.assertEqual(cached_fragment("racing", (CATALOG_TAG,), compute), 3)
+
+    def test_signed_in_and_flashed_visitors_are_not_cached(self):
+        with self.client.session_transaction() as sess:
+            sess["_flashes"] = [("info", "Welcome back")]
+        response = self.client.get("/")
+        self.assertNotIn("X-Page-Cache", response.headers)
+        self.assertIn(b"Welcome back", response.data)
+        self.assertEqual(self.client.get("/").headers["X-Page-Cache"], "miss")
+
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.customer_id)
+        response = self.client.get("/")
+        self.assertNotIn("X-Page-Cache", response.headers)
+        self.assertNotIn("ETag", response.headers)
+
+class SqlitePageCacheTestCase(unittest.TestCase):
+
+    def test_invalidation_reaches_other_workers(self):
+        path = os.path.join(tempfile.mkdtemp(), "page_cache.db")
+        first, second = SqlitePageCache(path), SqlitePageCache(path)
+        first.set("page:/", b"<html>", {"etag": "abc"}, first.versions(("catalog",)))
+        self.assertEqual(second.get("page:/"), (b"<html>", {"etag": "abc"}))
+        second.invalidate(("catalog",))
+        self.assertIsNone(first.get("page:/"))
+
+    def test_pages_are_scoped_to_their_database(self):
+        path = os.path.join(tempfile.mkdtemp(), "page_cache.db")
+        first, second = SqlitePageCache(path, scope="a"), SqlitePageCache(path, scope="b")
+        first.set("page:/", b"<html>", {"etag": "abc"}, first.versions(("catalog",)))
+        self.assertIsNone(second.get("page:/"))
+        second.invalidate(("catalog",))
+        second.clear()
+        self.assertEqual(first.get("page:/"), (b"<html>", {"etag": "abc"}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.utils.passwords import hash_password, hash_rounds, password_hasher
+
+class PasswordHasherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add_user(self, hashed):
+        with self.app.app_context():
+            user = User(name="John Doe", email="john@example.com", phone_number="1111111111", location="Sylhet", password=hashed, role="customer")
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+
+    def login(self, password):
+        return self.client.post("/auth/login", data={"email": "john@example.com", "password": password})
+
+    def test_hash_and_verify_use_the_configured_cost(self):
+        with self.app.app_context():
+            hasher = password_hasher()
+            hashed = hasher.hash("secret123")
+            self.assertEqual(hash_rounds(hashed), TestConfig.BCRYPT_LOG_ROUNDS)
+            self.assertTrue(hasher.verify("secret123", hashed))
+            self.assertFalse(hasher.verify("wrong", hashed))
+            self.assertFalse(hasher.verify("secret123", "not a hash"))
+            self.assertFalse(hasher.needs_rehash(hashed))
+
+    def test_login_upgrades_a_hash_with_another_cost(self):
+        old_hash = hash_password("secret123", 5)
+        user_id = self.add_user(old_hash)
+
+        self.assertEqual(self.login("wrong").status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(User, user_id).password, old_hash)
+
+        self.assertEqual(self.login("secret123").status_code, 302)
+        with self.app.app_context():
+            new_hash = db.session.get(User, user_id).password
+            self.assertEqual(hash_rounds(new_hash), TestConfig.BCRYPT_LOG_ROUNDS)
+            self.assertTrue(password_hasher().verify("secret123", new_hash))
+
+    def test_full_queue_answers_503(self):
+        self.add_user(hash_password("secret123", TestConfig.BCRYPT_LOG_ROUNDS))
+        with self.app.app_context():
+            hasher = password_hasher()
+        hasher.queue_timeout = 0.01
+        while hasher._slots.acquire(blocking=False):
+            pass
+        response = self.login("secret123")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+    def test_process_pool(self):
+        class PoolConfig(TestConfig):
+            PASSWORD_HASHER = 'process'
+            PASSWORD_WORKERS = 1
+        app = create_app(PoolConfig)
+        with app.app_context():
+            hasher = password_hasher()
+            try:
+                self.assertTrue(hasher.verify("secret123", hasher.hash("secret123")))
+            finally:
+                hasher.shutdown()
+
+if __name__ == "__main__":
+    unittest.main()
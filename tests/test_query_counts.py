@@ -0,0 +1,96 @@
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.payment import Payment
+from app.utils.query_guard import QueryLimitExceeded, count_statements
+
+class QueryCountTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            admin = User(name="Admin", email="admin@example.com", phone_number="0000000000", location="Dhaka", password="hashed_password", role="admin")
+            restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+            db.session.add_all([admin, restaurant])
+            db.session.commit()
+            food_item = FoodItem(name="Pizza", description="Cheesy", price=Decimal("12.50"), restaurant_id=restaurant.id, category="Pizza")
+            db.session.add(food_item)
+            db.session.commit()
+            self.ids = {"admin": admin.id, "restaurant": restaurant.id, "food_item": food_item.id}
+            self.customer_count = 0
+            self.add_orders(2)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def add_orders(self, count):
+        with self.app.app_context():
+            for _ in range(count):
+                self.customer_count += 1
+                n = self.customer_count
+                customer = User(name=f"Customer {n}", email=f"customer{n}@example.com", phone_number=f"01{n:09d}", location="Sylhet", password="hashed_password", role="customer")
+                db.session.add(customer)
+                db.session.flush()
+                line = OrderLine(food_item_id=self.ids["food_item"], quantity=1, unit_price=Decimal("12.50"), line_total=Decimal("12.50"))
+                order = Order(customer_id=customer.id, restaurant_id=self.ids["restaurant"], total_price=Decimal("12.50"), lines=[line])
+                order.payment = Payment(order=order, customer_id=customer.id, restaurant_id=self.ids["restaurant"], bkash_transaction_id=f"TXN{n}", payment_phone_number="01333333333", amount=Decimal("12.50"))
+                db.session.add(order)
+                self.ids["customer"] = customer.id
+            db.session.commit()
+
+    def login_as(self, role):
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.ids[role])
+            sess["_fresh"] = True
+
+    def statement_count(self, url):
+        with self.app.app_context():
+            with count_statements(db.engine) as statements:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_list_views_issue_constant_statements(self):
+        views = [
+            ("admin", "/admin/dashboard"),
+            ("admin", "/admin/manage_orders"),
+            ("admin", "/admin/manage_payments"),
+            ("admin", "/admin/manage_food_items"),
+            ("restaurant", "/restaurant/dashboard"),
+            ("restaurant", "/restaurant/manage_orders"),
+            ("customer", "/customer/order_history"),
+        ]
+        before = {}
+        for role, url in views:
+            self.login_as(role)
+            self.client.get(url)  # warm up one-off work such as building dashboard_stats
+            before[url] = self.statement_count(url)
+        self.add_orders(10)
+        for role, url in views:
+            self.login_as(role)
+            self.client.get(url)  # add_orders logs in a new customer, whose identity is not cached yet
+            self.assertEqual(self.statement_count(url), before[url], url)
+
+    def test_guard_fails_requests_over_the_limit(self):
+        class StrictConfig(TestConfig):
+            SQL_QUERY_LIMIT = 1
+        app = create_app(StrictConfig)
+        with app.app_context():
+            db.create_all()
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = "1"
+        with self.assertRaises(QueryLimitExceeded):
+            client.get("/customer/browse")
+
+if __name__ == "__main__":
+    unittest.main()
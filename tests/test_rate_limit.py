@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+import unittest
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.utils.passwords import hash_password
+from app.utils.query_guard import count_statements
+from app.utils.rate_limit import MemoryRateLimitStore, SqliteRateLimitStore
+
+class LimitedConfig(TestConfig):
+    RATE_LIMITS = {'login_ip': (4, 60), 'login_email': (2, 60), 'register_ip': (1, 60)}
+
+class RateLimitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(LimitedConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            user = User(name="John Doe", email="john@example.com", phone_number="1111111111", location="Sylhet",
+                        password=hash_password("secret123", TestConfig.BCRYPT_LOG_ROUNDS), role="customer")
+            db.session.add(user)
+            db.session.commit()
+            self.engine = db.engine
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, password, email="john@example.com", address="10.0.0.1"):
+        return self.client.post("/auth/login", data={"email": email, "password": password},
+                                environ_base={"REMOTE_ADDR": address})
+
+    def test_failed_logins_lock_the_email_before_any_query(self):
+        self.assertEqual(self.login("wrong").status_code, 200)
+        self.assertEqual(self.login("wrong", email="JOHN@example.com", address="10.0.0.2").status_code, 200)
+        with count_statements(self.engine) as statements:
+            response = self.login("secret123", address="10.0.0.3")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+        self.assertEqual(statements, [])
+
+    def test_successful_login_clears_failures(self):
+        self.login("wrong")
+        self.assertEqual(self.login("secret123").status_code, 302)
+        self.client.get("/auth/logout")
+        self.login("wrong")
+        self.assertEqual(self.login("secret123").status_code, 302)
+
+    def test_login_attempts_per_address(self):
+        for i in range(4):
+            self.assertEqual(self.login("wrong", email=f"user{i}@example.com").status_code, 200)
+        self.assertEqual(self.login("wrong", email="other@example.com").status_code, 429)
+        self.assertEqual(self.login("wrong", email="other@example.com", address="10.0.0.9").status_code, 200)
+
+    def test_register_attempts_per_address(self):
+        data = {"name": "Jane", "email": "john@example.com", "phone_number": "1111111111", "location": "Dhaka",
+                "password": "secret123", "confirm_password": "secret123", "role": "customer"}
+        self.assertEqual(self.client.post("/auth/register", data=data).status_code, 200)
+        with count_statements(self.engine) as statements:
+            self.assertEqual(self.client.post("/auth/register", data=data).status_code, 429)
+        self.assertEqual(statements, [])
+        self.assertEqual(self.client.get("/auth/register").status_code, 200)
+
+class ProxiedConfig(LimitedConfig):
+    PROXY_FIX_HOPS = 1
+
+class ProxiedRateLimitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(ProxiedConfig)
+        self.client = self.app.test_client()
+        self.attempts = 0
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, forwarded_for):
+        # Every request reaches the app from the proxy's address.
+        self.attempts += 1
+        return self.client.post("/auth/login", data={"email": f"user{self.attempts}@example.com", "password": "wrong"},
+                                environ_base={"REMOTE_ADDR": "127.0.0.1"},
+                                headers={"X-Forwarded-For": forwarded_for})
+
+    def test_login_ip_uses_the_forwarded_address(self):
+        for _ in range(4):
+            self.assertEqual(self.login("203.0.113.1").status_code, 200)
+        self.assertEqual(self.login("203.0.113.1").status_code, 429)
+        self.assertEqual(self.login("203.0.113.2").status_code, 200)
+        # Only the hop the proxy appended is trusted, not one the client sent.
+        self.assertEqual(self.login("198.51.100.7, 203.0.113.1").status_code, 429)
+
+    def test_forwarded_header_is_ignored_without_a_trusted_proxy(self):
+        client = create_app(LimitedConfig).test_client()
+        for address in ("203.0.113.1", "203.0.113.2", "203.0.113.3", "203.0.113.4"):
+            client.post("/auth/login", data={"email": "bad"}, headers={"X-Forwarded-For": address})
+        response = client.post("/auth/login", data={"email": "bad"}, headers={"X-Forwarded-For": "203.0.113.5"})
+        self.assertEqual(response.status_code, 429)
+
+class RateLimitStoreTestCase(unittest.TestCase):
+
+    def test_bucket_refills_over_time(self):
+        store = MemoryRateLimitStore()
+        self.assertEqual(store.take("k", 2, 100.0), 0)
+        self.assertEqual(store.take("k", 2, 100.0), 0)
+        self.assertGreater(store.take("k", 2, 100.0), 0)
+        self.assertGreater(store.peek("k", 2, 100.0), 0)
+        time.sleep(0.02)
+        self.assertEqual(store.take("k", 2, 100.0), 0)
+
+    def test_sqlite_store_is_shared(self):
+        path = os.path.join(tempfile.mkdtemp(), "rate_limits.db")
+        first, second = SqliteRateLimitStore(path), SqliteRateLimitStore(path)
+        self.assertEqual(first.take("login_email:john@example.com", 2, 1 / 60), 0)
+        self.assertEqual(second.take("login_email:john@example.com", 2, 1 / 60), 0)
+        retry_after = first.take("login_email:john@example.com", 2, 1 / 60)
+        self.assertGreater(retry_after, 50)
+        second.reset("login_email:john@example.com")
+        self.assertEqual(first.peek("login_email:john@example.com", 2, 1 / 60), 0)
+
+if __name__ == "__main__":
+    unittest.main()
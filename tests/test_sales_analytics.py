@@ -0,0 +1,191 @@
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.models.order import Order
+from app.models.order_line import OrderLine
+from app.models.order_event import OrderEvent, order_event, record_order_events
+from app.models.order_projection import ProjectionCheckpoint
+from app.utils.query_guard import count_statements
+from app.utils.sales_analytics import SalesCache, sales_report
+
+class SalesAnalyticsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        with self.app.app_context():
+            db.create_all()
+            restaurant = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+            other = User(name="Spice Route", email="spice@example.com", phone_number="2222222222", location="Dhaka", password="hashed_password", role="restaurant")
+            customer = User(name="John Doe", email="john@example.com", phone_number="3333333333", location="Sylhet", password="hashed_password", role="customer")
+            db.session.add_all([restaurant, other, customer])
+            db.session.flush()
+            pizza = FoodItem(name="Pizza", price=Decimal("12.00"), restaurant_id=restaurant.id, category="Mains")
+            pasta = FoodItem(name="Pasta", price=Decimal("10.00"), restaurant_id=restaurant.id, category="Mains")
+            bread = FoodItem(name="Garlic Bread", price=Decimal("4.00"), restaurant_id=restaurant.id, category="Sides")
+            curry = FoodItem(name="Curry", price=Decimal("9.00"), restaurant_id=other.id, category="Mains")
+            db.session.add_all([pizza, pasta, bread, curry])
+            db.session.commit()
+            self.restaurant_id, self.other_id, self.customer_id = restaurant.id, other.id, customer.id
+            self.items = {item.name: (item.id, item.price, item.restaurant_id) for item in (pizza, pasta, bread, curry)}
+        self.today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def place_order(self, lines, days_ago=0, status="pending"):
+        with self.app.app_context():
+            restaurant_id = self.items[next(iter(lines))][2]
+            order = Order(customer_id=self.customer_id, restaurant_id=restaurant_id, status=status,
+                          total_price=sum(self.items[name][1] * quantity for name, quantity in lines.items()),
+                          order_date=self.today - timedelta(days=days_ago))
+            for name, quantity in lines.items():
+                food_item_id, price, _ = self.items[name]
+                order.lines.append(OrderLine(food_item_id=food_item_id, quantity=quantity, unit_price=price, line_total=price * quantity))
+            db.session.add(order)
+            db.session.commit()
+            return order.id
+
+    def report(self, days=7):
+        with self.app.app_context():
+            return sales_report(self.restaurant_id, days, today=self.today.date())
+
+    def test_report_sums_days_items_and_categories(self):
+        self.place_order({"Pizza": 2, "Garlic Bread": 1})
+        self.place_order({"Pasta": 1}, days_ago=2)
+        self.place_order({"Pizza": 1}, days_ago=2)
+        self.place_order({"Pizza": 5}, days_ago=1, status="cancelled")
+        self.place_order({"Pasta": 3}, days_ago=10)
+        self.place_order({"Curry": 4})
+
+        report = self.report()
+        self.assertEqual(len(report.days), 7)
+        self.assertEqual(report.days[-1], self.today.date())
+        self.assertEqual(report.orders, [0, 0, 0, 0, 2, 0, 1])
+        self.assertEqual(report.revenue[-3:], [Decimal("22.00"), 0, Decimal("28.00")])
+        self.assertEqual((report.total_orders, report.total_revenue), (3, Decimal("50.00")))
+        self.assertEqual(report.average_basket, Decimal("16.67"))
+        self.assertEqual(report.items_per_order, 1.7)
+        self.assertEqual([(item["name"], item["quantity"], item["revenue"]) for item in report.top_items],
+                         [("Pizza", 3, Decimal("36.00")), ("Pasta", 1, Decimal("10.00")), ("Garlic Bread", 1, Decimal("4.00"))])
+        self.assertEqual([(category["category"], category["quantity"], category["revenue"]) for category in report.categories],
+                         [("Mains", 4, Decimal("46.00")), ("Sides", 1, Decimal("4.00"))])
+        self.assertEqual(self.report(days=30).total_orders, 4)
+
+    def test_only_changed_days_are_queried_again(self):
+        self.place_order({"Pizza": 1}, days_ago=3)
+        self.report()
+        with self.app.app_context():
+            with count_statements(db.engine) as statements:
+                report = sales_report(self.restaurant_id, 7, today=self.today.date())
+        # The change check and the item names; the days come from the cache.
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(report.total_orders, 1)
+
+        order_id = self.place_order({"Pasta": 2})
+        with self.app.app_context():
+            with count_statements(db.engine) as statements:
+                report = sales_report(self.restaurant_id, 7, today=self.today.date())
+            self.assertEqual(len(statements), 4)
+            self.assertEqual((report.total_orders, report.total_revenue), (2, Decimal("32.00")))
+
+            db.session.get(Order, order_id).status = "cancelled"
+            db.session.commit()
+        report = self.report()
+        self.assertEqual((report.total_orders, report.total_revenue), (1, Decimal("12.00")))
+        self.assertEqual(report.orders[-4], 1)
+
+    def test_days_changed_by_late_commits_are_not_missed(self):
+        first = self.place_order({"Pizza": 1}, days_ago=2)
+        second = self.place_order({"Pasta": 1}, days_ago=1)
+        self.assertEqual(self.report().total_orders, 2)
+
+        def cancel(order_id, days_ago, event_id):
+            # Writes the cancellation's event under a chosen id.
+            with self.app.app_context():
+                db.session.get(Order, order_id).status = "cancelled"
+                db.session.flush()
+                db.session.execute(OrderEvent.__table__.delete().where(OrderEvent.id == db.session.scalar(db.func.max(OrderEvent.id))))
+                record_order_events(db.session.connection(), [dict(
+                    order_event("status", order_id, self.customer_id, self.restaurant_id, "pending", "cancelled",
+                                placed_at=self.today - timedelta(days=days_ago)), id=event_id)])
+                db.session.commit()
+
+        with self.app.app_context():
+            last_id = db.session.scalar(db.func.max(OrderEvent.id))
+        # Two cancellations; the one given the lower id commits last.
+        cancel(first, 2, last_id + 2)
+        self.assertEqual(self.report().total_orders, 2)
+        cancel(second, 1, last_id + 1)
+        self.assertEqual(self.report().total_orders, 0)
+
+    def test_days_loaded_across_a_change_are_not_kept(self):
+        order_id = self.place_order({"Pizza": 1}, days_ago=1)
+        cache = self.app.extensions["sales_cache"]
+        load_days = cache._load_days
+
+        def load_then_cancel(restaurant_id, days):
+            # Another request cancels the order and reads its event after
+            # this one has loaded the day.
+            buckets = load_days(restaurant_id, days)
+            db.session.get(Order, order_id).status = "cancelled"
+            db.session.commit()
+            cache._forget_changed_days()
+            return buckets
+
+        with mock.patch.object(cache, "_load_days", load_then_cancel):
+            self.assertEqual(self.report().total_orders, 1)
+        self.assertEqual(self.report().total_orders, 0)
+
+    def test_cursor_is_saved_to_its_own_checkpoint(self):
+        for _ in range(3):
+            self.place_order({"Pizza": 1})
+        with mock.patch("app.utils.sales_analytics.EVENT_SCAN_BATCH", 2):
+            self.report()
+        with self.app.app_context():
+            checkpoints = dict(db.session.execute(db.select(ProjectionCheckpoint.name, ProjectionCheckpoint.last_event_id)).all())
+            self.assertEqual(checkpoints[ProjectionCheckpoint.SALES_ANALYTICS], db.session.scalar(db.func.max(OrderEvent.id)))
+            self.assertEqual(checkpoints[ProjectionCheckpoint.ORDER_REPORTS], 0)
+
+        # A new process reads the log from there.
+        scans = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if "FROM order_events" in statement:
+                scans.append(parameters[0])
+
+        self.app.extensions["sales_cache"] = SalesCache()
+        with self.app.app_context():
+            event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                report = sales_report(self.restaurant_id, 7, today=self.today.date())
+            finally:
+                event.remove(db.engine, "before_cursor_execute", record)
+        self.assertEqual(report.total_orders, 3)
+        self.assertEqual(scans, [checkpoints[ProjectionCheckpoint.SALES_ANALYTICS]])
+
+    def test_analytics_page(self):
+        self.place_order({"Pizza": 2, "Garlic Bread": 1})
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.restaurant_id)
+        response = client.get("/restaurant/analytics?days=7")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Garlic Bread", response.data)
+        self.assertIn(b"$28.00", response.data)
+        self.assertEqual(client.get("/restaurant/analytics?days=5").status_code, 200)
+
+        customer = self.app.test_client()
+        with customer.session_transaction() as sess:
+            sess["_user_id"] = str(self.customer_id)
+        self.assertNotEqual(customer.get("/restaurant/analytics").status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
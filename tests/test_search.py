@@ -0,0 +1,129 @@
+import unittest
+from decimal import Decimal
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.models.food_item import FoodItem
+from app.utils.query_guard import count_statements
+from app.utils.search import Fts5SearchIndex, MemorySearchIndex, edit_distance, search_food_items
+
+class SearchContract:
+
+    def setUp(self):
+        self.app = create_app(self.config)
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.italy = User(name="Taste of Italy", email="italy@example.com", phone_number="1111111111", location="Dhaka", password="hashed_password", role="restaurant")
+        self.spice = User(name="Spice Route", email="spice@example.com", phone_number="2222222222", location="Chittagong", password="hashed_password", role="restaurant")
+        db.session.add_all([self.italy, self.spice])
+        db.session.commit()
+        self.items = {}
+        for name, description, category, restaurant in [
+            ("Margherita Pizza", "Tomato, mozzarella and basil", "Pizza", self.italy),
+            ("Chicken Tikka", "Grilled chicken with spices", "Curry", self.spice),
+            ("Garlic Bread", "Served with a chicken dip", "Sides", self.italy),
+            ("Crème Brûlée", "Vanilla custard", "Dessert", self.italy),
+        ]:
+            food_item = FoodItem(name=name, description=description, price=Decimal("9.00"), restaurant_id=restaurant.id, category=category)
+            db.session.add(food_item)
+            db.session.commit()
+            self.items[name] = food_item.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def names(self, query):
+        return [db.session.get(FoodItem, food_item_id).name for food_item_id in search_food_items(query)]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.names("chicken"), ["Chicken Tikka", "Garlic Bread"])
+
+    def test_prefixes_restaurant_names_and_diacritics(self):
+        self.assertEqual(self.names("marg"), ["Margherita Pizza"])
+        self.assertEqual(self.names("spice route"), ["Chicken Tikka"])
+        self.assertEqual(self.names("creme brulee"), ["Crème Brûlée"])
+        self.assertEqual(self.names("pizza sushi"), [])
+
+    def test_typos_fall_back_to_closest_terms(self):
+        self.assertEqual(self.names("chiken tika"), ["Chicken Tikka"])
+        self.assertEqual(self.names("margherta"), ["Margherita Pizza"])
+        self.assertEqual(self.names("xyz"), [])
+
+    def test_index_follows_edits_deletes_and_renames(self):
+        pizza = db.session.get(FoodItem, self.items["Margherita Pizza"])
+        pizza.name = "Funghi Pizza"
+        db.session.delete(db.session.get(FoodItem, self.items["Garlic Bread"]))
+        db.session.commit()
+        self.assertEqual(self.names("funghi"), ["Funghi Pizza"])
+        self.assertEqual(self.names("margherita"), [])
+        self.assertEqual(self.names("chicken"), ["Chicken Tikka"])
+        self.spice.name = "Curry House"
+        db.session.commit()
+        self.assertEqual(self.names("house"), ["Chicken Tikka"])
+
+    def test_rolled_back_changes_are_not_indexed(self):
+        pizza = db.session.get(FoodItem, self.items["Margherita Pizza"])
+        pizza.name = "Funghi Pizza"
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.names("funghi"), [])
+        self.assertEqual(self.names("margherita"), ["Margherita Pizza"])
+
+    def test_browse_orders_by_relevance_and_pages(self):
+        for i in range(5):
+            db.session.add(FoodItem(name=f"Chicken Wings {i}", price=Decimal("5.00"), restaurant_id=self.spice.id, category="Sides"))
+        db.session.commit()
+        response = self.client.get("/customer/browse?q=chicken")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Best Match", response.data)
+        self.assertLess(response.data.index(b"Chicken Tikka"), response.data.index(b"Garlic Bread"))
+        self.assertNotIn(b"Margherita", response.data)
+
+class Fts5SearchTestCase(SearchContract, unittest.TestCase):
+
+    class config(TestConfig):
+        SEARCH_BACKEND = "fts5"
+
+    def test_backend(self):
+        self.assertIsInstance(self.app.extensions["search_index"], Fts5SearchIndex)
+
+class MemorySearchTestCase(SearchContract, unittest.TestCase):
+
+    class config(TestConfig):
+        SEARCH_BACKEND = "memory"
+
+    def test_backend(self):
+        self.assertIsInstance(self.app.extensions["search_index"], MemorySearchIndex)
+
+    def test_changes_committed_by_another_process_are_seen(self):
+        self.assertEqual(self.names("margherita"), ["Margherita Pizza"])
+        index = self.app.extensions["search_index"]
+        # Another worker, with its own index, renames the pizza.
+        self.app.extensions["search_index"] = MemorySearchIndex()
+        db.session.get(FoodItem, self.items["Margherita Pizza"]).name = "Funghi Pizza"
+        db.session.commit()
+        self.app.extensions["search_index"] = index
+        self.assertEqual(self.names("funghi"), ["Funghi Pizza"])
+        self.assertEqual(self.names("margherita"), [])
+
+    def test_own_changes_do_not_reload_the_index(self):
+        self.names("pizza")
+        db.session.get(FoodItem, self.items["Margherita Pizza"]).name = "Funghi Pizza"
+        db.session.commit()
+        with count_statements(db.engine) as statements:
+            search_food_items("funghi")
+        self.assertEqual(len(statements), 1)
+
+class EditDistanceTestCase(unittest.TestCase):
+
+    def test_counts_transpositions_as_one_edit(self):
+        self.assertEqual(edit_distance("chikcen", "chicken", 2), 1)
+        self.assertEqual(edit_distance("chiken", "chicken", 2), 1)
+        self.assertEqual(edit_distance("pizza", "pasta", 1), 2)
+
+if __name__ == "__main__":
+    unittest.main()
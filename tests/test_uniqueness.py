@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch
+from config import TestConfig
+from app import create_app, db
+from app.models.user import User
+from app.utils.query_guard import count_statements
+from app.utils.uniqueness import BloomFilter
+
+class UniquenessTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            john = User(name="John Doe", email="john@example.com", phone_number="1111111111", location="Sylhet", password="hashed_password", role="customer")
+            jane = User(name="Jane Doe", email="jane@example.com", phone_number="2222222222", location="Dhaka", password="hashed_password", role="customer")
+            db.session.add_all([john, jane])
+            db.session.commit()
+            self.john_id = john.id
+            self.engine = db.engine
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def register(self, email, phone_number):
+        return self.client.post("/auth/register", data={
+            "name": "New User", "email": email, "phone_number": phone_number, "location": "Dhaka",
+            "password": "secret123", "confirm_password": "secret123", "role": "customer"})
+
+    def test_registration_checks_email_and_phone_in_one_query(self):
+        with count_statements(self.engine) as statements:
+            response = self.register("john@example.com", "2222222222")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"That email is taken", response.data)
+        self.assertIn(b"That phone number is taken", response.data)
+        self.assertEqual(len(statements), 1)
+
+    def test_racing_duplicate_becomes_a_field_error(self):
+        # Both checks pass, as when another registration commits in between.
+        with patch("app.utils.forms.check_unique", return_value=True):
+            response = self.register("john@example.com", "3333333333")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"That email is taken", response.data)
+        with self.app.app_context():
+            self.assertEqual(User.query.count(), 2)
+
+    def test_profile_ignores_own_values(self):
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(self.john_id)
+            sess["_fresh"] = True
+        data = {"name": "John Smith", "email": "john@example.com", "phone_number": "1111111111", "location": "Sylhet"}
+        self.assertEqual(self.client.post("/customer/profile", data=data).status_code, 302)
+        response = self.client.post("/customer/profile", data=dict(data, phone_number="2222222222"))
+        self.assertIn(b"That phone number is taken", response.data)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(User, self.john_id).phone_number, "1111111111")
+
+    def test_availability_skips_the_query_for_free_values(self):
+        self.assertEqual(self.client.get("/auth/availability?email=john@example.com&phone_number=9999999999").get_json(),
+                         {"email": False, "phone_number": True})
+        with count_statements(self.engine) as statements:
+            response = self.client.get("/auth/availability?email=new@example.com")
+        self.assertEqual(response.get_json(), {"email": True})
+        self.assertEqual(statements, [])
+
+        self.assertEqual(self.register("new@example.com", "3333333333").status_code, 302)
+        self.assertEqual(self.client.get("/auth/availability?email=new@example.com").get_json(), {"email": False})
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f"user{i}@example.com")
+        self.assertTrue(all(f"user{i}@example.com" in bloom for i in range(1000)))
+        false_positives = sum(f"other{i}@example.com" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+if __name__ == "__main__":
+    unittest.main()